@@ -1,202 +1,3202 @@
 #
 #
 
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import multiprocessing
 import numpy as np
+import os
 import pandas as pd
+import shutil
+import struct
+import sys
+import time
+import zlib
+
+try:
+	import pyarrow
+except ImportError:
+	pyarrow = None
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
 
 def test_lib():
 	'''To test if the library was properly loaded.'''
 	print('Library loaded and ready!')
 
+# Columns of bed files
+BED_COLUMNS = ['chr', 'start', 'end', 'name', 'score']
+
+# Format version of bed caches, see write_bed_cache
+BED_CACHE_VERSION = 1
+
+# Format version of cached ROI indexes, see save_roi_index
+ROI_INDEX_VERSION = 2
+
+# Format version of bed indexes, see write_bed_index
+BED_INDEX_VERSION = 1
+
+# Version of the incremental ROI state format, see RoiState
+ROI_STATE_VERSION = 1
+
+# Version of the result cache keys, see ResultCache
+RESULT_CACHE_VERSION = 1
+
+# Values summed in order (then in 8 partial sums) by numpy pairwise sums
+PAIRWISE_BLOCK = 128
+
+# Methods to collapse rows assigned to the same ROI, and those from the
+# base-pair coverage of rows (see collapse_coverage). Defined in socket_lib,
+# to be shared with the light roi_client.py
+from socket_lib import COLLAPSE_METHODS, COVERAGE_METHODS
+
+def memory_usage():
+	'''Current and peak resident memory of this process, in MB.
+
+	Returns:
+		tuple: (rss, peak), None where not available.
+	'''
+	rss = None
+	try:
+		with open('/proc/self/statm', 'r') as f:
+			rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024.**2
+	except (IOError, OSError, ValueError):
+		pass
+	peak = None
+	if type(None) != type(resource):
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		peak /= 1024.**2 if 'darwin' == sys.platform else 1024.
+	return((rss, peak))
+
+class _NullStage(object):
+	'''Stage of a disabled Profiler, doing nothing.'''
+
+	def add_rows(self, n):
+		pass
+
+	def __enter__(self):
+		return(self)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		pass
+
+class _Stage(object):
+	'''Stage of an enabled Profiler, see Profiler.stage.'''
+
+	def __init__(self, profiler, name, rows, chrom):
+		self.profiler = profiler
+		self.name = name
+		self.rows = rows
+		self.chrom = chrom
+
+	def add_rows(self, n):
+		'''Count rows processed by the stage.'''
+		self.rows = (0 if type(None) == type(self.rows) else self.rows) + int(n)
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return(self)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.profiler.record(self.name, time.perf_counter() - self.start,
+			self.rows, self.chrom)
+
+class Profiler(object):
+	'''Record wall time, rows and memory of named stages.
+
+	Stages are used as context managers. When the profiler is disabled, they
+	are a shared object doing nothing, so that instrumented code runs at full
+	speed. The library records its stages on PROFILER.
+
+	Example:
+		with PROFILER.stage('read') as stage:
+			...
+			stage.add_rows(bed.shape[0])
+	'''
+
+	_null_stage = _NullStage()
+
+	def __init__(self, enabled = False):
+		self.enabled = enabled
+		self.records = []
+		self.start = time.perf_counter()
+
+	def enable(self):
+		'''Start recording, forgetting previous records.'''
+		self.enabled = True
+		self.records = []
+		self.start = time.perf_counter()
+
+	def stage(self, name, rows = None, chrom = None):
+		'''Context manager timing a stage.
+
+		Args:
+			name (string): stage name.
+			rows (int): rows processed, can be increased with add_rows.
+			chrom (string): chromosome, for per-chromosome stages.
+		'''
+		if not self.enabled:
+			return(self._null_stage)
+		return(_Stage(self, name, rows, chrom))
+
+	def record(self, name, seconds, rows = None, chrom = None):
+		'''Record a stage timed elsewhere, e.g., in a worker process.'''
+		if not self.enabled:
+			return
+		rss, peak = memory_usage()
+		self.records.append({'stage' : name,
+			'chrom' : None if type(None) == type(chrom) else str(chrom),
+			'seconds' : seconds, 'rows' : rows, 'rss_mb' : rss,
+			'peak_mb' : peak})
+
+	def take(self):
+		'''Return the records and forget them, e.g., in a worker process.'''
+		records = self.records
+		self.records = []
+		return(records)
+
+	def extend(self, records):
+		'''Add records of another profiler, e.g., of a worker process.'''
+		if self.enabled:
+			self.records.extend(records)
+
+	def summary(self):
+		'''Aggregate records per stage, in order of first occurrence.
+
+		Returns:
+			list: one dict per stage, with calls, seconds, rows, rows_per_s,
+				and the maximum rss_mb and peak_mb.
+		'''
+		stages = {}
+		for r in self.records:
+			if not r['stage'] in stages:
+				stages[r['stage']] = {'stage' : r['stage'], 'calls' : 0,
+					'seconds' : 0., 'rows' : None, 'rss_mb' : None,
+					'peak_mb' : None}
+			s = stages[r['stage']]
+			s['calls'] += 1
+			s['seconds'] += r['seconds']
+			if type(None) != type(r['rows']):
+				s['rows'] = (s['rows'] or 0) + r['rows']
+			for k in ('rss_mb', 'peak_mb'):
+				if type(None) != type(r[k]):
+					s[k] = max(s[k] or 0, r[k])
+		out = list(stages.values())
+		for s in out:
+			s['rows_per_s'] = s['rows'] / s['seconds'] if s['rows'] and 0 < s[
+				'seconds'] else None
+		return(out)
+
+	def report(self, path = None, stream = None):
+		'''Write a summary table to stderr, and the JSON report to path.
+
+		Args:
+			path (string): JSON report path, not written if None or empty.
+			stream (file): summary output, default: sys.stderr.
+		'''
+		if type(None) == type(stream):
+			stream = sys.stderr
+		summary = self.summary()
+		elapsed = time.perf_counter() - self.start
+		rss, peak = memory_usage()
+
+		stream.write('%-16s %6s %10s %12s %12s %9s\n' % ('stage', 'calls',
+			'seconds', 'rows', 'rows/s', 'peak MB'))
+		for s in summary:
+			stream.write('%-16s %6d %10.3f %12s %12s %9s\n' % (s['stage'],
+				s['calls'], s['seconds'],
+				'' if type(None) == type(s['rows']) else str(s['rows']),
+				'' if type(None) == type(s['rows_per_s']) else
+					'%.0f' % s['rows_per_s'],
+				'' if type(None) == type(s['peak_mb']) else
+					'%.1f' % s['peak_mb']))
+		stream.write('%-16s %6s %10.3f %12s %12s %9s\n' % ('total', '',
+			elapsed, '', '', '' if type(None) == type(peak) else '%.1f' % peak))
+
+		if path:
+			# Worker processes are reported by their largest peak
+			children_peak = None
+			if type(None) != type(resource):
+				children_peak = resource.getrusage(
+					resource.RUSAGE_CHILDREN).ru_maxrss
+				children_peak /= 1024.**2 if 'darwin' == sys.platform else 1024.
+			with open(path, 'w') as f:
+				json.dump({'elapsed_s' : elapsed, 'rss_mb' : rss,
+					'peak_mb' : peak, 'children_peak_mb' : children_peak,
+					'argv' : sys.argv, 'stages' : summary,
+					'records' : self.records}, f, indent = 1)
+
+# Profiler of the library stages, disabled by default
+PROFILER = Profiler()
+
+def _profiled_task(task):
+	'''Run a (func, args, enabled) task in a worker process, for pools.
+
+	The worker PROFILER is enabled as the parent one and only keeps the
+	records of the task, to be added to the parent with PROFILER.extend.
+
+	Returns:
+		tuple: func(args) output and the PROFILER records of the task.
+	'''
+	func, args, enabled = task
+	PROFILER.enabled = enabled
+	PROFILER.records = []
+	return((func(args), PROFILER.take()))
+
 def join_trim(l):
 	'''Join nested array.'''
 	return ' '.join(' '.join(l).split())
 
-def assign_to_rois(
-	rois, bed,
-	keep_unassigned_rows,
-	keep_marginal_overlaps,
-	keep_including,
-	use_name,
-	collapse_method = None,
-	floatValues = None
-):
-	'''Assign rows from bed to regions in rois.
+class RoiIndex(object):
+	'''Sorted per-chromosome index of regions of interest (ROIs).
+
+	ROIs of a chromosome are split in length classes (powers of two), each
+	sorted by start. A row [start, end] can only overlap ROIs of a class whose
+	start falls in [start - maxlen, end], found with two binary searches.
+	Queries thus cost O((N + M) log M + hits) instead of the N x M matrices.
+
+	Uniform bins (fixed size and step, as from bin_chr) are detected and
+	indexed only by (first start, step, size - 1): the bins overlapping a row
+	are then found in O(1) with integer arithmetic. A trailing irregular bin
+	(e.g., from bin_chr last_bin) is indexed as any other ROI.
+
+	Attributes:
+		chroms (dict): chromosome -> (uniform, classes), where uniform is None
+			or (first, step, width, ids), and classes a list of
+			(starts, ends, ids, maxlen).
+		chr_codes (np.ndarray): chromosome code of each ROI.
+		rois (pd.DataFrame): the indexed regions of interest.
+		size (int): total number of ROIs.
+	'''
+
+	def __init__(self, rois, chroms = None, chr_codes = None):
+		'''Build the index.
+
+		Args:
+			rois (pd.DataFrame): bed file with regions of interest.
+			chroms (dict): prebuilt chroms attribute, see load_roi_index.
+			chr_codes (np.ndarray): prebuilt chr_codes attribute.
+		'''
+		self.rois = rois
+		self.size = rois.shape[0]
+		self.chroms = {}
+		self._labels = {}
+
+		if type(None) != type(chroms):
+			self.chroms = chroms
+			self.chr_codes = chr_codes
+			return
+
+		start_time = time.perf_counter()
+		starts = np.asarray(rois['start'], dtype = np.int64)
+		ends = np.asarray(rois['end'], dtype = np.int64)
+		codes, chr_names = pd.factorize(rois['chr'])
+		self.chr_codes = codes
+		lclass = np.floor(np.log2(np.maximum(ends - starts, 0) + 1)).astype('int')
+
+		for chri in range(len(chr_names)):
+			ids = np.where(codes == chri)[0]
+			ids = ids[np.argsort(starts[ids], kind = 'stable')]
+
+			# Uniform bins, possibly followed by an irregular last bin
+			uniform = None
+			for nbins in (ids.shape[0], ids.shape[0] - 1):
+				uniform = uniform_bins(starts[ids[:nbins]], ends[ids[:nbins]])
+				if not type(None) == type(uniform):
+					uniform = uniform + (ids[:nbins],)
+					ids = ids[nbins:]
+					break
+
+			classes = []
+			for lc in np.unique(lclass[ids]):
+				cids = ids[lclass[ids] == lc]
+				classes.append((starts[cids], ends[cids], cids,
+					np.max(ends[cids] - starts[cids])))
+			self.chroms[chr_names[chri]] = (uniform, classes)
+
+		PROFILER.record('index', time.perf_counter() - start_time, self.size)
+
+	def labels(self, use_name):
+		'''ROI labels, see roi_labels. Built once per use_name.'''
+		if not use_name in self._labels:
+			self._labels[use_name] = roi_labels(self.rois, use_name)
+		return(self._labels[use_name])
+
+	def query(self, chri, starts, ends,
+		keep_marginal_overlaps, keep_including):
+		'''Find the ROIs each row is assigned to.
+
+		Args:
+			chri (string): chromosome of the rows.
+			starts (np.ndarray): rows start.
+			ends (np.ndarray): rows end.
+			keep_marginal_overlaps (bool): assign to partial overlaps.
+			keep_including (bool): assign to included ROIs.
+
+		Returns:
+			tuple: (row, ROI) index arrays, sorted by row then ROI.
+		'''
+		return(query_rois(self.chroms.get(chri, (None, [])), starts, ends,
+			keep_marginal_overlaps, keep_including))
+
+def file_digest(path):
+	'''SHA-1 digest of a file content, or of every file in a directory.'''
+	digest = hashlib.sha1()
+	if os.path.isdir(path):
+		paths = sorted(os.path.join(root, name)
+			for (root, dirs, names) in os.walk(path) for name in names)
+	else:
+		paths = [path]
+	for fpath in paths:
+		digest.update(os.path.relpath(fpath, path).encode())
+		with open(fpath, 'rb') as f:
+			for block in iter(lambda: f.read(1 << 20), b''):
+				digest.update(block)
+	return(digest.hexdigest())
+
+def _entry_size(path):
+	'''Size in bytes of a cache entry, file or directory.'''
+	if not os.path.isdir(path):
+		return(os.path.getsize(path))
+	return(sum(os.path.getsize(os.path.join(root, name))
+		for (root, dirs, names) in os.walk(path) for name in names))
+
+class _CacheLock(object):
+	'''Lock on a cache directory, through a lock file in it: shared to use
+	entries, exclusive to evict them. Without fcntl (e.g., on Windows),
+	nothing is locked.'''
+
+	# Lock file name, never a cache entry
+	NAME = 'lock'
+
+	def __init__(self, cache_dir, shared = False):
+		self.path = os.path.join(cache_dir, self.NAME)
+		self.mode = None
+		if type(None) != type(fcntl):
+			self.mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+		self._file = None
+
+	def __enter__(self):
+		self._file = open(self.path, 'a')
+		if type(None) != type(self.mode):
+			fcntl.flock(self._file, self.mode)
+		return(self)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if type(None) != type(self.mode):
+			fcntl.flock(self._file, fcntl.LOCK_UN)
+		self._file.close()
+		self._file = None
+
+def _lru_evict(cache_dir, max_bytes, keep = None):
+	'''Remove least recently used cache entries, down to max_bytes.
+
+	Entries are the files and directories in cache_dir, their modification
+	time being their last use. Temporary entries (.tmp) and the lock file are
+	ignored. Callers hold an exclusive _CacheLock.
 
 	Args:
-		rois (pd.DataFrame): bed file with regions of interest.
-		bed (pd.DataFrame): bed file with regions to be assigned to ROIs.
-		keep_unassigned_rows (bool): keep rows that do not belong to any ROI.
+		cache_dir (string): cache directory.
+		max_bytes (int): size cap, in bytes.
+		keep (string): name of an entry that is never removed.
+	'''
+	entries = []
+	for name in os.listdir(cache_dir):
+		path = os.path.join(cache_dir, name)
+		if '.tmp' in name or name in (keep, _CacheLock.NAME):
+			continue
+		try:
+			entries.append((os.path.getmtime(path), _entry_size(path), path))
+		except OSError:
+			continue
+	total = sum(e[1] for e in entries)
+	if type(None) != type(keep) and os.path.exists(
+		os.path.join(cache_dir, keep)):
+		total += _entry_size(os.path.join(cache_dir, keep))
+
+	for (mtime, size, path) in sorted(entries):
+		if total <= max_bytes:
+			break
+		if os.path.isdir(path):
+			shutil.rmtree(path, ignore_errors = True)
+		else:
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+		total -= size
+
+def save_roi_index(index, path, use_name = None):
+	'''Write a RoiIndex to a directory, see load_roi_index.
+
+	Coordinates and ids of every chromosome are concatenated in flat .npy
+	arrays, with their segments listed in index.json.
+
+	Args:
+		index (RoiIndex): index to save.
+		path (string): output directory, created if needed.
+		use_name (bool): also save the ROI labels, see roi_labels.
+	'''
+	if not os.path.isdir(path):
+		os.makedirs(path)
+
+	starts = []
+	ends = []
+	ids = []
+	offset = 0
+	chroms = []
+	for (chrn, (uniform, classes)) in index.chroms.items():
+		chrom = {'chr' : chrn.item() if hasattr(chrn, 'item') else chrn,
+			'uniform' : None, 'classes' : []}
+		if type(None) != type(uniform):
+			first, step, width, uids = uniform
+			chrom['uniform'] = [int(first), int(step), int(width), offset,
+				int(uids.shape[0])]
+			starts.append(np.zeros(uids.shape[0], dtype = np.int64))
+			ends.append(np.zeros(uids.shape[0], dtype = np.int64))
+			ids.append(uids)
+			offset += uids.shape[0]
+		for (cstarts, cends, cids, maxlen) in classes:
+			chrom['classes'].append([offset, int(cids.shape[0]), int(maxlen)])
+			starts.append(cstarts)
+			ends.append(cends)
+			ids.append(cids)
+			offset += cids.shape[0]
+		chroms.append(chrom)
+
+	np.save(os.path.join(path, 'starts.npy'),
+		np.concatenate(starts + [np.zeros(0)]).astype(np.int64))
+	np.save(os.path.join(path, 'ends.npy'),
+		np.concatenate(ends + [np.zeros(0)]).astype(np.int64))
+	np.save(os.path.join(path, 'ids.npy'),
+		np.concatenate(ids + [np.zeros(0)]).astype(np.int64))
+	np.save(os.path.join(path, 'chr_codes.npy'), index.chr_codes)
+	if type(None) != type(use_name):
+		np.save(os.path.join(path, 'labels.npy'), index.labels(use_name))
+
+	with open(os.path.join(path, 'index.json'), 'w') as f:
+		json.dump({'size' : int(index.size), 'use_name' : use_name,
+			'chroms' : chroms}, f)
+
+def load_roi_index(rois, path):
+	'''Load a RoiIndex written by save_roi_index, memory-mapped.
+
+	Args:
+		rois (pd.DataFrame): the indexed regions of interest.
+		path (string): index directory.
+
+	Returns:
+		RoiIndex: the index of rois.
+	'''
+	with open(os.path.join(path, 'index.json'), 'r') as f:
+		meta = json.load(f)
+	if rois.shape[0] != meta['size']:
+		raise ValueError('Index does not match the regions: ' + path)
+
+	starts = np.load(os.path.join(path, 'starts.npy'), mmap_mode = 'r')
+	ends = np.load(os.path.join(path, 'ends.npy'), mmap_mode = 'r')
+	ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode = 'r')
+
+	chroms = {}
+	for chrom in meta['chroms']:
+		uniform = None
+		if type(None) != type(chrom['uniform']):
+			first, step, width, a, n = chrom['uniform']
+			uniform = (first, step, width, ids[a:(a + n)])
+		chroms[chrom['chr']] = (uniform, [(starts[a:(a + n)], ends[a:(a + n)],
+			ids[a:(a + n)], maxlen) for (a, n, maxlen) in chrom['classes']])
+
+	index = RoiIndex(rois, chroms, np.load(os.path.join(path, 'chr_codes.npy'),
+		mmap_mode = 'r'))
+	if type(None) != type(meta['use_name']):
+		index._labels[meta['use_name']] = np.load(os.path.join(path,
+			'labels.npy'), mmap_mode = 'r')
+	return(index)
+
+def cached_roi_index(rois, regfile, cache_dir, use_name = None,
+	max_bytes = None, key = ''):
+	'''Load the RoiIndex of rois from an on-disk cache, or build and save it.
+
+	Entries are keyed by the content of regfile, use_name and key, so that a
+	changed regfile is indexed again. Used entries are touched, and the least
+	recently used ones are evicted when the cache is larger than max_bytes.
+	Loads hold a shared lock on the cache and evictions an exclusive one, so
+	that concurrent runs can share it.
+
+	Args:
+		rois (pd.DataFrame): regions of interest, read from regfile.
+		regfile (string): path to the regions file (or bed cache).
+		cache_dir (string): cache directory, created if needed.
+		use_name (bool): also cache the ROI labels, see roi_labels.
+		max_bytes (int): cache size cap, in bytes. No cap if None.
+		key (string): other options the regions depend on.
+
+	Returns:
+		RoiIndex: the index of rois.
+	'''
+	if not os.path.isdir(cache_dir):
+		os.makedirs(cache_dir)
+	name = hashlib.sha1(':'.join(['roi_index', str(ROI_INDEX_VERSION),
+		file_digest(regfile), str(use_name), str(key)]).encode()).hexdigest()
+	path = os.path.join(cache_dir, name)
+
+	# Load a cached index, with evictions held off
+	with _CacheLock(cache_dir, shared = True):
+		try:
+			if os.path.isfile(os.path.join(path, 'index.json')):
+				os.utime(path, None)
+				return(load_roi_index(rois, path))
+		except FileNotFoundError:
+			# Evicted while loading, by a run without locks: build it again
+			pass
+
+	# Build and save the index, then move it to its entry at once
+	index = RoiIndex(rois)
+	tmp_path = path + '.tmp.' + str(os.getpid())
+	save_roi_index(index, tmp_path, use_name)
+	try:
+		os.rename(tmp_path, path)
+	except OSError:
+		# Saved by a concurrent run
+		shutil.rmtree(tmp_path, ignore_errors = True)
+
+	if type(None) != type(max_bytes):
+		with _CacheLock(cache_dir):
+			_lru_evict(cache_dir, max_bytes, name)
+	return(index)
+
+class _NullResult(object):
+	'''Result of a disabled ResultCache: never cached, records nothing.'''
+
+	def fetch(self, outfile = False, compress = None):
+		return(False)
+
+	def record(self, out):
+		return(_NullStage())
+
+class _ResultRecord(object):
+	'''Record the text written to a BedWriter as a ResultCache entry.'''
+
+	def __init__(self, result, out):
+		self.result = result
+		self.out = out
+
+	def __enter__(self):
+		cache = self.result.cache
+		self._tmp_path = self.result.path + '.tmp.' + str(os.getpid())
+		self._file = gzip.GzipFile(self._tmp_path, 'wb',
+			compresslevel = cache.compresslevel)
+		self.out.copies.append(self._file)
+		return(self)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.out.copies.remove(self._file)
+		self._file.close()
+		if type(None) != type(exc_type):
+			os.remove(self._tmp_path)
+			return
+		os.replace(self._tmp_path, self.result.path)
+		self.result.cache.evict(os.path.basename(self.result.path))
+
+class _Result(object):
+	'''An entry of a ResultCache, see ResultCache.result.'''
+
+	def __init__(self, cache, key):
+		self.cache = cache
+		self.key = key
+		self.path = os.path.join(cache.results_dir, key + '.gz')
+
+	def fetch(self, outfile = False, compress = None):
+		'''Write the cached result, if any, as BedWriter would.
+
+		Returns:
+			bool: whether the result was cached.
+		'''
+		try:
+			f = gzip.open(self.path, 'rb')
+		except FileNotFoundError:
+			return(False)
+		with f:
+			try:
+				os.utime(self.path, None)
+			except OSError:
+				pass
+			with BedWriter(outfile, compress = compress) as out:
+				with PROFILER.stage('cached'):
+					for block in iter(lambda: f.read(1 << 20), b''):
+						out.write_bytes(block)
+		return(True)
+
+	def record(self, out):
+		'''Context recording what is written to out as the result. The entry
+		is only stored if the context exits without exception.'''
+		return(_ResultRecord(self, out))
+
+class ResultCache(object):
+	'''On-disk cache of script outputs, keyed by input content and options.
+
+	Results are keyed by the SHA-1 digest of the input files (and of the code
+	producing them) and by the normalized options, and stored as the gzip
+	compressed output text. A hit then writes the stored text, without
+	reading inputs or formatting rows, and is byte-identical to a new run.
+
+	Input digests are memoized by file size, modification time and inode, so
+	unchanged inputs are not read again. Entries are written to temporary
+	files and moved in place, and eviction of the least recently used entries
+	above max_bytes holds an exclusive lock, so that several processes can
+	share a cache directory.
+
+	Attributes:
+		cache_dir (string): cache directory, None if disabled.
+		max_bytes (int): size cap of the results, no cap if None.
+		compresslevel (int): gzip level of the stored results.
+	'''
+
+	def __init__(self, cache_dir, max_bytes = None, compresslevel = 1):
+		'''Open a cache, creating its directory if needed.
+
+		Args:
+			cache_dir (string): cache directory, disabled if None.
+			max_bytes (int): size cap of the results, no cap if None.
+			compresslevel (int): gzip level of the stored results.
+		'''
+		self.cache_dir = cache_dir
+		self.max_bytes = max_bytes
+		self.compresslevel = compresslevel
+		if type(None) == type(cache_dir):
+			return
+
+		self.results_dir = os.path.join(cache_dir, 'results')
+		self.digests_dir = os.path.join(cache_dir, 'digests')
+		for path in (self.results_dir, self.digests_dir):
+			if not os.path.isdir(path):
+				os.makedirs(path, exist_ok = True)
+
+	@staticmethod
+	def _signature(path):
+		'''Size, modification time and inode of a file, or of every file in a
+		directory.'''
+		if os.path.isdir(path):
+			paths = sorted(os.path.join(root, name)
+				for (root, dirs, names) in os.walk(path) for name in names)
+		else:
+			paths = [path]
+		signature = []
+		for fpath in paths:
+			stat = os.stat(fpath)
+			signature.append([os.path.relpath(fpath, path), stat.st_size,
+				stat.st_mtime_ns, stat.st_ino])
+		return(signature)
+
+	def digest(self, path):
+		'''Content digest of a file or directory, see file_digest. Memoized
+		until its size, modification time or inode change.'''
+		path = os.path.realpath(path)
+		memo = os.path.join(self.digests_dir,
+			hashlib.sha1(path.encode()).hexdigest() + '.json')
+		signature = self._signature(path)
+		try:
+			with open(memo, 'r') as f:
+				known = json.load(f)
+			if known['signature'] == signature:
+				return(known['digest'])
+		except (OSError, ValueError, KeyError):
+			pass
+
+		digest = file_digest(path)
+		if signature == self._signature(path):
+			tmp_path = memo + '.tmp.' + str(os.getpid())
+			with open(tmp_path, 'w') as f:
+				json.dump({'path' : path, 'signature' : signature,
+					'digest' : digest}, f)
+			os.replace(tmp_path, memo)
+		return(digest)
+
+	def result(self, name, paths, options):
+		'''Cache entry of a result.
+
+		Args:
+			name (string): name of the producing step, e.g., the script.
+			paths (list): input files, including the code producing the result.
+			options (dict): options the result depends on, JSON serializable.
+
+		Returns:
+			object: entry, with fetch(outfile, compress) and record(out), see
+				_Result. Never cached if the cache is disabled.
+		'''
+		if type(None) == type(self.cache_dir):
+			return(_NullResult())
+		key = json.dumps([RESULT_CACHE_VERSION, name,
+			[self.digest(path) for path in paths], options], sort_keys = True)
+		return(_Result(self, hashlib.sha1(key.encode()).hexdigest()))
+
+	def evict(self, keep = None):
+		'''Remove least recently used results above max_bytes, holding an
+		exclusive lock on the cache.'''
+		if type(None) == type(self.max_bytes):
+			return
+		with _CacheLock(self.cache_dir):
+			_lru_evict(self.results_dir, self.max_bytes, keep)
+
+def uniform_bins(starts, ends):
+	'''Check if sorted regions are uniform bins.
+
+	Args:
+		starts (np.ndarray): regions start, sorted.
+		ends (np.ndarray): regions end.
+
+	Returns:
+		tuple: (first start, step, width) with end = start + width, or None.
+	'''
+	if 2 > starts.shape[0]:
+		return(None)
+	step = starts[1] - starts[0]
+	width = ends[0] - starts[0]
+	if 0 >= step or 0 > width:
+		return(None)
+	if np.any(np.diff(starts) != step) or np.any(ends - starts != width):
+		return(None)
+	return((starts[0], step, width))
+
+def query_rois(chrom, starts, ends, keep_marginal_overlaps, keep_including):
+	'''Find the ROIs each row is assigned to, in a chromosome of RoiIndex.
+
+	Args:
+		chrom (tuple): RoiIndex (uniform, classes) of the rows chromosome.
+		starts (np.ndarray): rows start.
+		ends (np.ndarray): rows end.
+		keep_marginal_overlaps (bool): assign to partial overlaps.
+		keep_including (bool): assign to included ROIs.
+
+	Returns:
+		tuple: (row, ROI) index arrays, sorted by row then ROI.
+	'''
+	starts = np.asarray(starts, dtype = np.int64)
+	ends = np.asarray(ends, dtype = np.int64)
+	uniform, classes = chrom
+
+	rowi = [np.zeros(0, dtype = 'int')]
+	roii = [np.zeros(0, dtype = 'int')]
+
+	if not type(None) == type(uniform):
+		# Overlapped bins, from start // step and end // step
+		first, step, width, ids = uniform
+		lo = np.maximum(0, -((first + width - starts) // step))
+		hi = np.minimum(ids.shape[0], (ends - first) // step + 1)
+		rows, cols = expand_ranges(lo, hi)
+
+		# Keep only candidates satisfying the assignment conditions
+		bin_starts = first + cols * step
+		keep = overlap_conditions(starts[rows], ends[rows],
+			bin_starts, bin_starts + width,
+			keep_marginal_overlaps, keep_including)
+		rowi.append(rows[keep])
+		roii.append(ids[cols[keep]])
+
+	for (roi_starts, roi_ends, ids, maxlen) in classes:
+		# Candidate ROIs per row, as contiguous ranges of the sorted class
+		lo = np.searchsorted(roi_starts, starts - maxlen, 'left')
+		hi = np.searchsorted(roi_starts, ends, 'right')
+		rows, cols = expand_ranges(lo, hi)
+
+		# Keep only candidates satisfying the assignment conditions
+		keep = overlap_conditions(starts[rows], ends[rows],
+			roi_starts[cols], roi_ends[cols],
+			keep_marginal_overlaps, keep_including)
+		rowi.append(rows[keep])
+		roii.append(ids[cols[keep]])
+
+	rowi = np.concatenate(rowi)
+	roii = np.concatenate(roii)
+	order = sort_pairs(rowi, roii)
+	return((rowi[order], roii[order]))
+
+def sort_pairs(rowi, roii):
+	'''Order (row, ROI) pairs by row, then ROI.
+
+	Pairs are often already sorted, or made of sorted runs, which is checked
+	first and exploited by the stable (merge) sort.
+
+	Args:
+		rowi (np.ndarray): row index of each pair.
+		roii (np.ndarray): ROI index of each pair.
+
+	Returns:
+		np.ndarray or slice: sorting index.
+	'''
+	if 0 == rowi.shape[0]:
+		return(slice(None))
+	key = rowi.astype(np.int64) * (np.max(roii) + 1) + roii
+	if np.all(key[1:] > key[:-1]):
+		return(slice(None))
+	return(np.argsort(key, kind = 'stable'))
+
+def _query_rois_task(task):
+	'''Run query_rois on a tuple of arguments, for process pools.
+
+	Returns:
+		tuple: query_rois output and its wall time, in seconds.
+	'''
+	start_time = time.perf_counter()
+	return((query_rois(*task), time.perf_counter() - start_time))
+
+def expand_ranges(lo, hi):
+	'''Expand a list of [lo, hi) ranges.
+
+	Args:
+		lo (np.ndarray): ranges start (included).
+		hi (np.ndarray): ranges end (excluded).
+
+	Returns:
+		tuple: (range, element) index arrays, one pair per range element.
+	'''
+	counts = np.maximum(hi - lo, 0)
+	rangei = np.repeat(np.arange(counts.shape[0]), counts)
+	offsets = np.cumsum(counts) - counts
+	elemi = np.arange(rangei.shape[0]) - np.repeat(offsets - lo, counts)
+	return((rangei, elemi))
+
+def overlap_conditions(bed_start, bed_end, roi_start, roi_end,
+	keep_marginal_overlaps, keep_including):
+	'''Check if rows should be assigned to ROIs, element-wise.
+
+	Args:
+		bed_start, bed_end (np.ndarray): rows coordinates.
+		roi_start, roi_end (np.ndarray): ROIs coordinates.
 		keep_marginal_overlaps (bool): assign to partial overlaps.
 		keep_including (bool): assign to included ROIs.
+
+	Returns:
+		np.ndarray: boolean mask.
+	'''
+
+	# Start should be higher than the region start
+	condition_start = bed_start >= roi_start
+
+	# End should be lower than the region end
+	condition_end = bed_end <= roi_end
+
+	# Perfectly contained (in)
+	condition_in = np.logical_and(condition_start, condition_end)
+
+	# Rows that include the region
+	condition_larger = np.logical_and(
+		np.logical_not(condition_start), np.logical_not(condition_end))
+
+	if keep_marginal_overlaps:
+		# Partial overlap on a margin, or inside
+		condition_overlap = np.logical_and(
+			bed_start <= roi_end, bed_end >= roi_start)
+		condition_in = np.logical_or(condition_in, np.logical_and(
+			condition_overlap, np.logical_not(condition_larger)))
+
+	if keep_including:
+		# Included (inside) or including
+		condition_in = np.logical_or(condition_in, condition_larger)
+
+	return(condition_in)
+
+def roi_labels(rois, use_name):
+	'''Build ROI labels, in the chr:start-end[:name] format.
+
+	Args:
+		rois (pd.DataFrame): bed file with regions of interest.
 		use_name (bool): also use ROIs name.
-		collapse_method (string): collapse method, default: sum.
 
 	Returns:
-		pd.DataFrame: bed file with added rois column or collapsed.
+		np.ndarray: one label per ROI.
 	'''
+	labels = np.char.add(np.array(rois['chr']).astype('str'), ':')
+	labels = np.char.add(labels, np.array(rois['start']).astype('str'))
+	labels = np.char.add(labels, '-')
+	labels = np.char.add(labels, np.array(rois['end']).astype('str'))
+	if use_name:
+		labels = np.char.add(labels, ':')
+		labels = np.char.add(labels, np.array(rois['name']).astype('str'))
+	return(labels)
 
-	# Assign collapse method for np.ndarray
-	collapse_methods = {
-		'min' : lambda x: np.min(x),
-		'mean' : lambda x: np.mean(x),
-		'median' : lambda x: np.median(x),
-		'max' : lambda x: np.max(x),
-		'count' : lambda x: x.shape[0],
-		'sum' : lambda x: np.sum(x)
-	}
-	if not type(None) == type(collapse_method):
-		collapse = collapse_methods[collapse_method]
-	if type(None) == type(floatValues):
-		floatValues = False
+def _pairwise_block_sums(values, starts, lengths):
+	'''Pairwise sums of segments of at most PAIRWISE_BLOCK values, as numpy.
 
-	# Add regions column
-	bed['rois'] = pd.Series(np.array(['' for i in range(bed.shape[0])]),
-		index = bed.index)
+	Shorter than 8 values are summed in order, longer ones in 8 interleaved
+	partial sums, combined as a tree, then the last (length % 8) values.
+	'''
+	out = np.zeros(lengths.shape[0])
+	short = lengths < 8
+	for k in range(7):
+		rows = np.where(np.logical_and(short, lengths > k))[0]
+		out[rows] += values[starts[rows] + k]
 
-	# Assign reads to rows
-	chr_set = set(bed['chr'])
-	for chri in chr_set:
-		# Select rois and rows
-		chr_bed = bed.iloc[np.where(bed['chr'] == chri)[0], :]
-		chr_roi = rois.iloc[np.where(rois['chr'] == chri)[0], :]
+	rows = np.where(np.logical_not(short))[0]
+	starts = starts[rows]
+	lengths = lengths[rows]
+	full = lengths - lengths % 8
+	partial = [values[starts + j] for j in range(8)]
+	for i in range(8, PAIRWISE_BLOCK, 8):
+		keep = np.where(i < full)[0]
+		for j in range(8):
+			partial[j][keep] += values[starts[keep] + i + j]
+	sums = ((partial[0] + partial[1]) + (partial[2] + partial[3])) + (
+		(partial[4] + partial[5]) + (partial[6] + partial[7]))
+	for k in range(7):
+		keep = np.where(full + k < lengths)[0]
+		sums[keep] += values[starts[keep] + full[keep] + k]
+	out[rows] = sums
+	return(out)
 
-		if 0 == chr_bed.shape[0] or 0 == chr_roi.shape[0]:
-			continue
+def pairwise_sums(values, starts, lengths):
+	'''Sum contiguous segments of values, exactly as np.sum would.
 
-		# Prepare roi label
-		chr_roi_labels = np.array(chr_roi['chr']).astype('str').tolist()
-		chr_roi_labels = np.core.defchararray.add(chr_roi_labels, ':')
-		chr_roi_labels = np.core.defchararray.add(chr_roi_labels,
-			np.array(chr_roi['start']).astype('str').tolist())
-		chr_roi_labels = np.core.defchararray.add(chr_roi_labels, '-')
-		chr_roi_labels = np.core.defchararray.add(chr_roi_labels,
-			np.array(chr_roi['end']).astype('str').tolist())
-		if use_name:
-			chr_roi_labels = np.core.defchararray.add(chr_roi_labels, ':')
-			chr_roi_labels = np.core.defchararray.add(chr_roi_labels,
-				np.array(chr_roi['name']).astype('str').tolist())
-
-		# Build matrix ---------------------------------------------------------
-		bed_hash_start = [hash(i) for i in chr_bed['start']]
-		bed_hash_end = [hash(i) for i in chr_bed['end']]
-		roi_hash_start = [hash(i) for i in chr_roi['start']]
-		roi_hash_end = [hash(i) for i in chr_roi['end']]
-
-		# Start should be higher than the region start
-		condition_start = np.greater_equal.outer(bed_hash_start, roi_hash_start)
-
-		# End should be lower than the region end
-		condition_end = np.logical_not(
-			np.greater.outer(bed_hash_end, roi_hash_end))
-
-		# Perfectly contained (in)
-		condition_in = np.logical_and(condition_start, condition_end)
-
-		if keep_marginal_overlaps or keep_including:
-			# Start should be lower than the region start
-			condition_left_start = np.logical_not(condition_start)
-
-			# End should be higher than the region end
-			condition_right_end = np.logical_not(condition_end)
-
-		if keep_marginal_overlaps:
-			# End should be lower than the region end and higher than its start
-			condition_left_end = np.logical_and(condition_end,
-				np.greater_equal.outer(bed_hash_end, roi_hash_start))
-
-			# Start should be higher than the region start
-			# and lower than its end
-			condition_right_start = np.logical_and(condition_start,
-				np.logical_not(np.greater.outer(bed_hash_start, roi_hash_end)))
-
-			# Partial overlap on left margin
-			condition_left = np.logical_and(
-				condition_left_start, condition_left_end)
-
-			# Partial overlap on right margin
-			condition_right = np.logical_and(
-				condition_right_start, condition_right_end)
-
-			# Partial overla on a margin
-			condition_margins = np.logical_or(condition_left, condition_right)
-
-			# Partial overlap or inside
-			condition_in = np.logical_or(condition_in, condition_margins)
-
-		if keep_including:
-			# Rows that include the region
-			condition_larger = np.logical_and(
-				condition_left_start, condition_right_end)
-
-			# Included (inside) or including
-			condition_in = np.logical_or(condition_in, condition_larger)
-
-		if 0 == condition_in.sum():
-			continue
+	numpy sums floats pairwise: segments longer than PAIRWISE_BLOCK are split
+	in two halves (the first a multiple of 8 long) and summed recursively.
+	Here, every level of the recursion is split and summed at once for all
+	segments, vectorized, so that results match np.sum to the last digit.
 
-		if not type(None) == type(collapse_method):
-			# Collapse row's score to ROIs
-			rois['score'][chr_roi.index.values] = [
-				collapse(chr_bed['score'][condition_in[:, coli]])
-				for coli in range(condition_in.shape[1])]
-		else:
-			# Add rois per row
-			labels = np.tile(chr_roi_labels, (condition_in.shape[0], 1))
-			labels[np.logical_not(condition_in)] = ''
-			bed['rois'][chr_bed.index.values] = [join_trim(labels[rowi, :])
-				for rowi in range(labels.shape[0])]
-	
-	# Return collapsed ROI list
-	if not type(None) == type(collapse_method):
-		rois['score'][np.where(np.isnan(rois['score']))[0]] = 0
-		if not floatValues:
-			rois['score'] = rois['score'].astype('int')
-		return(rois)
+	Args:
+		values (np.ndarray): float64 values.
+		starts (np.ndarray): first value of each segment.
+		lengths (np.ndarray): number of values of each segment.
 
-	# Remove rows without regions
-	if not keep_unassigned_rows:
-		bed = bed[bed['rois'] != '']
+	Returns:
+		np.ndarray: one sum per segment.
+	'''
+	starts = np.asarray(starts, dtype = np.int64)
+	lengths = np.asarray(lengths, dtype = np.int64)
 
-	# Return bed with assigned ROIs (not bed anymore)
-	return(bed)
+	# Split long segments in halves, level by level
+	levels = []
+	while True:
+		split = lengths > PAIRWISE_BLOCK
+		levels.append((starts, lengths, split))
+		if not np.any(split):
+			break
+		half = lengths[split] // 2
+		half -= half % 8
+		starts = np.concatenate((starts[split], starts[split] + half))
+		lengths = np.concatenate((half, lengths[split] - half))
 
-def bin_chr(schr, chrlen, size, step, last_bin):
-	'''Generate bins covering a chromosome.
+	# Sum leaves, then add halves back up to the segments
+	halves = None
+	for (starts, lengths, split) in reversed(levels):
+		out = np.zeros(lengths.shape[0])
+		leaves = np.logical_not(split)
+		out[leaves] = _pairwise_block_sums(values, starts[leaves],
+			lengths[leaves])
+		nsplit = int(np.sum(split))
+		if 0 != nsplit:
+			out[split] = halves[:nsplit] + halves[nsplit:]
+		halves = out
+	return(halves)
+
+def group_reduce(values, groups, ngroups, method):
+	'''Reduce values per group, with a single vectorized pass.
+
+	Float sums (and means) are summed pairwise per group (see pairwise_sums),
+	matching np.sum to the last digit.
 
 	Args:
-		chrlen (int): chromosome length.
-		size (int): bin size.
-		step (int): bin step. Use step == size for not overlapping bins.
-		last_bin (bool): whether to add extra final bin.
+		values (np.ndarray): values to reduce.
+		groups (np.ndarray): group of each value, in [0, ngroups).
+		ngroups (int): number of groups.
+		method (string): one of COLLAPSE_METHODS, but COVERAGE_METHODS.
 
 	Returns:
-		pd.Dataframe: a chr-start-end-name table.
+		np.ndarray: one value per group, NaN for empty groups (0 with count and
+			sum methods).
 	'''
+	if not method in COLLAPSE_METHODS or method in COVERAGE_METHODS:
+		raise ValueError('Unknown collapse method: ' + str(method))
 
-	# Calculate bin borders
-	starts = np.arange(0, int(chrlen) - size, step)
-	ends = starts + size - 1
+	values = np.asarray(values, dtype = 'float')
+	groups = np.asarray(groups, dtype = 'int')
+
+	# Sort values per group (and per value, for the median)
+	if 'median' == method:
+		order = np.lexsort((values, groups))
+	else:
+		order = np.argsort(groups, kind = 'stable')
+	values = values[order]
+	bounds = np.searchsorted(groups[order], np.arange(ngroups + 1), 'left')
+	counts = np.diff(bounds)
+	filled = 0 != counts
+
+	if 'count' == method:
+		return(counts.astype('float'))
+
+	out = np.zeros(ngroups) if 'sum' == method else np.repeat(np.nan, ngroups)
+	if 0 == values.shape[0]:
+		return(out)
+
+	if 'median' == method:
+		# Middle value(s) of each sorted segment
+		lo = bounds[:-1][filled] + (counts[filled] - 1) // 2
+		hi = bounds[:-1][filled] + counts[filled] // 2
+		out[filled] = (values[lo] + values[hi]) / 2.
+	else:
+		# Segmented reduction, over non-empty groups only
+		ufunc = {'min' : np.minimum, 'mean' : np.add,
+			'max' : np.maximum, 'sum' : np.add}[method]
+		if np.add == ufunc and not np.all(np.mod(values, 1) == 0):
+			out[filled] = pairwise_sums(values, bounds[:-1][filled],
+				counts[filled])
+		else:
+			out[filled] = ufunc.reduceat(values, bounds[:-1][filled])
+		if 'mean' == method:
+			out[filled] /= counts[filled]
 
-	if last_bin:
-		# Add last bin
-		starts = starts.tolist()
-		starts.append(starts[-1] + size)
-		starts = np.array(starts)
-		ends = ends.tolist()
-		ends.append(ends[-1] + size)
-		ends = np.array(ends)
-
-	# Generate bin names
-	names = ['bin_' + str(i + 1) for i in range(len(starts))]
-
-	# Produce output bedfile
-	out = pd.DataFrame(
-		data = np.transpose([np.tile(schr, starts.shape[0]),
-			starts, ends, names]),
-		index = np.arange(starts.shape[0]),
-		columns = ['chr', 'start', 'end', 'name']
-	)
-
-	# Output
 	return(out)
+
+class RoiMembership(object):
+	'''Sparse row -> ROI assignments, in CSR format.
+
+	The ROIs of row i are rois[offsets[i]:offsets[i + 1]], sorted, as
+	positional indexes of the ROIs table.
+
+	Attributes:
+		offsets (np.ndarray): nrows + 1 offsets in rois.
+		rois (np.ndarray): ROI indexes.
+	'''
+
+	def __init__(self, rowi, roii, nrows):
+		'''Build from (row, ROI) pairs.
+
+		Args:
+			rowi (np.ndarray): row index of each pair.
+			roii (np.ndarray): ROI index of each pair.
+			nrows (int): number of rows.
+		'''
+		rowi = np.asarray(rowi, dtype = 'int')
+		self.rois = np.asarray(roii, dtype = 'int')
+		self.rois = self.rois[sort_pairs(rowi, self.rois)]
+		self.offsets = np.zeros(nrows + 1, dtype = 'int')
+		np.cumsum(np.bincount(rowi, minlength = nrows), out = self.offsets[1:])
+
+	@property
+	def nrows(self):
+		return(self.offsets.shape[0] - 1)
+
+	def counts(self):
+		'''Number of ROIs per row.'''
+		return(np.diff(self.offsets))
+
+	def rows(self):
+		'''Row index of each (row, ROI) pair.'''
+		return(np.repeat(np.arange(self.nrows), self.counts()))
+
+	def labels(self, roi_labels):
+		'''Join the labels of the ROIs of each row.
+
+		Args:
+			roi_labels (np.ndarray): one label per ROI.
+
+		Returns:
+			np.ndarray: space-separated labels per row, '' if unassigned.
+		'''
+		roi_labels = np.asarray(roi_labels, dtype = 'O')
+		counts = self.counts()
+		out = np.repeat('', self.nrows).astype('O')
+
+		# Append k-th ROI label, for every row with more than k ROIs
+		rows = np.where(0 < counts)[0]
+		out[rows] = roi_labels[self.rois[self.offsets[rows]]]
+		for k in range(1, np.max(counts) if 0 != counts.shape[0] else 0):
+			rows = rows[k < counts[rows]]
+			out[rows] = out[rows] + ' ' + roi_labels[
+				self.rois[self.offsets[rows] + k]]
+
+		return(out)
+
+def assign_membership(
+	rois, bed,
+	keep_marginal_overlaps,
+	keep_including,
+	threads = 1,
+	index = None
+):
+	'''Assign rows from bed to regions in rois.
+
+	Args:
+		rois (pd.DataFrame): bed file with regions of interest.
+		bed (pd.DataFrame): bed file with regions to be assigned to ROIs.
+		keep_marginal_overlaps (bool): assign to partial overlaps.
+		keep_including (bool): assign to included ROIs.
+		threads (int): number of processes, chromosomes are run in parallel.
+		index (RoiIndex): prebuilt index of rois, built if not provided.
+
+	Returns:
+		RoiMembership: ROIs of each bed row.
+	'''
+
+	# Index regions
+	if type(None) == type(index):
+		index = RoiIndex(rois)
+
+	# Group rows per chromosome
+	bed_start = np.asarray(bed['start'])
+	bed_end = np.asarray(bed['end'])
+	chr_codes, chr_set = pd.factorize(bed['chr'])
+	chr_order = np.argsort(chr_codes, kind = 'stable')
+	chr_bounds = np.searchsorted(chr_codes[chr_order],
+		np.arange(len(chr_set) + 1), 'left')
+
+	# Select rows per chromosome, larger chromosomes first
+	chr_tasks = []
+	for chri in range(len(chr_set)):
+		chr_rows = chr_order[chr_bounds[chri]:chr_bounds[chri + 1]]
+		if not chr_set[chri] in index.chroms or 0 == chr_rows.shape[0]:
+			continue
+		chr_tasks.append((chr_set[chri], chr_rows))
+	chr_tasks.sort(key = lambda t: t[1].shape[0], reverse = True)
+
+	# Find (row, ROI) assignments, per chromosome
+	tasks = ((index.chroms[chrn], bed_start[chr_rows].astype(np.int64),
+		bed_end[chr_rows].astype(np.int64),
+		keep_marginal_overlaps, keep_including)
+		for (chrn, chr_rows) in chr_tasks)
+	if 1 < threads and 1 < len(chr_tasks):
+		pool = multiprocessing.Pool(min(threads, len(chr_tasks)))
+		results = pool.imap(_profiled_task, ((_query_rois_task, task,
+			PROFILER.enabled) for task in tasks), chunksize = 1)
+	else:
+		pool = None
+		results = ((_query_rois_task(task), []) for task in tasks)
+
+	rows = [np.zeros(0, dtype = 'int')]
+	rois = [np.zeros(0, dtype = 'int')]
+	try:
+		for (chrn, chr_rows), (((rowi, roii), seconds), records) in zip(
+			chr_tasks, results):
+			PROFILER.extend(records)
+			PROFILER.record('match', seconds, chr_rows.shape[0], chrn)
+			rows.append(chr_rows[rowi])
+			rois.append(roii)
+	finally:
+		# Also stop workers when a task fails
+		if not type(None) == type(pool):
+			pool.terminate()
+			pool.join()
+
+	return(RoiMembership(np.concatenate(rows), np.concatenate(rois),
+		bed.shape[0]))
+
+def assign_to_rois(
+	rois, bed,
+	keep_unassigned_rows,
+	keep_marginal_overlaps,
+	keep_including,
+	use_name,
+	collapse_method = None,
+	floatValues = None,
+	threads = 1,
+	index = None
+):
+	'''Assign rows from bed to regions in rois.
+
+	Args:
+		rois (pd.DataFrame): bed file with regions of interest.
+		bed (pd.DataFrame): bed file with regions to be assigned to ROIs.
+		keep_unassigned_rows (bool): keep rows that do not belong to any ROI.
+		keep_marginal_overlaps (bool): assign to partial overlaps.
+		keep_including (bool): assign to included ROIs.
+		use_name (bool): also use ROIs name.
+		collapse_method (string): collapse method, default: sum.
+		floatValues (bool): keep collapsed scores as floats.
+		threads (int): number of processes, chromosomes are run in parallel.
+		index (RoiIndex): prebuilt index of rois, built if not provided.
+
+	Returns:
+		pd.DataFrame: bed file with added rois column or collapsed.
+	'''
+
+	if not type(None) == type(collapse_method):
+		if not collapse_method in COLLAPSE_METHODS:
+			raise ValueError('Unknown collapse method: ' + str(collapse_method))
+	if type(None) == type(floatValues):
+		floatValues = False
+
+	# Return ROIs with the coverage of rows, no assignment needed
+	if collapse_method in COVERAGE_METHODS:
+		rois['score'] = collapse_coverage(rois, bed, collapse_method)
+		if not floatValues:
+			rois['score'] = rois['score'].astype('int')
+		return(rois)
+
+	# Index regions
+	if type(None) == type(index):
+		index = RoiIndex(rois)
+
+	# Assign rows to ROIs
+	membership = assign_membership(rois, bed,
+		keep_marginal_overlaps, keep_including, threads, index)
+
+	# Return collapsed ROI list
+	if not type(None) == type(collapse_method):
+		rois['score'] = collapse_scores(rois, bed, membership, index,
+			collapse_method)
+		if not floatValues:
+			rois['score'] = rois['score'].astype('int')
+		return(rois)
+
+	# Add regions column
+	with PROFILER.stage('labels', bed.shape[0]):
+		bed['rois'] = pd.Series(membership.labels(index.labels(use_name)),
+			index = bed.index)
+
+	# Remove rows without regions
+	if not keep_unassigned_rows:
+		bed = bed[bed['rois'] != '']
+
+	# Return bed with assigned ROIs (not bed anymore)
+	return(bed)
+
+def collapse_scores(rois, bed, membership, index, collapse_method):
+	'''Collapse the score of assigned bed rows to ROIs.
+
+	Args:
+		rois (pd.DataFrame): bed file with regions of interest.
+		bed (pd.DataFrame): bed file with rows assigned to ROIs.
+		membership (RoiMembership): ROIs of each bed row.
+		index (RoiIndex): index of rois.
+		collapse_method (string): collapse method.
+
+	Returns:
+		np.ndarray: float ROI scores. Collapsed on chromosomes with assigned
+			rows, from rois elsewhere, 0 if missing.
+	'''
+	roi_score = np.array(rois['score'], dtype = 'float')
+
+	# Collapse row's score to ROIs, on chromosomes with assigned rows
+	with PROFILER.stage('collapse', membership.rois.shape[0]):
+		scores = np.asarray(bed['score'])[membership.rows()]
+		if np.issubdtype(scores.dtype, np.integer):
+			scores = scores.astype(np.int64)
+		else:
+			scores = scores.astype(np.float64)
+		collapsed = group_reduce(scores,
+			membership.rois, rois.shape[0], collapse_method)
+		collapsed_rois = np.isin(index.chr_codes,
+			index.chr_codes[membership.rois])
+		roi_score[collapsed_rois] = collapsed[collapsed_rois]
+
+	roi_score[np.isnan(roi_score)] = 0
+	return(roi_score)
+
+def coverage_track(starts, ends, scores):
+	'''Run-length coverage of rows, from a difference array.
+
+	Every row [start, end] adds its score to each base pair it spans: +score
+	at start and -score at end + 1 are summed per position, then accumulated
+	once. The track has a run per distinct row border, however much rows
+	overlap, and its prefix sums give the coverage of any region with two
+	lookups, see coverage_sum.
+
+	Args:
+		starts (np.ndarray): rows start.
+		ends (np.ndarray): rows end, included.
+		scores (np.ndarray): rows score.
+
+	Returns:
+		tuple: (borders, depth, prefix). Coverage is depth[k] from borders[k]
+			to borders[k + 1] (excluded) and 0 out of the borders, prefix[k] is
+			the coverage summed over the positions before borders[k].
+	'''
+	keep = ends >= starts
+	pos = np.concatenate((starts[keep], ends[keep] + 1))
+	steps = np.concatenate((scores[keep], -scores[keep]))
+	if 0 == pos.shape[0]:
+		return((pos, steps, steps))
+
+	# Sum steps per position, then accumulate them into depth runs
+	order = np.argsort(pos, kind = 'stable')
+	pos = pos[order]
+	first = np.where(np.append(True, pos[1:] != pos[:-1]))[0]
+	borders = pos[first]
+	depth = np.cumsum(np.add.reduceat(steps[order], first))
+	depth[-1] = 0
+
+	prefix = np.zeros_like(depth)
+	np.cumsum(depth[:-1] * np.diff(borders), out = prefix[1:])
+	return((borders, depth, prefix))
+
+def coverage_before(track, x):
+	'''Coverage summed over the positions before x, see coverage_track.'''
+	borders, depth, prefix = track
+	k = np.searchsorted(borders, x, 'right') - 1
+	out = np.zeros(x.shape[0], dtype = prefix.dtype)
+	inside = 0 <= k
+	k = k[inside]
+	out[inside] = prefix[k] + depth[k] * (x[inside] - borders[k])
+	return(out)
+
+def coverage_sum(track, starts, ends):
+	'''Coverage summed over the base pairs of regions [start, end].'''
+	return(coverage_before(track, ends + 1) - coverage_before(track, starts))
+
+def collapse_coverage(rois, bed, collapse_method):
+	'''Collapse the score of bed rows to ROIs, weighted by overlap in bp.
+
+	Rows are not assigned to ROIs: a per-chromosome coverage track is built
+	once from the rows (see coverage_track), and every ROI reads its coverage
+	from it. A row thus counts in each ROI for the base pairs they share,
+	without assignment conditions, in O((N + M) log N) for N rows and M ROIs.
+
+	Args:
+		rois (pd.DataFrame): bed file with regions of interest.
+		bed (pd.DataFrame): bed file with rows to be collapsed.
+		collapse_method (string): coverage, for the score times the overlap
+			of every row, summed; covmean, for the mean coverage per bp.
+
+	Returns:
+		np.ndarray: float ROI scores. Collapsed on chromosomes with rows
+			overlapping ROIs, from rois elsewhere, 0 if missing. As
+			collapse_scores.
+	'''
+	if not collapse_method in COVERAGE_METHODS:
+		raise ValueError('Unknown coverage method: ' + str(collapse_method))
+	roi_score = np.array(rois['score'], dtype = 'float')
+	roi_start = np.asarray(rois['start'], dtype = np.int64)
+	roi_end = np.asarray(rois['end'], dtype = np.int64)
+
+	bed_start = np.asarray(bed['start'], dtype = np.int64)
+	bed_end = np.asarray(bed['end'], dtype = np.int64)
+	scores = np.asarray(bed['score'])
+	if np.issubdtype(scores.dtype, np.integer):
+		scores = scores.astype(np.int64)
+		valid = np.ones(scores.shape[0], dtype = 'bool')
+	else:
+		# Rows without a score do not cover anything
+		scores = scores.astype(np.float64)
+		valid = np.logical_not(np.isnan(scores))
+
+	with PROFILER.stage('coverage', bed.shape[0]):
+		roi_groups = rois.groupby('chr', sort = False).indices
+		bed_groups = bed.groupby('chr', sort = False).indices
+		for (chrn, rows) in bed_groups.items():
+			if not chrn in roi_groups:
+				continue
+			ids = roi_groups[chrn]
+			rows = rows[valid[rows]]
+
+			# Leave ROIs alone on chromosomes without overlapping rows
+			overlap = coverage_sum(coverage_track(bed_start[rows],
+				bed_end[rows], np.ones(rows.shape[0], dtype = np.int64)),
+				roi_start[ids], roi_end[ids])
+			if not np.any(0 < overlap):
+				continue
+
+			total = coverage_sum(coverage_track(bed_start[rows], bed_end[rows],
+				scores[rows]), roi_start[ids], roi_end[ids])
+			if 'covmean' == collapse_method:
+				total = total / np.maximum(roi_end[ids] - roi_start[ids] + 1, 1)
+			roi_score[ids] = total
+
+	roi_score[np.isnan(roi_score)] = 0
+	return(roi_score)
+
+# ROIs and index shared by sample workers, see collapse_samples
+_sample_rois = None
+_sample_index = None
+
+def _init_sample_worker(rois, index):
+	'''Store the ROIs and their index once per worker process.'''
+	global _sample_rois, _sample_index
+	_sample_rois = rois
+	_sample_index = index
+
+def _sample_bed(bedfile, skip_header):
+	'''Read a bedfile (or take a table), only on the shared ROIs chromosomes.'''
+	if isinstance(bedfile, pd.DataFrame):
+		return(bedfile)
+	return(read_bed(bedfile, skip_header,
+		chroms = list(_sample_index.chroms.keys()), regions = _sample_rois))
+
+def _sample_membership(bedfile, skip_header, keep_marginal_overlaps,
+	keep_including, threads):
+	'''Read a bedfile (or take a table) and assign it to the shared ROIs.'''
+	bed = _sample_bed(bedfile, skip_header)
+	membership = assign_membership(_sample_rois, bed,
+		keep_marginal_overlaps, keep_including, threads, _sample_index)
+	return((bed, membership))
+
+def _collapse_sample_task(task):
+	'''Read a bedfile (or take a table) and collapse it to the shared ROIs.'''
+	(bedfile, skip_header, keep_marginal_overlaps, keep_including,
+		collapse_method, threads) = task
+	bed, membership = _sample_membership(bedfile, skip_header,
+		keep_marginal_overlaps, keep_including, threads)
+	return(collapse_scores(_sample_rois, bed, membership, _sample_index,
+		collapse_method))
+
+def _coverage_sample_task(task):
+	'''Read a bedfile (or take a table) and collapse its coverage to the
+	shared ROIs.'''
+	(bedfile, skip_header, keep_marginal_overlaps, keep_including,
+		collapse_method, threads) = task
+	return(collapse_coverage(_sample_rois, _sample_bed(bedfile, skip_header),
+		collapse_method))
+
+def _state_sample_task(task):
+	'''Read a bedfile (or take a table) and reduce it to ROI partial state.'''
+	(bedfile, skip_header, keep_marginal_overlaps, keep_including,
+		collapse_method, threads) = task
+	bed, membership = _sample_membership(bedfile, skip_header,
+		keep_marginal_overlaps, keep_including, threads)
+	return(partial_state(_sample_rois, bed, membership, _sample_index))
+
+def _map_samples(rois, index, func, tasks, threads):
+	'''Run sample tasks sharing the ROIs and their index, in parallel if more
+	than one task and process. Worker PROFILER records are added to the
+	parent ones.'''
+	if 1 < threads and 1 < len(tasks):
+		pool = multiprocessing.Pool(min(threads, len(tasks)),
+			_init_sample_worker, (rois, index))
+		try:
+			results = []
+			for (result, records) in pool.imap(_profiled_task, [(func, task,
+				PROFILER.enabled) for task in tasks], chunksize = 1):
+				PROFILER.extend(records)
+				results.append(result)
+		finally:
+			# Also stop workers when a task fails
+			pool.terminate()
+			pool.join()
+	else:
+		_init_sample_worker(rois, index)
+		try:
+			results = [func(task) for task in tasks]
+		finally:
+			_init_sample_worker(None, None)
+	return(results)
+
+def collapse_samples(
+	rois, bedfiles,
+	keep_marginal_overlaps,
+	keep_including,
+	collapse_method = 'sum',
+	floatValues = False,
+	threads = 1,
+	skip_header = None,
+	index = None
+):
+	'''Collapse several bedfiles to the same regions, as a wide matrix.
+
+	The ROIs are indexed once and shared by all samples. With more than one
+	bedfile, samples are read and collapsed in parallel, otherwise the
+	chromosomes of the single sample are.
+
+	Args:
+		rois (pd.DataFrame): bed file with regions of interest.
+		bedfiles (list): paths to bed files with rows to be collapsed, or
+			already read bed tables.
+		keep_marginal_overlaps (bool): assign to partial overlaps.
+		keep_including (bool): assign to included ROIs.
+		collapse_method (string): collapse method.
+		floatValues (bool): keep collapsed scores as floats.
+		threads (int): number of processes.
+		skip_header (bool): whether bedfiles have a header, None to detect it.
+		index (RoiIndex): prebuilt index of rois, built if not provided.
+
+	Returns:
+		pd.DataFrame: chr-start-end-name table of the ROIs, plus score_1 to
+			score_N columns, one per bedfile.
+	'''
+	if not collapse_method in COLLAPSE_METHODS:
+		raise ValueError('Unknown collapse method: ' + str(collapse_method))
+
+	# Index regions
+	if type(None) == type(index):
+		index = RoiIndex(rois)
+
+	# Collapse samples, in parallel if more than one
+	tasks = [(bedfile, skip_header, keep_marginal_overlaps, keep_including,
+		collapse_method, threads if 1 == len(bedfiles) else 1)
+		for bedfile in bedfiles]
+	scores = _map_samples(rois, index, _coverage_sample_task
+		if collapse_method in COVERAGE_METHODS else _collapse_sample_task,
+		tasks, threads)
+	return(samples_table(rois, scores, floatValues))
+
+def samples_table(rois, scores, floatValues = False):
+	'''Table of ROIs with one score column per sample.
+
+	Args:
+		rois (pd.DataFrame): bed file with regions of interest.
+		scores (list): np.ndarray of ROI scores, one per sample.
+		floatValues (bool): keep scores as floats.
+
+	Returns:
+		pd.DataFrame: chr-start-end-name table of the ROIs, plus score_1 to
+			score_N columns.
+	'''
+	matrix = np.column_stack(scores) if 0 != len(scores) else np.zeros(
+		(rois.shape[0], 0))
+	if not floatValues:
+		matrix = matrix.astype('int')
+	table = rois.iloc[:, :4].reset_index(drop = True)
+	return(pd.concat([table, pd.DataFrame(matrix, columns = [
+		'score_' + str(i + 1) for i in range(len(scores))])], axis = 1))
+
+def partial_state(rois, bed, membership, index):
+	'''Reduce the score of assigned bed rows to mergeable ROI statistics.
+
+	Args:
+		rois (pd.DataFrame): bed file with regions of interest.
+		bed (pd.DataFrame): bed file with rows assigned to ROIs.
+		membership (RoiMembership): ROIs of each bed row.
+		index (RoiIndex): index of rois.
+
+	Returns:
+		dict: per-ROI sum, count, min and max of the assigned scores, and
+			touched, whether the chromosome of a ROI has assigned rows.
+	'''
+	with PROFILER.stage('collapse', membership.rois.shape[0]):
+		scores = np.asarray(bed['score'])[membership.rows()].astype(np.float64)
+		state = dict((method, group_reduce(scores, membership.rois,
+			rois.shape[0], method)) for method in ('sum', 'count', 'min', 'max'))
+		state['touched'] = np.isin(index.chr_codes,
+			index.chr_codes[membership.rois])
+	return(state)
+
+def regions_digest(rois):
+	'''SHA-1 digest of the chromosome, start and end of the ROIs.'''
+	digest = hashlib.sha1()
+	digest.update('\n'.join(rois['chr'].astype('str')).encode())
+	for col in ('start', 'end'):
+		digest.update(np.ascontiguousarray(rois[col], dtype = np.int64))
+	return(digest.hexdigest())
+
+class RoiState(object):
+	'''Mergeable per-ROI statistics of several samples, for incremental runs.
+
+	Sums, counts, minima and maxima of the scores assigned to every ROI are
+	kept per sample, so that new rows (e.g., a new sequencing lane) can be
+	added without reading previous rows again. Sum, count, mean, min and max
+	are collapsed from them. The median would require every score, so it is
+	not available: collapse the cumulative bedfiles instead.
+
+	Attributes:
+		sum, count, min, max (np.ndarray): ROIs x samples statistics.
+		touched (np.ndarray): ROIs x samples, whether the chromosome of a ROI
+			had assigned rows (otherwise, the ROI keeps its own score).
+		meta (dict): format version, regions digest, number of ROIs and
+			assignment flags, checked when updating.
+	'''
+
+	METHODS = ('min', 'mean', 'max', 'count', 'sum')
+
+	def __init__(self, nrois, nsamples, meta):
+		'''Empty state.
+
+		Args:
+			nrois (int): number of ROIs.
+			nsamples (int): number of samples.
+			meta (dict): see RoiState.meta.
+		'''
+		self.sum = np.zeros((nrois, nsamples))
+		self.count = np.zeros((nrois, nsamples))
+		self.min = np.full((nrois, nsamples), np.inf)
+		self.max = np.full((nrois, nsamples), -np.inf)
+		self.touched = np.zeros((nrois, nsamples), dtype = bool)
+		self.meta = meta
+
+	@staticmethod
+	def describe(rois, keep_marginal_overlaps, keep_including):
+		'''Meta data identifying the ROIs and assignment of a state.'''
+		return({'version' : ROI_STATE_VERSION, 'nrois' : int(rois.shape[0]),
+			'regions' : regions_digest(rois),
+			'keep_marginal_overlaps' : bool(keep_marginal_overlaps),
+			'keep_including' : bool(keep_including)})
+
+	def update(self, samplei, partial):
+		'''Merge the partial state of a sample, see partial_state.'''
+		filled = 0 != partial['count']
+		self.sum[:, samplei] += partial['sum']
+		self.count[:, samplei] += partial['count']
+		self.min[filled, samplei] = np.minimum(self.min[filled, samplei],
+			partial['min'][filled])
+		self.max[filled, samplei] = np.maximum(self.max[filled, samplei],
+			partial['max'][filled])
+		self.touched[:, samplei] |= partial['touched']
+
+	def collapse(self, rois, collapse_method):
+		'''Collapsed ROI scores, as collapse_scores on every added row.
+
+		Args:
+			rois (pd.DataFrame): bed file with regions of interest.
+			collapse_method (string): one of RoiState.METHODS.
+
+		Returns:
+			list: np.ndarray of float ROI scores, one per sample.
+		'''
+		if not collapse_method in self.METHODS:
+			raise ValueError('Cannot collapse incrementally with ' +
+				str(collapse_method) + ', use one of: ' +
+				', '.join(self.METHODS))
+
+		filled = 0 != self.count
+		if 'sum' == collapse_method:
+			collapsed = self.sum.copy()
+		elif 'count' == collapse_method:
+			collapsed = self.count.copy()
+		else:
+			collapsed = np.full(self.sum.shape, np.nan)
+			if 'mean' == collapse_method:
+				collapsed[filled] = self.sum[filled] / self.count[filled]
+			else:
+				collapsed[filled] = getattr(self, collapse_method)[filled]
+
+		scores = []
+		for samplei in range(self.sum.shape[1]):
+			roi_score = np.array(rois['score'], dtype = 'float')
+			touched = self.touched[:, samplei]
+			roi_score[touched] = collapsed[touched, samplei]
+			roi_score[np.isnan(roi_score)] = 0
+			scores.append(roi_score)
+		return(scores)
+
+	def save(self, path):
+		'''Write the state to a .npz file, replacing it atomically.'''
+		tmp_path = path + '.tmp.' + str(os.getpid())
+		with open(tmp_path, 'wb') as f:
+			np.savez(f, sum = self.sum, count = self.count, min = self.min,
+				max = self.max, touched = self.touched,
+				meta = np.array(json.dumps(self.meta)))
+		os.replace(tmp_path, path)
+
+	@staticmethod
+	def load(path):
+		'''Read a state written by RoiState.save.'''
+		with np.load(path) as data:
+			meta = json.loads(str(data['meta']))
+			if ROI_STATE_VERSION != meta.get('version'):
+				raise ValueError('Unsupported ROI state version: ' + path)
+			state = RoiState(0, 0, meta)
+			for key in ('sum', 'count', 'min', 'max', 'touched'):
+				setattr(state, key, data[key])
+		return(state)
+
+def update_samples_state(
+	rois, bedfiles, state,
+	keep_marginal_overlaps,
+	keep_including,
+	threads = 1,
+	skip_header = None,
+	index = None
+):
+	'''Add the rows of several bedfiles to the incremental state of the ROIs.
+
+	Bedfiles are run as in collapse_samples, but reduced to mergeable
+	statistics (see RoiState), one sample per bedfile.
+
+	Args:
+		rois (pd.DataFrame): bed file with regions of interest.
+		bedfiles (list): paths to bed files (or bed tables) with new rows, one
+			per sample.
+		state (RoiState): state to update, a new one if None.
+		keep_marginal_overlaps (bool): assign to partial overlaps.
+		keep_including (bool): assign to included ROIs.
+		threads (int): number of processes.
+		skip_header (bool): whether bedfiles have a header, None to detect it.
+		index (RoiIndex): prebuilt index of rois, built if not provided.
+
+	Returns:
+		RoiState: updated state.
+	'''
+	meta = RoiState.describe(rois, keep_marginal_overlaps, keep_including)
+	if type(None) == type(state):
+		state = RoiState(rois.shape[0], len(bedfiles), meta)
+	elif state.meta != meta:
+		raise ValueError('The state was built with different regions or ' +
+			'assignment options (-m, -l).')
+	elif state.sum.shape[1] != len(bedfiles):
+		raise ValueError('The state has ' + str(state.sum.shape[1]) +
+			' samples, but ' + str(len(bedfiles)) + ' bedfiles were given.')
+
+	if type(None) == type(index):
+		index = RoiIndex(rois)
+
+	tasks = [(bedfile, skip_header, keep_marginal_overlaps, keep_including,
+		None, threads if 1 == len(bedfiles) else 1) for bedfile in bedfiles]
+	partials = _map_samples(rois, index, _state_sample_task, tasks, threads)
+	for (samplei, partial) in enumerate(partials):
+		state.update(samplei, partial)
+	return(state)
+
+def iter_assign_to_rois(
+	rois, chunks,
+	keep_unassigned_rows,
+	keep_marginal_overlaps,
+	keep_including,
+	use_name,
+	threads = 1,
+	index = None
+):
+	'''Assign rows to regions in rois, one chunk of rows at a time.
+
+	The ROIs are indexed once, and only the current chunk is kept in memory.
+
+	Args:
+		rois (pd.DataFrame): bed file with regions of interest.
+		chunks (iterable): pd.DataFrame chunks of the bed file, e.g., from
+			pd.read_csv with chunksize.
+		keep_unassigned_rows (bool): keep rows that do not belong to any ROI.
+		keep_marginal_overlaps (bool): assign to partial overlaps.
+		keep_including (bool): assign to included ROIs.
+		use_name (bool): also use ROIs name.
+		threads (int): number of processes, chromosomes are run in parallel.
+		index (RoiIndex): prebuilt index of rois, built if not provided.
+
+	Yields:
+		pd.DataFrame: bed chunk with added rois column.
+	'''
+	if type(None) == type(index):
+		index = RoiIndex(rois)
+	for chunk in chunks:
+		yield(assign_to_rois(rois, chunk, keep_unassigned_rows,
+			keep_marginal_overlaps, keep_including, use_name,
+			threads = threads, index = index))
+
+def draw_without_replacement(counts, nsample, rng):
+	'''Draw items without replacement from bins (multivariate hypergeometric).
+
+	Uses numpy marginals method when possible. Otherwise, the sample is split
+	top-down over a binary tree of bins, one vectorized hypergeometric draw per
+	tree level. Where a tree node holds more than 1e9 items (numpy limit), the
+	split is drawn from the binomial approximation.
+
+	Args:
+		counts (np.ndarray): items per bin.
+		nsample (int): number of items to draw.
+		rng (np.random.Generator): random number generator.
+
+	Returns:
+		np.ndarray: items drawn per bin.
+	'''
+	counts = np.asarray(counts, dtype = np.int64)
+	limit = 10**9
+	if counts.sum() < limit:
+		return(rng.multivariate_hypergeometric(counts, nsample,
+			method = 'marginals'))
+
+	# Bin sums per tree level, bottom-up
+	levels = [counts]
+	while 1 < levels[-1].shape[0]:
+		if 1 == levels[-1].shape[0] % 2:
+			levels[-1] = np.append(levels[-1], 0)
+		levels.append(levels[-1][0::2] + levels[-1][1::2])
+
+	# Split sample between the halves of each node, top-down
+	drawn = np.array([nsample], dtype = np.int64)
+	for level in reversed(levels[:-1]):
+		drawn = drawn[:(level.shape[0] // 2)]
+		left = level[0::2]
+		right = level[1::2]
+		take = np.zeros(drawn.shape[0], dtype = np.int64)
+
+		exact = np.logical_and(left < limit, right < limit)
+		take[exact] = rng.hypergeometric(left[exact], right[exact], drawn[exact])
+
+		approx = np.logical_not(exact)
+		take[approx] = rng.binomial(drawn[approx],
+			left[approx] / (left[approx] + right[approx]).astype('float'))
+		take = np.clip(take, np.maximum(0, drawn - right),
+			np.minimum(left, drawn))
+
+		level_drawn = np.zeros(level.shape[0], dtype = np.int64)
+		level_drawn[0::2] = take
+		level_drawn[1::2] = drawn - take
+		drawn = level_drawn
+
+	return(drawn[:counts.shape[0]])
+
+def shuffle_counts(counts, nshuffle, rng):
+	'''Move reads between bins, uniformly at random.
+
+	nshuffle random reads (without replacement) are removed from their bins
+	and reassigned to uniformly random bins. Works on the count vector, with
+	memory and time proportional to the number of bins.
+
+	Args:
+		counts (np.ndarray): reads per bin.
+		nshuffle (int): number of reads to move.
+		rng (np.random.Generator): random number generator.
+
+	Returns:
+		np.ndarray: shuffled reads per bin.
+	'''
+	counts = np.asarray(counts, dtype = np.int64)
+	removed = draw_without_replacement(counts, nshuffle, rng)
+	added = rng.multinomial(nshuffle,
+		np.repeat(1. / counts.shape[0], counts.shape[0]))
+	return(counts - removed + added)
+
+def shuffle_rng(seed, filei, iteri):
+	'''Independent random generator of a (file, iteration) pair.
+
+	Streams are spawned from the master seed (numpy SeedSequence), so they
+	only depend on seed, filei and iteri, not on the order they are used in.
+
+	Args:
+		seed (int): master seed.
+		filei (int): file index.
+		iteri (int): iteration index.
+
+	Returns:
+		np.random.Generator: random number generator.
+	'''
+	return(np.random.Generator(np.random.PCG64(
+		np.random.SeedSequence(seed, spawn_key = (filei, iteri)))))
+
+def _shuffle_counts_task(task):
+	'''Run shuffle_counts for a (counts, nshuffle, seed, filei, iteri) tuple.
+
+	Returns:
+		tuple: shuffle_counts output and its wall time, in seconds.
+	'''
+	counts, nshuffle, seed, filei, iteri = task
+	start_time = time.perf_counter()
+	shuffled = shuffle_counts(counts, nshuffle, shuffle_rng(seed, filei, iteri))
+	return((shuffled, time.perf_counter() - start_time))
+
+def iter_shuffle_counts(counts, nshuffle, niter, seed, threads = 1):
+	'''Shuffle the reads of several count vectors, several times.
+
+	Each (file, iteration) pair uses its own random stream (see shuffle_rng),
+	and pairs are run on a process pool. The output does not depend on the
+	number of processes.
+
+	Args:
+		counts (list): np.ndarray of reads per bin, one per file.
+		nshuffle (list): number of reads to move, one per file.
+		niter (int): number of iterations.
+		seed (int): master seed.
+		threads (int): number of processes.
+
+	Yields:
+		tuple: (file index, iteration index, shuffled reads per bin), sorted by
+			file then iteration.
+	'''
+	pairs = [(filei, iteri)
+		for filei in range(len(counts)) for iteri in range(niter)]
+	tasks = ((counts[filei], nshuffle[filei], seed, filei, iteri)
+		for (filei, iteri) in pairs)
+
+	if 1 < threads and 1 < len(pairs):
+		pool = multiprocessing.Pool(min(threads, len(pairs)))
+		results = pool.imap(_shuffle_counts_task, tasks)
+	else:
+		pool = None
+		results = (_shuffle_counts_task(task) for task in tasks)
+
+	try:
+		for (filei, iteri), (shuffled, seconds) in zip(pairs, results):
+			PROFILER.record('shuffle', seconds, nshuffle[filei])
+			yield((filei, iteri, shuffled))
+	finally:
+		# Also stop workers when a task fails, or iteration stops early
+		if not type(None) == type(pool):
+			pool.terminate()
+			pool.join()
+
+class NullSummary(object):
+	'''Streaming per-bin summary of a null distribution (e.g., shuffles).
+
+	Keeps, per bin, running mean and variance (Welford), min, max and the
+	number of values greater/lower than or equal to the observed score. For
+	quantiles, a reservoir sample of fixed size is kept per bin: quantiles are
+	exact as long as the number of updates does not exceed the sample size.
+
+	Attributes:
+		n (int): number of updates.
+		observed (np.ndarray): observed score per bin.
+	'''
+
+	def __init__(self, observed, quantiles = (), sketch_size = 100,
+		rng = None):
+		'''Initialize empty summary.
+
+		Args:
+			observed (np.ndarray): observed score per bin.
+			quantiles (list): quantiles to report, in [0, 1].
+			sketch_size (int): values kept per bin for quantiles.
+			rng (np.random.Generator): for the reservoir sample.
+		'''
+		self.observed = np.asarray(observed, dtype = 'float')
+		self.quantiles = list(quantiles)
+		self.n = 0
+
+		nbins = self.observed.shape[0]
+		self._mean = np.zeros(nbins)
+		self._m2 = np.zeros(nbins)
+		self._min = np.repeat(np.inf, nbins)
+		self._max = np.repeat(-np.inf, nbins)
+		self._n_ge = np.zeros(nbins, dtype = 'int')
+		self._n_le = np.zeros(nbins, dtype = 'int')
+
+		if 0 != len(self.quantiles):
+			self._sketch = np.zeros((nbins, sketch_size))
+			self._rng = rng if not type(None) == type(rng) else \
+				np.random.default_rng()
+
+	def update(self, values):
+		'''Add one value per bin, e.g., the scores of an iteration.'''
+		values = np.asarray(values, dtype = 'float')
+		self.n += 1
+
+		delta = values - self._mean
+		self._mean += delta / self.n
+		self._m2 += delta * (values - self._mean)
+		np.minimum(self._min, values, out = self._min)
+		np.maximum(self._max, values, out = self._max)
+		self._n_ge += values >= self.observed
+		self._n_le += values <= self.observed
+
+		if 0 != len(self.quantiles):
+			# Reservoir sampling, the same slot for every bin
+			if self.n <= self._sketch.shape[1]:
+				self._sketch[:, self.n - 1] = values
+			else:
+				slot = self._rng.integers(0, self.n)
+				if slot < self._sketch.shape[1]:
+					self._sketch[:, slot] = values
+
+	def table(self):
+		'''Summary table, one row per bin.
+
+		Returns:
+			pd.DataFrame: mean, sd, min, max, quantiles (as qX), counts of null
+				values >= (n_ge) and <= (n_le) the observed score, and their
+				empirical p-values (n + 1) / (iterations + 1).
+		'''
+		out = pd.DataFrame({'mean' : self._mean})
+		out['sd'] = np.sqrt(self._m2 / (self.n - 1)) if 1 < self.n else np.nan
+		out['min'] = self._min
+		out['max'] = self._max
+
+		if 0 != len(self.quantiles):
+			sketch = self._sketch[:, :min(self.n, self._sketch.shape[1])]
+			for q in self.quantiles:
+				out['q' + str(q)] = np.quantile(sketch, q, axis = 1)
+
+		out['n_ge'] = self._n_ge
+		out['n_le'] = self._n_le
+		out['p_ge'] = (self._n_ge + 1.) / (self.n + 1)
+		out['p_le'] = (self._n_le + 1.) / (self.n + 1)
+		return(out)
+
+def null_summary_table(bed, summary):
+	'''Bed rows followed by their null summary, as shuffle.py --summary.
+
+	Args:
+		bed (pd.DataFrame): shuffled bed table, with the observed score.
+		summary (NullSummary): null summary of its rows.
+
+	Returns:
+		pd.DataFrame: the columns of bed, then those of summary.table().
+	'''
+	return(pd.concat([bed.reset_index(drop = True), summary.table()],
+		axis = 1))
+
+def shuffle_reads(preshuffle, nbins, nshuffle, rs):
+	'''Move reads between bins, with the per-read method of version 1.0.
+
+	Reproduces the output of previous versions for a given seed state.
+
+	Args:
+		preshuffle (np.ndarray): bin of each read.
+		nbins (int): number of bins.
+		nshuffle (int): number of reads to move (drawn with replacement).
+		rs (np.random.RandomState): random number generator.
+
+	Returns:
+		np.ndarray: shuffled reads per bin.
+	'''
+	pos_from = rs.randint(0, len(preshuffle), nshuffle)
+	pos_to = rs.randint(0, nbins, nshuffle)
+
+	shuffled = np.array(preshuffle)
+	shuffled[pos_from] = pos_to
+
+	counts = np.unique(shuffled, return_counts = True)
+	out = np.zeros(nbins, dtype = 'int')
+	out[counts[0]] = counts[1]
+	return(out)
+
+def coord_dtype(max_value):
+	'''Smallest unsigned dtype for coordinates up to max_value.'''
+	if max_value < np.iinfo(np.uint32).max:
+		return(np.dtype(np.uint32))
+	return(np.dtype(np.int64))
+
+def bin_chr_coords(chrlen, size, step, last_bin):
+	'''Generate bin borders covering a chromosome.
+
+	Args:
+		chrlen (int): chromosome length.
+		size (int): bin size.
+		step (int): bin step. Use step == size for not overlapping bins.
+		last_bin (bool): whether to add extra final bin.
+
+	Returns:
+		tuple: (starts, ends) integer arrays, with compact dtype.
+	'''
+	chrlen = int(np.asarray(chrlen).item())
+	dtype = coord_dtype(chrlen + 2 * size)
+
+	# Calculate bin borders
+	starts = np.arange(0, chrlen - size, step, dtype = dtype)
+
+	if last_bin:
+		# Add last bin
+		starts = np.append(starts,
+			starts[-1] + size if 0 != starts.shape[0] else 0).astype(dtype)
+	ends = starts + (size - 1)
+
+	return((starts, ends))
+
+def bin_names(first, last, prefix = ''):
+	'''Generate bin names, from prefixbin_first to prefixbin_last.'''
+	return(np.char.add(prefix + 'bin_',
+		np.arange(first, last + 1).astype('str')).astype('O'))
+
+def iter_bins(lengths, size, step, last_bin):
+	'''Generate bins covering every chromosome, one chromosome at a time.
+
+	Args:
+		lengths (pd.DataFrame): chromosome lengths, with chr and len columns.
+		size (int): bin size.
+		step (int): bin step. Use step == size for not overlapping bins.
+		last_bin (bool): whether to add extra final bin.
+
+	Yields:
+		tuple: (chromosome, starts, ends), see bin_chr_coords.
+	'''
+	for (schr, chrlen) in zip(lengths['chr'], lengths['len']):
+		with PROFILER.stage('bins', chrom = schr) as stage:
+			starts, ends = bin_chr_coords(chrlen, size, step, last_bin)
+			stage.add_rows(starts.shape[0])
+		yield((schr, starts, ends))
+
+def bin_chr(schr, chrlen, size, step, last_bin):
+	'''Generate bins covering a chromosome.
+
+	Args:
+		chrlen (int): chromosome length.
+		size (int): bin size.
+		step (int): bin step. Use step == size for not overlapping bins.
+		last_bin (bool): whether to add extra final bin.
+
+	Returns:
+		pd.Dataframe: a chr-start-end-name table.
+	'''
+	starts, ends = bin_chr_coords(chrlen, size, step, last_bin)
+	return(bins_table(schr, starts, ends))
+
+def bins_table(schr, starts, ends, offset = 0, prefix = ''):
+	'''Build a bed table from bin borders.
+
+	Args:
+		schr (string): chromosome.
+		starts (np.ndarray): bins start.
+		ends (np.ndarray): bins end.
+		offset (int): index of the first bin, for names.
+		prefix (string): bin names prefix.
+
+	Returns:
+		pd.Dataframe: a chr-start-end-name table.
+	'''
+	return(pd.DataFrame({
+		'chr' : np.repeat(schr, starts.shape[0]).astype('O'),
+		'start' : starts, 'end' : ends,
+		'name' : bin_names(offset + 1, offset + starts.shape[0], prefix)
+		}, columns = ['chr', 'start', 'end', 'name']))
+
+def bin_genome(lengths, size, step, last_bin):
+	'''Generate bins covering every chromosome.
+
+	Args:
+		lengths (pd.DataFrame): chromosome lengths, with chr and len columns.
+		size (int): bin size.
+		step (int): bin step. Use step == size for not overlapping bins.
+		last_bin (bool): whether to add extra final bin.
+
+	Returns:
+		pd.Dataframe: a chr-start-end-name table, names as chr_bin_i.
+	'''
+	return(pd.concat([bins_table(schr, starts, ends, prefix = str(schr) + '_')
+		for (schr, starts, ends) in iter_bins(lengths, size, step, last_bin)],
+		ignore_index = True))
+
+def repeat_counts(values):
+	'''Number of repeats of every row, from a count column.
+
+	Counts are floored, as repeating a row while the count is at least 1.
+	Missing, non-numeric and negative counts repeat a row 0 times.
+
+	Args:
+		values (pd.Series): count column.
+
+	Returns:
+		np.ndarray: int64 number of repeats.
+	'''
+	counts = pd.to_numeric(pd.Series(values), errors = 'coerce').to_numpy(
+		dtype = np.float64, na_value = 0)
+	return(np.maximum(np.floor(counts), 0).astype('int64'))
+
+def iter_expand_chunks(counts, chunk_rows = 1000000):
+	'''Split the expansion of repeated rows into bounded chunks.
+
+	Every chunk repeats a range of consecutive rows, at most chunk_rows times
+	in total. Rows repeated more than chunk_rows times are split over
+	several chunks.
+
+	Args:
+		counts (np.ndarray): number of repeats of every row.
+		chunk_rows (int): maximum number of expanded rows per chunk.
+
+	Yields:
+		tuple: (first, last, repeats), the [first, last) row range of the
+			chunk and the number of repeats of its rows in the chunk.
+	'''
+	chunk_rows = max(1, int(chunk_rows))
+	csum = np.cumsum(counts)
+	total = int(csum[-1]) if 0 != csum.shape[0] else 0
+
+	for begin in range(0, total, chunk_rows):
+		end = min(total, begin + chunk_rows)
+
+		# Rows containing the first and last expanded row
+		first = int(np.searchsorted(csum, begin, side = 'right'))
+		last = int(np.searchsorted(csum, end - 1, side = 'right')) + 1
+
+		repeats = np.array(counts[first:last], dtype = 'int64')
+		repeats[0] = csum[first] - begin
+		repeats[-1] -= csum[last - 1] - end
+		yield((first, last, repeats))
+
+def iter_expand_counts(bed, column = 'score', columns = None,
+	chunk_rows = 1000000):
+	'''Repeat every row as many times as its count, in bounded chunks.
+
+	Expanded rows are generated in memory, without formatting them as text.
+
+	Args:
+		bed (pd.DataFrame): bed table.
+		column (string): count column, see repeat_counts.
+		columns (list): columns to keep, default: chr, start and end.
+		chunk_rows (int): maximum number of expanded rows per chunk.
+
+	Yields:
+		pd.DataFrame: expanded rows, in input order.
+	'''
+	if type(None) == type(columns):
+		columns = ['chr', 'start', 'end']
+	table = bed.loc[:, columns]
+	counts = repeat_counts(bed[column])
+
+	for (first, last, repeats) in iter_expand_chunks(counts, chunk_rows):
+		with PROFILER.stage('expand', int(repeats.sum())):
+			chunk = table.iloc[first:last].take(
+				np.repeat(np.arange(last - first), repeats))
+		yield(chunk.reset_index(drop = True))
+
+class BgzfWriter(object):
+	'''Write a BGZF (blocked gzip) file, as produced by bgzip.
+
+	Data is compressed in independent gzip blocks of at most 64 KiB, so that
+	the output is a valid gzip file which can also be indexed and randomly
+	accessed through virtual offsets.
+	'''
+
+	# Uncompressed bytes per block, as in htslib
+	BLOCK_SIZE = 65280
+
+	# Empty block marking the end of file
+	EOF_BLOCK = (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00' +
+		b'BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+
+	def __init__(self, fileobj, level = 6):
+		'''Wrap a binary file object.
+
+		Args:
+			fileobj (file): binary file opened for writing.
+			level (int): compression level.
+		'''
+		self.fileobj = fileobj
+		self.level = level
+		self._buffer = bytearray()
+		self._block_offset = 0
+
+	def write(self, data):
+		self._buffer += data
+
+		# Compress full blocks from views, then trim the buffer once
+		offset = 0
+		with memoryview(self._buffer) as view:
+			while len(self._buffer) - offset >= self.BLOCK_SIZE:
+				self._write_block(view[offset:offset + self.BLOCK_SIZE])
+				offset += self.BLOCK_SIZE
+		if 0 != offset:
+			del self._buffer[:offset]
+
+	def tell(self):
+		'''Virtual offset: compressed block offset << 16 | in-block offset.'''
+		return((self._block_offset << 16) | len(self._buffer))
+
+	def flush(self):
+		'''Close the current block, so that tell() points to a new one.'''
+		if 0 != len(self._buffer):
+			self._write_block(self._buffer)
+			self._buffer = bytearray()
+		self.fileobj.flush()
+
+	def close(self):
+		'''Write the EOF block. As with gzip.GzipFile, fileobj is not closed.'''
+		self.flush()
+		self.fileobj.write(self.EOF_BLOCK)
+		self.fileobj.flush()
+
+	def _write_block(self, data):
+		compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+		cdata = compressor.compress(data) + compressor.flush()
+		header = struct.pack('<BBBBIBBHBBHH', 31, 139, 8, 4, 0, 0, 255, 6,
+			66, 67, 2, len(cdata) + 25)
+		footer = struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))
+		self.fileobj.write(header + cdata + footer)
+		self._block_offset += len(header) + len(cdata) + len(footer)
+
+class BgzfReader(object):
+	'''Random access to a BGZF (blocked gzip) file, through virtual offsets.
+
+	A virtual offset is the compressed offset of a block, shifted by 16 bits,
+	plus the offset in the uncompressed block, as in tabix indexes.
+	'''
+
+	def __init__(self, path):
+		'''Open a BGZF file.
+
+		Args:
+			path (string): BGZF file path.
+		'''
+		self.fileobj = open(path, 'rb')
+		self._block_cache = (None, None)
+
+	def block(self, coffset):
+		'''Read the block at a compressed offset.
+
+		Returns:
+			tuple: (uncompressed data, compressed offset of the next block),
+				with None data at the end of the file.
+		'''
+		if coffset == self._block_cache[0]:
+			return(self._block_cache[1])
+
+		self.fileobj.seek(coffset)
+		header = self.fileobj.read(12)
+		if 12 > len(header):
+			return((None, coffset))
+		xlen = struct.unpack('<H', header[10:12])[0]
+		extra = self.fileobj.read(xlen)
+
+		# Block size from the BC extra subfield
+		bsize = None
+		i = 0
+		while i + 4 <= len(extra):
+			slen = struct.unpack('<H', extra[(i + 2):(i + 4)])[0]
+			if b'BC' == extra[i:(i + 2)]:
+				bsize = struct.unpack('<H', extra[(i + 4):(i + 6)])[0]
+			i += 4 + slen
+		if type(None) == type(bsize):
+			raise ValueError('Not a BGZF file: ' + self.fileobj.name)
+
+		cdata = self.fileobj.read(bsize + 1 - 12 - xlen)
+		out = (zlib.decompress(cdata[:-8], -15), coffset + bsize + 1)
+		self._block_cache = (coffset, out)
+		return(out)
+
+	def read(self, vbegin, vend):
+		'''Read the uncompressed bytes between two virtual offsets.'''
+		coffset, begin = vbegin >> 16, vbegin & 0xffff
+		out = []
+		while True:
+			data, next_coffset = self.block(coffset)
+			if type(None) == type(data):
+				break
+			if coffset == vend >> 16:
+				out.append(data[begin:(vend & 0xffff)])
+				break
+			out.append(data[begin:])
+			coffset, begin = next_coffset, 0
+		return(b''.join(out))
+
+	def iter_lines(self):
+		'''Iterate over lines, with the virtual offset of their start.
+
+		Yields:
+			tuple: (virtual offset, line), ending with (end offset, b'').
+		'''
+		coffset = 0
+		pending = b''
+		pending_offset = 0
+		while True:
+			data, next_coffset = self.block(coffset)
+			if type(None) == type(data):
+				break
+			pos = 0
+			while True:
+				nl = data.find(b'\n', pos)
+				if -1 == nl:
+					break
+				if 0 != len(pending):
+					yield((pending_offset, pending + data[pos:(nl + 1)]))
+					pending = b''
+				else:
+					yield(((coffset << 16) | pos, data[pos:(nl + 1)]))
+				pos = nl + 1
+			if pos < len(data):
+				if 0 == len(pending):
+					pending_offset = (coffset << 16) | pos
+				pending += data[pos:]
+			coffset = next_coffset
+		if 0 != len(pending):
+			yield((pending_offset, pending))
+		yield((coffset << 16, b''))
+
+	def close(self):
+		self.fileobj.close()
+
+def is_bgzf(path):
+	'''Whether a file is BGZF compressed (gzip with a BC extra subfield).'''
+	with open(path, 'rb') as f:
+		header = f.read(18)
+	return(18 == len(header) and b'\x1f\x8b' == header[:2] and
+		0 != (header[3] & 4) and b'BC' == header[12:14])
+
+class BedWriter(object):
+	'''Buffered, vectorized writer of bed-like tables.
+
+	Tables are formatted in blocks of rows with pd.DataFrame.to_csv, and each
+	block is written at once, to stdout or to a (compressed) file. Stdout and
+	file outputs are byte-identical.
+	'''
+
+	# Rows formatted per block
+	CHUNK_SIZE = 100000
+
+	def __init__(self, outfile = False, sep = '\t', compress = None):
+		'''Open the output.
+
+		Args:
+			outfile (string): output path, stdout if False or None. A binary
+				file object is written to, and left open.
+			sep (string): column delimiter.
+			compress (string): None, 'gzip' or 'bgzip'. Default: gzip if
+				outfile ends in .gz, bgzip if it ends in .bgz.
+		'''
+		self.sep = sep
+
+		if type(None) == type(compress) and isinstance(outfile, str):
+			if outfile.endswith('.gz'):
+				compress = 'gzip'
+			elif outfile.endswith('.bgz'):
+				compress = 'bgzip'
+
+		if hasattr(outfile, 'write'):
+			self._raw = outfile
+			outfile = False
+		elif not outfile:
+			if type(None) != type(compress):
+				raise ValueError('Compression is available only with a file.')
+			self._raw = getattr(sys.stdout, 'buffer', sys.stdout)
+		else:
+			self._raw = open(outfile, 'wb')
+		self._outfile = outfile
+
+		self.copies = []
+		if type(None) == type(compress):
+			self.fileobj = self._raw
+		elif 'gzip' == compress:
+			self.fileobj = gzip.GzipFile(fileobj = self._raw, mode = 'wb')
+		elif 'bgzip' == compress:
+			self.fileobj = BgzfWriter(self._raw)
+		else:
+			raise ValueError('Unknown compression: ' + str(compress))
+
+	def write(self, table, header = False):
+		'''Write a table, without index.
+
+		Args:
+			table (pd.DataFrame): table to write.
+			header (bool): also write column names.
+		'''
+		if header:
+			self.write_text(self.sep.join([str(c) for c in table.columns]) +
+				'\n')
+		with PROFILER.stage('write', table.shape[0]):
+			for i in range(0, table.shape[0], self.CHUNK_SIZE):
+				self.write_text(table.iloc[i:(i + self.CHUNK_SIZE), :].to_csv(
+					sep = self.sep, header = False, index = False))
+
+	def write_bins(self, schr, starts, ends, prefix = ''):
+		'''Write bins, building their names one block at a time.
+
+		Args:
+			schr (string): chromosome.
+			starts (np.ndarray): bins start.
+			ends (np.ndarray): bins end.
+			prefix (string): bin names prefix.
+		'''
+		for i in range(0, starts.shape[0], self.CHUNK_SIZE):
+			self.write(bins_table(schr, starts[i:(i + self.CHUNK_SIZE)],
+				ends[i:(i + self.CHUNK_SIZE)], i, prefix))
+
+	def write_repeated(self, table, repeats):
+		'''Write every row of a table repeated a number of times.
+
+		Each row is formatted once, and its line repeated as text.
+
+		Args:
+			table (pd.DataFrame): table to write.
+			repeats (np.ndarray): number of repeats of every row.
+		'''
+		with PROFILER.stage('write', int(np.sum(repeats))):
+			for i in range(0, table.shape[0], self.CHUNK_SIZE):
+				lines = table.iloc[i:(i + self.CHUNK_SIZE), :].to_csv(
+					sep = self.sep, header = False, index = False
+					).split('\n')
+				self.write_text(''.join([(line + '\n') * n for (line, n)
+					in zip(lines, repeats[i:(i + self.CHUNK_SIZE)].tolist())]))
+
+	def write_text(self, text):
+		'''Write already formatted text.'''
+		self.write_bytes(text.encode())
+
+	def write_bytes(self, data):
+		'''Write already formatted and encoded text, also to every copy.'''
+		self.fileobj.write(data)
+		for copy in self.copies:
+			copy.write(data)
+
+	def close(self):
+		if not self.fileobj is self._raw:
+			self.fileobj.close()
+		if self._outfile:
+			self._raw.close()
+		else:
+			self._raw.flush()
+
+	def __enter__(self):
+		return(self)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+def write_bed(table, outfile = False, sep = '\t', compress = None,
+	header = False):
+	'''Write a bed-like table, see BedWriter.
+
+	Args:
+		table (pd.DataFrame): table to write.
+		outfile (string): output path, stdout if False or None.
+		sep (string): column delimiter.
+		compress (string): None, 'gzip' or 'bgzip'.
+		header (bool): also write column names.
+	'''
+	with BedWriter(outfile, sep, compress) as out:
+		out.write(table, header)
+
+def open_binary(path):
+	'''Open a (gzip or bgzip compressed) file for reading, as bytes.'''
+	if path.endswith('.gz') or path.endswith('.bgz'):
+		return(gzip.open(path, 'rb'))
+	return(open(path, 'rb'))
+
+def bed_layout(path, skip_header = None, sep = '\t'):
+	'''Find where the rows of a bed file start.
+
+	Track, browser, comment (#) and empty lines at the top of the file are
+	skipped. The first other line is a header if skip_header, or, if
+	skip_header is None, when its second column is not an integer. To read
+	the rows of pipes or FIFOs, which can only be read once, see
+	open_bed_rows instead.
+
+	Args:
+		path (string): bed file path, possibly gzip or bgzip compressed.
+		skip_header (bool): whether the file has a header, None to detect it.
+		sep (string): column delimiter.
+
+	Returns:
+		tuple: (number of lines to skip, number of columns of the first row).
+	'''
+	with open_binary(path) as f:
+		return(_sniff_layout(f, skip_header, sep)[:2])
+
+def _sniff_layout(f, skip_header = None, sep = '\t'):
+	'''Read the lines of a binary file up to its first row, see bed_layout.
+
+	Returns:
+		tuple: (number of lines skipped, number of columns of the first row,
+			the first row, b'' if none).
+	'''
+	nskip = 0
+	for line in iter(f.readline, b''):
+		text = line.decode()
+		if text.startswith(('#', 'track', 'browser')) or '' == text.strip():
+			nskip += 1
+			continue
+		fields = text.rstrip('\r\n').split(sep)
+		if type(None) == type(skip_header):
+			skip_header = 2 > len(fields) or not fields[1].strip(
+				).lstrip('-').isdigit()
+		if skip_header:
+			skip_header = False
+			nskip += 1
+			continue
+		return((nskip, len(fields), line))
+	return((nskip, 0, b''))
+
+class _PrefixedFile(io.RawIOBase):
+	'''Binary file reading some bytes first, then the rest of a file.'''
+
+	def __init__(self, prefix, fileobj):
+		self.prefix = prefix
+		self.fileobj = fileobj
+
+	def readable(self):
+		return(True)
+
+	def readinto(self, b):
+		if 0 == len(self.prefix):
+			return(self.fileobj.readinto(b))
+		n = min(len(b), len(self.prefix))
+		b[:n] = self.prefix[:n]
+		self.prefix = self.prefix[n:]
+		return(n)
+
+	def close(self):
+		self.fileobj.close()
+		super().close()
+
+def open_bed_rows(path, skip_header = None, sep = '\t'):
+	'''Open a bed file at its first row, reading it only once.
+
+	The layout (see bed_layout) is found on the same handle that is returned,
+	so that pipes, FIFOs and process substitutions (e.g., <(zcat x.bed.gz))
+	can be read too.
+
+	Args:
+		path (string): bed file path, possibly gzip or bgzip compressed.
+		skip_header (bool): whether the file has a header, None to detect it.
+		sep (string): column delimiter.
+
+	Returns:
+		tuple: (binary file object at the first row, number of columns of the
+			first row).
+	'''
+	f = open_binary(path)
+	try:
+		ncols, first = _sniff_layout(f, skip_header, sep)[1:]
+	except:
+		f.close()
+		raise
+	return((io.BufferedReader(_PrefixedFile(first, f), 1024 ** 2), ncols))
+
+def compact_bed(bed, float_dtype = np.float64):
+	'''Downcast the columns of a bed table, in place.
+
+	Positions become uint32 when possible, integer scores int32 when possible
+	and float scores float_dtype.
+
+	Args:
+		bed (pd.DataFrame): bed table.
+		float_dtype (np.dtype): dtype of non-integer scores.
+
+	Returns:
+		pd.DataFrame: the same table.
+	'''
+	if 0 == bed.shape[0]:
+		return(bed)
+
+	for col in ('start', 'end'):
+		if col in bed.columns and np.issubdtype(bed[col].dtype, np.integer):
+			if 0 <= bed[col].min():
+				bed[col] = bed[col].astype(coord_dtype(bed[col].max()))
+
+	if 'score' in bed.columns:
+		if np.issubdtype(bed['score'].dtype, np.integer):
+			info = np.iinfo(np.int32)
+			if info.min <= bed['score'].min() and info.max >= bed['score'].max():
+				bed['score'] = bed['score'].astype(np.int32)
+		elif np.issubdtype(bed['score'].dtype, np.floating):
+			bed['score'] = bed['score'].astype(float_dtype)
+
+	return(bed)
+
+def read_bed(path, skip_header = None, sep = '\t', columns = None,
+	chunksize = None, float_dtype = np.float64, chroms = None,
+	regions = None):
+	'''Read a bed file into a compact, typed table.
+
+	Headers, track and browser lines are skipped (see bed_layout), and gzip
+	or bgzip compressed files are read directly. Chromosomes are categorical
+	strings, also when names are numeric (e.g., 1, 2), so that they match
+	across files and readers. Positions and scores are downcast with
+	compact_bed. Float scores stay float64 by default: as float32, they would
+	keep about 7 digits, and sums or means would differ from version 1.0.
+	The pyarrow parser is used when installed, unless reading in chunks. The
+	file is read once, so that pipes work too (see open_bed_rows). Bed caches
+	(see write_bed_cache) are memory-mapped instead of parsed.
+
+	With regions, sorted files indexed by write_bed_index (.bli) or tabix
+	(.tbi, for bgzip files) are only read in the blocks that can overlap the
+	regions. Other rows of those blocks are returned too, and files without
+	index are read fully.
+
+	Args:
+		path (string): bed file path.
+		skip_header (bool): whether the file has a header, None to detect it.
+		sep (string): column delimiter.
+		columns (list): column names, default: BED_COLUMNS. Extra columns of
+			the file are ignored, missing ones are filled with NaN.
+		chunksize (int): if set, return an iterator over chunks of rows.
+		float_dtype (np.dtype): dtype of non-integer scores, e.g., np.float32
+			to halve their memory where 7 digits are enough.
+		chroms (list): only read rows of these chromosomes.
+		regions (pd.DataFrame): chr-start-end table, read at least the rows
+			overlapping these regions.
+
+	Returns:
+		pd.DataFrame: typed table, or an iterator of tables with chunksize.
+	'''
+	if is_bed_cache(path):
+		with PROFILER.stage('read') as stage:
+			bed = read_bed_cache(path, chroms)
+			stage.add_rows(bed.shape[0])
+		if type(None) != type(chunksize):
+			return((bed.iloc[i:(i + chunksize)]
+				for i in range(0, bed.shape[0], chunksize)))
+		return(bed)
+
+	if type(None) == type(columns):
+		columns = BED_COLUMNS
+	handle, ncols = open_bed_rows(path, skip_header, sep)
+	ncols = max(1, min(ncols, len(columns)))
+
+	# Parsed as strings, whatever the engine, then made categorical by typed
+	dtype = {'chr' : 'str', 'name' : 'str'}
+	kwargs = {'sep' : sep, 'header' : None,
+		'names' : columns[:ncols], 'usecols' : list(range(ncols)),
+		'dtype' : dict((k, v) for (k, v) in dtype.items()
+			if k in columns[:ncols])}
+
+	def typed(bed):
+		if 'chr' in bed.columns:
+			bed['chr'] = bed['chr'].astype('str').astype('category')
+		for col in columns[ncols:]:
+			bed[col] = np.nan
+		if type(None) != type(chroms):
+			bed = bed[bed['chr'].isin(list(chroms))]
+		return(compact_bed(bed, float_dtype))
+
+	# Only read the blocks overlapping regions, with an index
+	if type(None) != type(regions):
+		ranges = index_ranges(path, regions)
+		if type(None) != type(ranges):
+			handle.close()
+			text = read_ranges(path, ranges)
+			if 0 == len(text):
+				bed = pd.DataFrame(dict((col, pd.Series([], dtype = 'int64'))
+					for col in columns[:ncols]))
+				bed = typed(bed)
+				return(iter([bed]) if type(None) != type(chunksize) else bed)
+			handle = io.BytesIO(text)
+
+	if type(None) != type(chunksize):
+		return(_profiled_chunks(typed(chunk)
+			for chunk in _read_csv_chunks(handle, chunksize, kwargs)))
+	if type(None) != type(pyarrow):
+		kwargs['engine'] = 'pyarrow'
+	with handle, PROFILER.stage('read') as stage:
+		bed = typed(pd.read_csv(handle, **kwargs))
+		stage.add_rows(bed.shape[0])
+	return(bed)
+
+def _read_csv_chunks(handle, chunksize, kwargs):
+	'''Read a file in chunks of rows with read_csv, closing it at the end.'''
+	with handle:
+		for chunk in pd.read_csv(handle, chunksize = chunksize, **kwargs):
+			yield(chunk)
+
+def _profiled_chunks(chunks):
+	'''Record the reading of every chunk as a read stage.'''
+	while True:
+		start_time = time.perf_counter()
+		chunk = next(chunks, None)
+		if type(None) == type(chunk):
+			return
+		PROFILER.record('read', time.perf_counter() - start_time,
+			chunk.shape[0])
+		yield(chunk)
+
+def merge_regions(regions, pad = 1):
+	'''Merge overlapping or adjacent regions, per chromosome.
+
+	Args:
+		regions (pd.DataFrame): chr-start-end table.
+		pad (int): widen every region by pad on both sides.
+
+	Returns:
+		dict: chromosome -> (starts, ends) of the merged regions.
+	'''
+	merged = {}
+	codes, chroms = pd.factorize(regions['chr'])
+	starts = np.asarray(regions['start'], dtype = np.int64) - pad
+	ends = np.asarray(regions['end'], dtype = np.int64) + pad
+	for chri in range(len(chroms)):
+		ids = np.where(codes == chri)[0]
+		ids = ids[np.argsort(starts[ids], kind = 'stable')]
+		cstarts = starts[ids]
+		cends = np.maximum.accumulate(ends[ids])
+
+		# A new region starts after the end of all the previous ones
+		first = np.ones(ids.shape[0], dtype = 'bool')
+		first[1:] = cstarts[1:] > cends[:-1] + 1
+		last = np.append(np.where(first)[0][1:] - 1, ids.shape[0] - 1)
+		merged[str(chroms[chri])] = (np.maximum(cstarts[first], 0), cends[last])
+	return(merged)
+
+def merge_ranges(ranges):
+	'''Sort and merge overlapping (begin, end) offset ranges.'''
+	out = []
+	for (begin, end) in sorted(ranges):
+		if 0 != len(out) and begin <= out[-1][1]:
+			out[-1] = (out[-1][0], max(out[-1][1], end))
+		elif begin < end:
+			out.append((begin, end))
+	return(out)
+
+def write_bed_index(path, block_size = 65536, skip_header = None,
+	sep = '\t'):
+	'''Index a coordinate-sorted bed file, plain or BGZF compressed.
+
+	Rows are split in blocks of about block_size bytes. The index (path.bli,
+	JSON) keeps, per chromosome, the offset and first start of every block,
+	and the maximum row length, so that the blocks which can overlap a region
+	are found with two binary searches (see index_ranges). For BGZF files,
+	offsets are virtual offsets.
+
+	Args:
+		path (string): bed file path, sorted by chromosome (contiguous) and
+			start (e.g., sort -k1,1 -k2,2n).
+		block_size (int): uncompressed bytes per block.
+		skip_header (bool): whether the file has a header, None to detect it.
+		sep (string): column delimiter.
+	'''
+	bgzf = is_bgzf(path)
+	if bgzf:
+		reader = BgzfReader(path)
+		lines = reader.iter_lines()
+	else:
+		reader = open(path, 'rb')
+		lines = _iter_plain_lines(reader)
+	nskip = bed_layout(path, skip_header, sep)[0]
+	bsep = sep.encode()
+
+	chroms = {}
+	current = None
+	offset = 0
+	for (i, (offset, line)) in enumerate(lines):
+		fields = line.split(bsep, 3)
+		if i < nskip or 3 > len(fields):
+			continue
+		chrn = fields[0].decode()
+		start = int(fields[1])
+		end = int(fields[2])
+
+		if chrn != current:
+			if chrn in chroms:
+				reader.close()
+				raise ValueError('Unsorted bed file, chromosome ' + chrn +
+					' is not contiguous: ' + path)
+			if type(None) != type(current):
+				chroms[current]['offsets'].append(offset)
+			chroms[chrn] = {'offsets' : [offset], 'starts' : [start],
+				'maxlen' : 0}
+			current = chrn
+			nbytes = 0
+		elif start < last_start:
+			reader.close()
+			raise ValueError('Unsorted bed file, at ' + chrn + ':' +
+				str(start) + ': ' + path)
+		elif nbytes >= block_size:
+			chroms[chrn]['offsets'].append(offset)
+			chroms[chrn]['starts'].append(start)
+			nbytes = 0
+
+		chroms[chrn]['maxlen'] = max(chroms[chrn]['maxlen'], end - start)
+		last_start = start
+		nbytes += len(line)
+	if type(None) != type(current):
+		chroms[current]['offsets'].append(offset)
+	reader.close()
+
+	stat = os.stat(path)
+	with open(path + '.bli', 'w') as f:
+		json.dump({'version' : BED_INDEX_VERSION, 'size' : stat.st_size,
+			'mtime' : stat.st_mtime, 'bgzf' : bgzf, 'chroms' : chroms}, f)
+
+def _iter_plain_lines(fileobj):
+	'''Iterate over the lines of a binary file, see BgzfReader.iter_lines.'''
+	offset = 0
+	for line in fileobj:
+		yield((offset, line))
+		offset += len(line)
+	yield((offset, b''))
+
+def read_bed_index(path):
+	'''Load the index of a bed file, see write_bed_index.
+
+	Returns:
+		dict: the index, or None if missing or older than the bed file.
+	'''
+	if not os.path.isfile(path + '.bli'):
+		return(None)
+	with open(path + '.bli', 'r') as f:
+		index = json.load(f)
+	stat = os.stat(path)
+	if BED_INDEX_VERSION != index['version'] or stat.st_size != index[
+		'size'] or stat.st_mtime != index['mtime']:
+		return(None)
+	return(index)
+
+def read_tabix(path):
+	'''Parse a tabix index (.tbi).
+
+	Returns:
+		dict: sequence name -> (bins, linear index), with bins a dict of
+			bin -> (n, 2) array of chunk virtual offsets.
+	'''
+	with gzip.open(path, 'rb') as f:
+		data = f.read()
+	if b'TBI\x01' != data[:4]:
+		raise ValueError('Not a tabix index: ' + path)
+	n_ref = struct.unpack('<i', data[4:8])[0]
+	l_nm = struct.unpack('<i', data[32:36])[0]
+	names = data[36:(36 + l_nm)].split(b'\x00')[:n_ref]
+
+	pos = 36 + l_nm
+	refs = {}
+	for name in names:
+		n_bin = struct.unpack('<i', data[pos:(pos + 4)])[0]
+		pos += 4
+		bins = {}
+		for i in range(n_bin):
+			bin_id, n_chunk = struct.unpack('<Ii', data[pos:(pos + 8)])
+			pos += 8
+			bins[bin_id] = np.frombuffer(data, dtype = '<u8',
+				count = 2 * n_chunk, offset = pos).reshape((n_chunk, 2))
+			pos += 16 * n_chunk
+		n_intv = struct.unpack('<i', data[pos:(pos + 4)])[0]
+		pos += 4
+		ioff = np.frombuffer(data, dtype = '<u8', count = n_intv, offset = pos)
+		pos += 8 * n_intv
+		refs[name.decode()] = (bins, ioff)
+	return(refs)
+
+def tabix_bins(begin, end):
+	'''Bins of the tabix/BAI binning scheme overlapping [begin, end).'''
+	end -= 1
+	bins = [0]
+	for (shift, offset) in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+		bins.extend(range(offset + (begin >> shift), offset + (end >> shift) + 1))
+	return(bins)
+
+def index_ranges(path, regions):
+	'''Offset ranges of an indexed bed file that can overlap regions.
+
+	Regions are widened by one base on both sides, so that closed and
+	half-open coordinates are both covered.
+
+	Args:
+		path (string): bed file path, with a .bli or .tbi index.
+		regions (pd.DataFrame): chr-start-end table.
+
+	Returns:
+		list: sorted, merged (begin, end) offset ranges (virtual offsets for
+			BGZF files), or None if the file is not indexed.
+	'''
+	ranges = []
+	index = read_bed_index(path)
+	if type(None) != type(index):
+		for (chrn, (starts, ends)) in merge_regions(regions).items():
+			if not chrn in index['chroms']:
+				continue
+			chrom = index['chroms'][chrn]
+			block_starts = np.array(chrom['starts'])
+			offsets = chrom['offsets']
+			lo = np.maximum(np.searchsorted(block_starts,
+				starts - chrom['maxlen'], 'left') - 1, 0)
+			hi = np.searchsorted(block_starts, ends, 'right')
+			ranges.extend((offsets[a], offsets[b])
+				for (a, b) in zip(lo, hi) if a < b)
+		return(merge_ranges(ranges))
+
+	if os.path.isfile(path + '.tbi') and is_bgzf(path):
+		refs = read_tabix(path + '.tbi')
+		for (chrn, (starts, ends)) in merge_regions(regions).items():
+			if not chrn in refs:
+				continue
+			bins, ioff = refs[chrn]
+			for (begin, end) in zip(starts, ends + 1):
+				min_offset = ioff[min(begin >> 14, ioff.shape[0] - 1)
+					] if 0 != ioff.shape[0] else 0
+				for bin_id in tabix_bins(begin, end):
+					if bin_id in bins:
+						ranges.extend((int(a), int(b)) for (a, b) in bins[bin_id]
+							if b > min_offset)
+		return(merge_ranges(ranges))
+
+	return(None)
+
+def read_ranges(path, ranges):
+	'''Read offset ranges of a file (virtual offsets, if BGZF), joined.'''
+	if is_bgzf(path):
+		reader = BgzfReader(path)
+		text = b''.join([reader.read(a, b) for (a, b) in ranges])
+		reader.close()
+		return(text)
+	with open(path, 'rb') as f:
+		out = []
+		for (a, b) in ranges:
+			f.seek(a)
+			out.append(f.read(b - a))
+	return(b''.join(out))
+
+def is_bed_cache(path):
+	'''Whether path is a bed cache directory, see write_bed_cache.'''
+	return(os.path.isfile(os.path.join(path, 'header.json')))
+
+def write_bed_cache(bed, path):
+	'''Write a bed table as a binary columnar cache.
+
+	The cache is a directory with a .npy array per column, which can be
+	memory-mapped, and a small header.json. Rows are grouped per chromosome,
+	in order of first appearance and keeping their order otherwise, and the
+	header stores the chromosome dictionary with the row offsets of each
+	chromosome. Text columns (e.g., name) are dictionary encoded as well.
+
+	Args:
+		bed (pd.DataFrame): bed table, with a chr column.
+		path (string): cache directory, created if needed.
+	'''
+	codes, chroms = pd.factorize(bed['chr'])
+	if np.any(0 > codes):
+		raise ValueError('Cannot cache rows without chromosome.')
+
+	# Group rows per chromosome
+	order = np.argsort(codes, kind = 'stable')
+	offsets = np.searchsorted(codes[order], np.arange(len(chroms) + 1), 'left')
+
+	if not os.path.isdir(path):
+		os.makedirs(path)
+
+	columns = []
+	for col in bed.columns:
+		if 'chr' == col:
+			columns.append({'name' : col, 'kind' : 'chr'})
+		elif pd.api.types.is_numeric_dtype(bed[col]) and not isinstance(
+			bed[col].dtype, pd.CategoricalDtype):
+			np.save(os.path.join(path, col + '.npy'),
+				np.asarray(bed[col])[order])
+			columns.append({'name' : col, 'kind' : 'values'})
+		else:
+			vcodes, uniques = pd.factorize(bed[col])
+			np.save(os.path.join(path, col + '.npy'),
+				vcodes[order].astype(np.int32))
+			np.save(os.path.join(path, col + '.dict.npy'), np.char.encode(
+				np.asarray(uniques, dtype = 'str'), 'utf-8'))
+			columns.append({'name' : col, 'kind' : 'dict'})
+
+	# Write the header last, so that incomplete caches are not detected
+	header = {'version' : BED_CACHE_VERSION, 'nrows' : int(bed.shape[0]),
+		'chroms' : [str(c) for c in chroms],
+		'offsets' : [int(o) for o in offsets], 'columns' : columns}
+	with open(os.path.join(path, 'header.json.tmp'), 'w') as f:
+		json.dump(header, f)
+	os.replace(os.path.join(path, 'header.json.tmp'),
+		os.path.join(path, 'header.json'))
+
+def read_bed_cache(path, chroms = None):
+	'''Load a bed cache written by write_bed_cache.
+
+	Columns are memory-mapped, so that only the accessed pages are read. A
+	single chromosome (or the full table) is a zero-copy view, while a set of
+	chromosomes only reads their row ranges.
+
+	Args:
+		path (string): cache directory.
+		chroms (list): only load rows of these chromosomes.
+
+	Returns:
+		pd.DataFrame: bed table, with categorical chr and text columns.
+	'''
+	with open(os.path.join(path, 'header.json'), 'r') as f:
+		header = json.load(f)
+	if BED_CACHE_VERSION != header['version']:
+		raise ValueError('Unsupported bed cache version: ' + path)
+
+	# Row range of each selected chromosome
+	offsets = header['offsets']
+	chri = list(range(len(header['chroms'])))
+	if type(None) != type(chroms):
+		chroms = set(str(c) for c in chroms)
+		chri = [i for i in chri if header['chroms'][i] in chroms]
+	ranges = [(offsets[i], offsets[i + 1]) for i in chri]
+
+	def load(name):
+		values = np.load(os.path.join(path, name), mmap_mode = 'r')
+		if type(None) == type(chroms):
+			return(values)
+		if 1 == len(ranges):
+			return(values[ranges[0][0]:ranges[0][1]])
+		return(np.concatenate([values[a:b] for (a, b) in ranges] +
+			[values[:0]]))
+
+	data = {}
+	for col in header['columns']:
+		if 'chr' == col['kind']:
+			data[col['name']] = pd.Categorical.from_codes(np.repeat(
+				np.array(chri, dtype = np.int16 if 32767 > len(offsets)
+					else np.int32),
+				[b - a for (a, b) in ranges]), header['chroms'])
+		elif 'dict' == col['kind']:
+			data[col['name']] = pd.Categorical.from_codes(
+				load(col['name'] + '.npy'), np.char.decode(np.load(os.path.join(
+				path, col['name'] + '.dict.npy')), 'utf-8').astype('O'))
+		else:
+			data[col['name']] = load(col['name'] + '.npy')
+
+	return(pd.DataFrame(data, columns = [col['name']
+		for col in header['columns']], copy = False))
+
+def merge_beds(beds, by_name = False):
+	'''Merge the score column of bed tables into a matrix.
+
+	Rows are matched on location (chr, start, end) or on name. Every key is
+	reported once, with the chr-start-end-name of its first occurrence and
+	one score per table, 0 where the key is missing.
+
+	Args:
+		beds (list): chr-start-end-name-score pd.DataFrame tables.
+		by_name (bool): match rows on name instead of location.
+
+	Returns:
+		pd.DataFrame: chr-start-end-name table plus score_1 to score_N columns,
+			sorted by key as iter_merge_sorted: by chr (as strings), start and
+			end, or by name.
+	'''
+	keycols = ['name'] if by_name else ['chr', 'start', 'end']
+	merged = pd.concat([bed.iloc[:, :5] for bed in beds], ignore_index = True)
+	filei = np.repeat(np.arange(len(beds)), [bed.shape[0] for bed in beds])
+
+	# Integer key index, in order of first occurrence
+	keys = merged.groupby(keycols, sort = False, dropna = False,
+		observed = True).ngroup().values
+	first = np.unique(keys, return_index = True)[1]
+
+	# Place scores in a preallocated matrix
+	scores = merged['score'].values
+	dtype = scores.dtype if np.issubdtype(scores.dtype, np.number) else float
+	matrix = np.zeros((first.shape[0], len(beds)), dtype = dtype)
+	matrix[keys, filei] = scores
+
+	table = merged.iloc[first, :4].reset_index(drop = True)
+	table = pd.concat([table, pd.DataFrame(matrix, columns = [
+		'score_' + str(i + 1) for i in range(len(beds))])], axis = 1)
+	return(table.sort_values(keycols, kind = 'mergesort',
+		key = lambda col: col.astype('str') if col.name in ('chr', 'name')
+		else col))
+
+def format_scores(values):
+	'''Format scores as text, the same way from typed tables and from text.
+
+	Integral values are written as integers, others in their shortest
+	round-trip form (e.g., 0.1), and NaN as nan.
+
+	Args:
+		values (np.ndarray): scores, of any shape.
+
+	Returns:
+		np.ndarray: formatted scores, with the same shape.
+	'''
+	values = np.asarray(values, dtype = np.float64)
+	out = np.empty(values.shape, dtype = 'O')
+	integral = np.logical_and(np.isfinite(values), np.mod(values, 1) == 0)
+	integral = np.logical_and(integral, np.abs(values) < 2 ** 63)
+	out[integral] = values[integral].astype(np.int64).astype('str')
+	other = np.logical_not(integral)
+	out[other] = [repr(float(v)) for v in values[other]]
+	return(out)
+
+def iter_merge_sorted(paths, by_name = False, skip_header = None,
+	sep = '\t'):
+	'''Merge the score column of sorted bed files, streaming.
+
+	Files are k-way merged line by line, keeping a single line per file in
+	memory. They must be sorted by location (chr lexicographically, then start
+	and end numerically, as with sort -k1,1 -k2,2n -k3,3n) or, with by_name,
+	by name (as with sort -k4,4).
+
+	Args:
+		paths (list): bed file paths.
+		by_name (bool): match rows on name instead of location.
+		skip_header (bool): whether files have a header, None to detect it.
+		sep (string): column delimiter.
+
+	Yields:
+		list: chr, start, end, name and one score per file, as strings, with
+			'0' where the key is missing. In key order.
+	'''
+
+	def read_keys(path, filei):
+		if is_bed_cache(path):
+			raise ValueError('Sorted merge needs text bed files: ' + path)
+		previous = None
+		with io.TextIOWrapper(open_bed_rows(path, skip_header, sep)[0]) as f:
+			for line in f:
+				fields = line.rstrip('\n').split(sep)
+				if 5 > len(fields):
+					continue
+				if by_name:
+					key = (fields[3],)
+				else:
+					key = (fields[0], int(fields[1]), int(fields[2]))
+				if type(None) != type(previous) and key < previous:
+					raise ValueError('Unsorted bed file: ' + path)
+				previous = key
+				yield((key, filei, fields))
+
+	streams = [read_keys(path, i) for (path, i) in zip(paths, range(len(paths)))]
+
+	current = None
+	row = None
+	for (key, filei, fields) in heapq.merge(*streams, key = lambda r: r[0]):
+		if key != current:
+			if type(None) != type(row):
+				yield(row)
+			current = key
+			row = fields[:4] + ['0'] * len(paths)
+		row[4 + filei] = fields[4]
+	if type(None) != type(row):
+		yield(row)
@@ -0,0 +1,174 @@
+#
+#
+
+import json
+import numpy as np
+import os
+import pandas as pd
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import bed_lib as bd
+
+# Streams of the synthetic generators, spawned from the master seed
+STREAMS = {'lengths' : 0, 'reads' : 1, 'rois' : 2, 'overlapping_rois' : 3,
+	'counts' : 4}
+
+def bench_rng(seed, stream, i = 0):
+	'''Independent random generator of a synthetic dataset.
+
+	Args:
+		seed (int): master seed.
+		stream (string): dataset, a key of STREAMS.
+		i (int): dataset index, e.g., for several count files.
+
+	Returns:
+		np.random.Generator: random number generator.
+	'''
+	return(np.random.Generator(np.random.PCG64(np.random.SeedSequence(
+		seed, spawn_key = (STREAMS[stream], i)))))
+
+def synthetic_lengths(genome_size, nchroms, seed):
+	'''Chromosome lengths, of random size and summing up to genome_size.
+
+	Returns:
+		pd.DataFrame: chr-len table.
+	'''
+	rng = bench_rng(seed, 'lengths')
+	weights = rng.uniform(.5, 1.5, nchroms)
+	lengths = np.maximum(1, (weights / weights.sum() * genome_size)).astype(
+		'int64')
+	return(pd.DataFrame({'chr' : ['chr' + str(i + 1) for i in range(nchroms)],
+		'len' : lengths}, columns = ['chr', 'len']))
+
+def _chrom_sizes(lengths, n):
+	'''Split n rows among chromosomes, proportionally to their length.'''
+	sizes = np.floor(n * lengths['len'].values / lengths['len'].sum()).astype(
+		'int64')
+	sizes[0] += n - sizes.sum()
+	return(sizes)
+
+def write_synthetic_reads(path, lengths, nrows, seed, read_len = (50, 300)):
+	'''Write a coordinate-sorted read-level bed file, with a header.
+
+	Reads have uniform random starts and lengths, and a score from 1 to 4.
+	Rows are generated and written one chromosome at a time.
+
+	Args:
+		path (string): output path.
+		lengths (pd.DataFrame): chromosome lengths, see synthetic_lengths.
+		nrows (int): number of reads.
+		seed (int): master seed.
+		read_len (tuple): minimum and maximum read length.
+	'''
+	rng = bench_rng(seed, 'reads')
+	with bd.BedWriter(path) as out:
+		out.write_text('\t'.join(bd.BED_COLUMNS) + '\n')
+		for (schr, chrlen, n) in zip(lengths['chr'], lengths['len'],
+			_chrom_sizes(lengths, nrows)):
+			starts = np.sort(rng.integers(0, max(1, chrlen - read_len[1]), n))
+			out.write(pd.DataFrame({'chr' : schr, 'start' : starts,
+				'end' : starts + rng.integers(read_len[0], read_len[1] + 1, n),
+				'name' : 'read', 'score' : rng.integers(1, 5, n)},
+				columns = bd.BED_COLUMNS))
+
+def write_synthetic_rois(path, lengths, nrois, seed, overlapping = False):
+	'''Write a coordinate-sorted bed file of regions of interest.
+
+	Non-overlapping regions cover a random part of disjoint equal segments of
+	every chromosome. Overlapping regions have random starts and are up to
+	three segments long.
+
+	Args:
+		path (string): output path.
+		lengths (pd.DataFrame): chromosome lengths, see synthetic_lengths.
+		nrois (int): number of regions.
+		seed (int): master seed.
+		overlapping (bool): generate overlapping regions.
+	'''
+	rng = bench_rng(seed, 'overlapping_rois' if overlapping else 'rois')
+	with bd.BedWriter(path) as out:
+		for (schr, chrlen, n) in zip(lengths['chr'], lengths['len'],
+			_chrom_sizes(lengths, nrois)):
+			segment = max(2, chrlen // max(1, n))
+			if overlapping:
+				starts = np.sort(rng.integers(0, chrlen, n))
+				ends = np.minimum(chrlen,
+					starts + rng.integers(1, 3 * segment + 1, n))
+			else:
+				starts = np.arange(n) * segment
+				ends = starts + rng.integers(1, segment, n)
+			out.write(pd.DataFrame({'chr' : schr, 'start' : starts,
+				'end' : ends, 'name' : bd.bin_names(1, n, str(schr) + '_roi'),
+				'score' : 0}, columns = bd.BED_COLUMNS))
+
+def write_synthetic_counts(path, lengths, nbins, seed, i = 0):
+	'''Write uniform bins with random read counts (Poisson), with a header.
+
+	Args:
+		path (string): output path.
+		lengths (pd.DataFrame): chromosome lengths, see synthetic_lengths.
+		nbins (int): approximate number of bins.
+		seed (int): master seed.
+		i (int): file index, for independent counts.
+	'''
+	rng = bench_rng(seed, 'counts', i)
+	size = max(1, int(lengths['len'].sum() // max(1, nbins)))
+	with bd.BedWriter(path) as out:
+		out.write_text('\t'.join(bd.BED_COLUMNS) + '\n')
+		for (schr, starts, ends) in bd.iter_bins(lengths, size, size, True):
+			bins = bd.bins_table(schr, starts, ends, prefix = str(schr) + '_')
+			bins['score'] = rng.poisson(10, starts.shape[0])
+			out.write(bins)
+
+def run_case(cmd, stdout = None):
+	'''Run a command, measuring its wall time and peak memory.
+
+	Args:
+		cmd (list): command and arguments.
+		stdout (string): file for the command output, discarded if None.
+
+	Returns:
+		dict: wall_s (seconds), max_rss_kb (peak resident memory, from the
+			rusage of the process) and returncode.
+	'''
+	with open(stdout if stdout else os.devnull, 'wb') as out:
+		start = time.perf_counter()
+		proc = subprocess.Popen(cmd, stdout = out, stderr = subprocess.PIPE)
+		stderr = proc.stderr.read()
+		pid, status, usage = os.wait4(proc.pid, 0)
+		wall = time.perf_counter() - start
+		proc.stderr.close()
+		proc.returncode = os.waitstatus_to_exitcode(status)
+
+	result = {'wall_s' : wall, 'max_rss_kb' : usage.ru_maxrss,
+		'returncode' : proc.returncode}
+	if 0 != proc.returncode:
+		result['stderr'] = stderr.decode(errors = 'replace')[-2000:]
+	return(result)
+
+def bench_meta(seed):
+	'''Describe the benchmarked code and environment.'''
+	meta = {'seed' : seed, 'date' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'python' : platform.python_version(), 'numpy' : np.__version__,
+		'pandas' : pd.__version__, 'machine' : platform.machine(),
+		'cpus' : os.cpu_count()}
+	try:
+		meta['commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+			cwd = os.path.dirname(os.path.realpath(__file__)),
+			stderr = subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		meta['commit'] = None
+	return(meta)
+
+def write_results(path, meta, results):
+	'''Write benchmark results as JSON, to path or stdout if None.'''
+	text = json.dumps({'meta' : meta, 'results' : results}, indent = 1)
+	if path:
+		with open(path, 'w') as f:
+			f.write(text + '\n')
+	else:
+		print(text)
@@ -0,0 +1,111 @@
+#
+#
+# Framed messages over local (Unix) sockets, used by roi_server.py and
+# roi_client.py. Only depends on the standard library, to keep clients light.
+
+import json
+import socket
+import struct
+import time
+
+# Collapse methods from the base-pair coverage of rows
+COVERAGE_METHODS = ('coverage', 'covmean')
+
+# Collapse methods of bin requests, as bed_lib.COLLAPSE_METHODS
+COLLAPSE_METHODS = ('min', 'mean', 'median', 'max', 'count', 'sum'
+	) + COVERAGE_METHODS
+
+# Frame header: length of the frame data, unsigned 64-bit big-endian
+FRAME_HEADER = struct.Struct('>Q')
+
+# Bytes buffered by FrameWriter before sending a frame
+FRAME_SIZE = 1 << 20
+
+def send_frame(sock, data):
+	'''Send a frame: its length, then its data.'''
+	sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+def recv_exactly(sock, n):
+	'''Receive exactly n bytes, raising EOFError if the peer closes first.'''
+	chunks = []
+	while 0 < n:
+		chunk = sock.recv(min(n, FRAME_SIZE))
+		if 0 == len(chunk):
+			raise EOFError('Connection closed by peer.')
+		chunks.append(chunk)
+		n -= len(chunk)
+	return(b''.join(chunks))
+
+def recv_frame(sock):
+	'''Receive a frame, see send_frame.'''
+	size = FRAME_HEADER.unpack(recv_exactly(sock, FRAME_HEADER.size))[0]
+	return(recv_exactly(sock, size))
+
+def send_json(sock, obj):
+	'''Send a JSON object as a frame.'''
+	send_frame(sock, json.dumps(obj).encode())
+
+def recv_json(sock):
+	'''Receive a JSON object sent with send_json.'''
+	return(json.loads(recv_frame(sock).decode()))
+
+class FrameWriter(object):
+	'''Binary file-like object sending what is written as data frames.
+
+	Data is buffered and sent in frames of about FRAME_SIZE bytes. Empty
+	frames are never sent as data: they mark the end of a response.
+	'''
+
+	def __init__(self, sock):
+		self.sock = sock
+		self._buffer = []
+		self._size = 0
+
+	def write(self, data):
+		self._buffer.append(bytes(data))
+		self._size += len(data)
+		if FRAME_SIZE <= self._size:
+			self.flush()
+		return(len(data))
+
+	def flush(self):
+		if 0 != self._size:
+			send_frame(self.sock, b''.join(self._buffer))
+		self._buffer = []
+		self._size = 0
+
+def request(path, header, payloads = (), out = None):
+	'''Send a request to a server and receive its response.
+
+	A request is a JSON frame, followed by one data frame per payload. A
+	response is a series of data frames, an empty frame, and a JSON status
+	frame.
+
+	Args:
+		path (string): server socket path.
+		header (dict): request.
+		payloads (list): bytes sent after the request, e.g., bed records.
+		out (file): binary file the response data is written to, discarded
+			if None.
+
+	Returns:
+		dict: response status, with the round trip time as client_s.
+	'''
+	start_time = time.perf_counter()
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		sock.connect(path)
+		send_json(sock, header)
+		for payload in payloads:
+			send_frame(sock, payload)
+		while True:
+			data = recv_frame(sock)
+			if 0 == len(data):
+				break
+			if type(None) != type(out):
+				out.write(data)
+		status = recv_json(sock)
+	finally:
+		sock.close()
+	status['client_s'] = time.perf_counter() - start_time
+	return(status)
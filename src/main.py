@@ -0,0 +1,104 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# 
+# Author: Gabriele Girelli
+# Email: gigi.ga90@gmail.com
+# Version: 1.0.0
+# Description: run a pipeline of bed-tools-gg steps in a single process.
+# 
+# ------------------------------------------------------------------------------
+
+
+
+# DEPENDENCIES =================================================================
+
+import argparse
+import os
+import sys
+
+# Loaded local bed-tools-gg python library and modules
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/lib/')
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/mods/')
+import bed_lib as bd
+import pipeline as pl
+
+# PARAMETERS ===================================================================
+
+# Add script description
+parser = argparse.ArgumentParser(description = '''
+Run a pipeline of steps in a single process, passing typed in-memory tables
+between them instead of text files. The pipeline is declared in a JSON file,
+with named "stages" and the "outputs" to write. Every stage has an "op":
+read (path), gen_bin (chrlen, size, step, last_bin, chroms), bin (regions,
+bedfiles, collapse, partial, including, float), shuffle (input, column, seed,
+perc, iterations, summary, quantiles, sketch) or matrix (inputs, column,
+by_name). Strings starting with @ reference the output of another stage, e.g.,
+"regions" : "@bins". Stages are evaluated lazily: only those needed by the
+requested outputs are run, and their tables are released once used.
+''')
+
+# Add params
+parser.add_argument('pipeline', type = str, nargs = 1,
+	help = 'Path to pipeline JSON file.')
+
+# Add flags
+parser.add_argument('-O', '--outputs', metavar = 'stage', type = str,
+	nargs = '+', default = None,
+	help = 'Only write the outputs of these stages. Default: all outputs.')
+parser.add_argument('-p', '--threads', metavar = 'nthreads', type = int,
+	nargs = 1, default = [1],
+	help = '''Number of processes of stages without a "threads" parameter.
+	Default: 1''')
+parser.add_argument('-n', '--dry-run',
+	action = 'store_const', dest = 'dry_run', const = True, default = False,
+	help = 'Print the stages that would be run, in order, and exit.')
+parser.add_argument('--profile',
+	action = 'store_const', const = True, default = False,
+	help = '''Profile the run: print time, rows and memory of every stage to
+	stderr.''')
+parser.add_argument('--profile-json', metavar = 'path', type = str, nargs = 1,
+	default = [None],
+	help = 'Also write the profile as a JSON report. Implies --profile.')
+
+# Parse arguments
+args = parser.parse_args()
+
+# Retrieve arguments
+pipeline_path = args.pipeline[0]
+outputs = args.outputs
+threads = max(1, args.threads[0])
+dry_run = args.dry_run
+profile_json = args.profile_json[0]
+profile = args.profile or type(None) != type(profile_json)
+
+# Check pipeline
+if not os.path.isfile(pipeline_path):
+	sys.exit('!!! ERROR !!! Invalid pipeline, file not found: ' +
+		pipeline_path)
+
+# RUN ==========================================================================
+
+# Profile stages
+if profile:
+	bd.PROFILER.enable()
+
+try:
+	pipeline = pl.Pipeline.load(pipeline_path, threads)
+	if dry_run:
+		for name in pipeline.plan(outputs):
+			print(name + '\t' + pipeline.stages[name]['op'] + '\t' +
+				','.join(pipeline.dependencies(name)))
+	else:
+		pipeline.run(outputs, sys.stderr)
+except ValueError as e:
+	sys.exit('!!! ERROR !!! ' + str(e))
+
+# Profile report
+if profile:
+	bd.PROFILER.report(profile_json)
+
+# END ==========================================================================
+
+################################################################################
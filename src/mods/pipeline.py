@@ -0,0 +1,294 @@
+#
+#
+
+import json
+import numpy as np
+import os
+import pandas as pd
+import sys
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
+import bed_lib as bd
+
+# Prefix of stage references in stage parameters
+REF_PREFIX = '@'
+
+def _table(value, skip_header = None):
+	'''A bed table, read from value unless already a table.'''
+	if isinstance(value, pd.DataFrame):
+		return(value)
+	return(bd.read_bed(value, skip_header))
+
+def _skip_header(params):
+	'''skip_header argument of read_bed, from a no_header parameter.'''
+	return(False if params.get('no_header', False) else None)
+
+def op_read(params, threads):
+	'''Read a bed file.
+
+	Params: path, no_header.
+	'''
+	return(_table(params['path'], _skip_header(params)))
+
+def op_gen_bin(params, threads):
+	'''Generate bins covering every chromosome, as gen_bin.py -A.
+
+	Params: chrlen (chr-length file, or table), size, step (default: size),
+	last_bin, chroms (only bin these chromosomes).
+	'''
+	size = int(params['size'])
+	step = int(params.get('step', size))
+	if step > size or 0 >= step:
+		raise ValueError('Cannot bin chromosome with bin step > bin size.')
+
+	lengths = params['chrlen']
+	if not isinstance(lengths, pd.DataFrame):
+		lengths = bd.read_bed(lengths, columns = ['chr', 'len'])
+	if 'chroms' in params:
+		lengths = lengths[lengths['chr'].isin(params['chroms'])]
+	return(bd.bin_genome(lengths, size, step, params.get('last_bin', False)))
+
+def op_bin(params, threads):
+	'''Assign bed rows to regions and collapse them, as bin.py.
+
+	Params: regions, bedfiles (list), collapse, partial (-m), including (-l),
+	float, no_header.
+	'''
+	skip_header = _skip_header(params)
+	rois = _table(params['regions'], skip_header)
+	if not 'score' in rois.columns:
+		rois = rois.assign(score = np.nan)
+	return(bd.collapse_samples(rois, params['bedfiles'],
+		params.get('partial', False), params.get('including', False),
+		params.get('collapse', 'sum'), params.get('float', False),
+		threads, skip_header))
+
+def op_shuffle(params, threads):
+	'''Shuffle the read counts of a score column, as shuffle.py.
+
+	Params: input, column (default: score), seed, perc, iterations, summary,
+	quantiles, sketch.
+
+	Returns a chr-start-end-name table plus one iter_i column per iteration
+	or, with summary, the table of shuffle.py --summary: chr, start, end,
+	name, the observed score and the columns of NullSummary.table.
+	'''
+	bed = _table(params['input'], _skip_header(params))
+	column = params.get('column', 'score')
+	if not column in bed.columns:
+		raise ValueError('Missing shuffle column: ' + str(column))
+	counts = np.asarray(bed[column], dtype = np.int64)
+	niter = int(params.get('iterations', 1))
+	nshuffle = int(counts.sum() * params.get('perc', 10) / 100)
+	seed = int(params['seed'])
+
+	table = bed.iloc[:, :4].reset_index(drop = True)
+	if params.get('summary', False):
+		summary = bd.NullSummary(counts, params.get('quantiles', []),
+			params.get('sketch', 100), np.random.default_rng([seed, 0]))
+		for (filei, iteri, shuffled) in bd.iter_shuffle_counts([counts],
+			[nshuffle], niter, seed, threads):
+			summary.update(shuffled)
+		return(bd.null_summary_table(pd.concat([table,
+			bed[column].rename('score').reset_index(drop = True)], axis = 1),
+			summary))
+
+	matrix = np.zeros((counts.shape[0], niter), dtype = np.int64)
+	for (filei, iteri, shuffled) in bd.iter_shuffle_counts([counts],
+		[nshuffle], niter, seed, threads):
+		matrix[:, iteri] = shuffled
+	return(pd.concat([table, pd.DataFrame(matrix, columns = [
+		'iter_' + str(i + 1) for i in range(niter)])], axis = 1))
+
+def op_matrix(params, threads):
+	'''Merge the score column of several tables into a matrix, as 2matrix.py.
+
+	Params: inputs (list), column (default: score), by_name, no_header.
+	'''
+	column = params.get('column', 'score')
+	beds = []
+	for value in params['inputs']:
+		bed = _table(value, _skip_header(params))
+		if not column in bed.columns:
+			raise ValueError('Missing matrix column: ' + str(column))
+		beds.append(pd.concat([bed.iloc[:, :4], bed[column].rename('score')],
+			axis = 1))
+	return(bd.merge_beds(beds, params.get('by_name', False)))
+
+# Stage operations, by name
+OPS = {'read' : op_read, 'gen_bin' : op_gen_bin, 'bin' : op_bin,
+	'shuffle' : op_shuffle, 'matrix' : op_matrix}
+
+def references(value):
+	'''Names of the stages referenced in a (nested) parameter value.'''
+	if isinstance(value, str):
+		return([value[len(REF_PREFIX):]] if value.startswith(REF_PREFIX)
+			else [])
+	if isinstance(value, dict):
+		value = list(value.values())
+	if isinstance(value, list):
+		return([name for item in value for name in references(item)])
+	return([])
+
+def resolve(value, tables):
+	'''Replace stage references in a parameter value with their tables.'''
+	if isinstance(value, str):
+		return(tables[value[len(REF_PREFIX):]] if value.startswith(REF_PREFIX)
+			else value)
+	if isinstance(value, dict):
+		return(dict((k, resolve(v, tables)) for (k, v) in value.items()))
+	if isinstance(value, list):
+		return([resolve(item, tables) for item in value])
+	return(value)
+
+class Pipeline(object):
+	'''Lazy pipeline of stages, passing in-memory tables to each other.
+
+	A pipeline is declared as a JSON object, with a "stages" object of named
+	stages and an "outputs" object of stage names and output paths:
+
+		{"stages" : {
+			"bins" : {"op" : "gen_bin", "chrlen" : "chr.len", "size" : 1e6},
+			"counts" : {"op" : "bin", "regions" : "@bins",
+				"bedfiles" : ["a.bed", "b.bed"]}},
+		"outputs" : {"counts" : "counts.bed"}}
+
+	Every stage has an op (a key of OPS) and its parameters. Strings starting
+	with @ are references to other stages, replaced by their output table.
+	Stages are only evaluated when needed by a requested output, and their
+	tables are released as soon as no other needed stage uses them.
+
+	Attributes:
+		stages (dict): stage parameters, by name.
+		outputs (dict): output path (or {"path", "header"} object), by stage.
+		threads (int): default number of processes of a stage.
+	'''
+
+	def __init__(self, spec, threads = 1):
+		'''Check a pipeline declaration.
+
+		Args:
+			spec (dict): pipeline declaration.
+			threads (int): default number of processes of a stage.
+		'''
+		self.stages = spec.get('stages', {})
+		self.outputs = spec.get('outputs', {})
+		self.threads = threads
+
+		for (name, stage) in self.stages.items():
+			if not isinstance(stage, dict) or not stage.get('op') in OPS:
+				raise ValueError('Unknown op of stage "' + name + '": ' +
+					str(stage.get('op') if isinstance(stage, dict) else stage))
+			for ref in self.dependencies(name):
+				if not ref in self.stages:
+					raise ValueError('Stage "' + name +
+						'" references a missing stage: ' + ref)
+		for name in self.outputs.keys():
+			if not name in self.stages:
+				raise ValueError('Output of a missing stage: ' + name)
+
+	@staticmethod
+	def load(path, threads = 1):
+		'''Load a pipeline declaration from a JSON file.'''
+		with open(path, 'r') as f:
+			return(Pipeline(json.load(f), threads))
+
+	def dependencies(self, name):
+		'''Names of the stages a stage references, without duplicates.'''
+		params = dict((k, v) for (k, v) in self.stages[name].items()
+			if 'op' != k)
+		return(list(dict.fromkeys(references(params))))
+
+	def plan(self, outputs = None):
+		'''Stages to evaluate for some outputs, in evaluation order.
+
+		Args:
+			outputs (list): requested outputs, default: all.
+
+		Returns:
+			list: stage names, every stage after its dependencies.
+		'''
+		if type(None) == type(outputs):
+			outputs = list(self.outputs.keys())
+
+		order = []
+		state = {}
+		def visit(name, path):
+			if 'done' == state.get(name):
+				return
+			if 'visiting' == state.get(name):
+				raise ValueError('Cyclic stages: ' + ' -> '.join(path + [name]))
+			state[name] = 'visiting'
+			for ref in self.dependencies(name):
+				visit(ref, path + [name])
+			state[name] = 'done'
+			order.append(name)
+
+		for name in outputs:
+			if not name in self.outputs:
+				raise ValueError('Unknown output: ' + str(name))
+			visit(name, [])
+		return(order)
+
+	def evaluate(self, name, tables):
+		'''Evaluate a stage, given the tables of its dependencies.'''
+		params = resolve(dict((k, v) for (k, v) in self.stages[name].items()
+			if not k in ('op', 'threads')), tables)
+		with bd.PROFILER.stage('stage:' + name) as stage:
+			table = OPS[self.stages[name]['op']](params,
+				int(self.stages[name].get('threads', self.threads)))
+			stage.add_rows(table.shape[0])
+		return(table)
+
+	def run(self, outputs = None, log = None):
+		'''Evaluate the stages needed by some outputs, and write them.
+
+		Args:
+			outputs (list): requested outputs, default: all.
+			log (file): stream for progress messages, none if None.
+
+		Returns:
+			list: written output paths.
+		'''
+		order = self.plan(outputs)
+		requested = [name for name in order
+			if name in self.outputs and (type(None) == type(outputs) or
+			name in outputs)]
+
+		# Number of pending uses of every table
+		pending = dict((name, 0) for name in order)
+		for name in order:
+			for ref in self.dependencies(name):
+				pending[ref] += 1
+		for name in requested:
+			pending[name] += 1
+
+		tables = {}
+		written = []
+		for name in order:
+			if log:
+				log.write(' · Stage ' + name + ' (' +
+					self.stages[name]['op'] + ')\n')
+			tables[name] = self.evaluate(name, tables)
+
+			if name in requested:
+				written.append(self.write(name, tables[name]))
+				pending[name] -= 1
+
+			# Release tables that are no longer needed
+			for ref in self.dependencies(name):
+				pending[ref] -= 1
+				if 0 == pending[ref]:
+					del tables[ref]
+			if 0 == pending[name]:
+				del tables[name]
+		return(written)
+
+	def write(self, name, table):
+		'''Write the output of a stage.'''
+		output = self.outputs[name]
+		if not isinstance(output, dict):
+			output = {'path' : output}
+		bd.write_bed(table, output['path'],
+			header = output.get('header', False))
+		return(output['path'])
@@ -0,0 +1,127 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# 
+# Author: Gabriele Girelli
+# Email: gigi.ga90@gmail.com
+# Version: 2.0.0
+# Description: 	merges bedfiles into a matrix.
+# 				The score column is merged based on the position or the name.
+# 
+# ------------------------------------------------------------------------------
+
+
+
+# DEPENDENCIES =================================================================
+
+import argparse
+import numpy as np
+import os
+import sys
+
+# Loaded local bed-tools-gg python library
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
+import bed_lib as bd
+
+# PARAMETERS ===================================================================
+
+# Add script description
+parser = argparse.ArgumentParser(description = '''
+Merge bedfiles into a matrix. The score column is merged based on the position
+given by the chr+start+end columns (default) or by the name column (-n option).
+Every file is read once. Keys missing from a file get a score of 0.
+Output is NOT in bed format: chr, start, end, name, then a score column per
+bedfile, sorted by chr, start and end (or by name, with -n). Integral scores are
+written as integers, others in their shortest form, as with -s.
+''')
+
+# Add params
+parser.add_argument('bedfile', type = str, nargs = '+',
+	help = 'Bed file(s). Expected to be ordered per condition.')
+
+# Add flags
+parser.add_argument('-n',
+	action = 'store_const', const = True, default = False,
+	help = 'Merge bedfiles based on name instead of location.')
+parser.add_argument('-s', '--sorted',
+	action = 'store_const', const = True, default = False,
+	help = '''Streaming k-way merge of sorted bedfiles, using constant memory.
+	Bedfiles must be sorted by chr, start and end (sort -k1,1 -k2,2n -k3,3n),
+	or by name with -n (sort -k4,4). Output follows the same order.''')
+parser.add_argument('-o', metavar = 'outfile', type = str, nargs = 1,
+	default = [False],
+	help = 'Output file. Output to stdout if not specified.')
+parser.add_argument('-z', '--compress', type = str, nargs = 1,
+	choices = ['gzip', 'bgzip'], default = [None],
+	help = '''Compress output file. Default: gzip if outfile ends in .gz,
+	bgzip if it ends in .bgz, no compression otherwise.''')
+parser.add_argument('--no-header',
+	action = 'store_const', dest = 'header',
+	const = True, default = False,
+	help = 'Bed files have no header. Default: detect it.')
+
+# Parse arguments
+args = parser.parse_args()
+
+# Retrieve arguments
+bedfiles = args.bedfile
+byName = args.n
+sortedInput = args.sorted
+outfile = args.o[0]
+compress = args.compress[0]
+noHeader = args.header
+
+# Check bedfiles
+for bf in bedfiles:
+	if not os.path.exists(bf):
+		sys.exit('!!! ERROR !!! Invalid bedfile, file not found: ' + bf)
+
+# FUNCTIONS ====================================================================
+
+def write_rows(out, keys, scores):
+	'''Write matrix rows, from chr-start-end-name text and float scores.
+
+	Shared by both modes, so that they format scores the same way.
+	'''
+	if 0 == len(keys):
+		return
+	cells = np.column_stack((np.asarray(keys, dtype = 'O'),
+		bd.format_scores(scores)))
+	out.write_text('\n'.join('\t'.join(row) for row in cells) + '\n')
+
+def write_text_rows(out, rows):
+	'''Write merged text rows of iter_merge_sorted, see write_rows.'''
+	# Parsed as the in-memory reader does, to the closest float
+	scores = np.asarray([row[4:] for row in rows], dtype = 'str')
+	write_rows(out, [row[:4] for row in rows], scores.astype(np.float64))
+
+# RUN ==========================================================================
+
+with bd.BedWriter(outfile, compress = compress) as out:
+	if sortedInput:
+		# Stream merged rows
+		rows = []
+		try:
+			for row in bd.iter_merge_sorted(bedfiles, byName,
+				False if noHeader else None):
+				rows.append(row)
+				if bd.BedWriter.CHUNK_SIZE == len(rows):
+					write_text_rows(out, rows)
+					rows = []
+		except ValueError as e:
+			sys.exit('!!! ERROR !!! ' + str(e))
+		write_text_rows(out, rows)
+	else:
+		# Read every bedfile once
+		beds = [bd.read_bed(bf, False if noHeader else None)
+			for bf in bedfiles]
+		table = bd.merge_beds(beds, byName)
+		for i in range(0, table.shape[0], bd.BedWriter.CHUNK_SIZE):
+			chunk = table.iloc[i:(i + bd.BedWriter.CHUNK_SIZE)]
+			write_rows(out, chunk.iloc[:, :4].astype('str').to_numpy(),
+				chunk.iloc[:, 4:].to_numpy(dtype = np.float64))
+
+# END ==========================================================================
+
+################################################################################
@@ -25,6 +25,7 @@ import sys
 # Loaded local bed-tools-gg python library
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
 import bed_lib as bd
+import socket_lib as sl
 
 # Change pandas default options
 pd.options.mode.chained_assignment = None  # default='warn'
@@ -58,10 +59,47 @@ parser.add_argument('-l',
 parser.add_argument('-o', metavar = 'outfile', type = str, nargs = 1,
 	default = [False],
 	help = 'Output file (not a bed). Output to stdout if not specified.')
+parser.add_argument('-z', '--compress', type = str, nargs = 1,
+	choices = ['gzip', 'bgzip'], default = [None],
+	help = '''Compress output file. Default: gzip if outfile ends in .gz,
+	bgzip if it ends in .bgz, no compression otherwise.''')
+parser.add_argument('-p', '--threads', metavar = 'nthreads', type = int,
+	nargs = 1, default = [1],
+	help = 'Number of processes, chromosomes are run in parallel. Default: 1')
+parser.add_argument('-s', '--chunksize', metavar = 'nrows', type = int,
+	nargs = 1, default = [0],
+	help = '''Stream the bedfile in chunks of nrows rows, assigning and writing
+	each chunk before reading the next. Input can be in any order, but
+	coordinate-sorted chunks touch a single chromosome. Default: load the whole
+	bedfile.''')
 parser.add_argument('-N', '--usename',
 	action = 'store_const', dest = 'use_name',
 	const = True, default = False,
 	help = 'Use ROI name instead of ROI coordinates.')
+parser.add_argument('--index-cache', metavar = 'dir', type = str, nargs = 1,
+	default = [None],
+	help = '''Directory of cached region indexes. The index of the regfile is
+	loaded from it, or built and saved there for later runs.''')
+parser.add_argument('--index-cache-size', metavar = 'MB', type = int,
+	nargs = 1, default = [1024],
+	help = '''Size cap of the index cache, least recently used indexes are
+	removed above it. Default: 1024''')
+parser.add_argument('--result-cache', metavar = 'dir', type = str,
+	nargs = 1, default = [None],
+	help = '''Directory of cached results. If the same bedfile, regions and
+	options (by content) were already run, the output is copied from it,
+	otherwise it is saved there for later runs.''')
+parser.add_argument('--result-cache-size', metavar = 'MB', type = int,
+	nargs = 1, default = [1024],
+	help = '''Size cap of the result cache, least recently used results are
+	removed above it. Default: 1024''')
+parser.add_argument('--profile',
+	action = 'store_const', const = True, default = False,
+	help = '''Profile the run: print time, rows and memory of every stage to
+	stderr.''')
+parser.add_argument('--profile-json', metavar = 'path', type = str, nargs = 1,
+	default = [None],
+	help = 'Also write the profile as a JSON report. Implies --profile.')
 
 # Parse arguments
 args = parser.parse_args()
@@ -74,28 +112,61 @@ keep_marginal_overlaps = args.m
 keep_including = args.l
 use_name = args.use_name
 outfile = args.o[0]
-
-# Default variables
-bedcolnames = ['chr', 'start', 'end', 'name', 'score']
+compress = args.compress[0]
+threads = max(1, args.threads[0])
+chunksize = args.chunksize[0]
+index_cache = args.index_cache[0]
+index_cache_size = args.index_cache_size[0]
+result_cache = args.result_cache[0]
+result_cache_size = args.result_cache_size[0]
+profile_json = args.profile_json[0]
+profile = args.profile or type(None) != type(profile_json)
 
 # RUN ==========================================================================
 
-# Read regions file
-rois = pd.read_csv(regfile, '\t', names = bedcolnames)
-
-# Read bed file
-bed = pd.read_csv(bedfile, '\t', names = bedcolnames, skiprows = [0])
-
-# Assign rois to bed rows
-bed = bd.assign_to_rois(rois, bed, keep_unassigned_rows, keep_marginal_overlaps,
-	keep_including, use_name)
-
-# Output
-if False == outfile:
-	for i in range(bed.shape[0]):
-		print('\t'.join(bed.iloc[i, :].astype('str').tolist()))
-else:
-	bed.to_csv(outfile, sep = '\t', header = False, index = False)
+# Profile stages
+if profile:
+	bd.PROFILER.enable()
+
+# Output the cached result, or compute it
+result = bd.ResultCache(result_cache, result_cache_size * 1024 ** 2).result(
+	'add_rois', [__file__, bd.__file__, sl.__file__, regfile, bedfile],
+	{'u' : keep_unassigned_rows, 'm' : keep_marginal_overlaps,
+	'l' : keep_including, 'use_name' : use_name})
+if not result.fetch(outfile, compress):
+	# Read regions file
+	rois = bd.read_bed(regfile)
+
+	# Index regions, or load their cached index
+	index = None
+	if type(None) != type(index_cache):
+		index = bd.cached_roi_index(rois, regfile, index_cache, use_name,
+			index_cache_size * 1024 ** 2)
+
+	# Read bed file, only the indexed blocks overlapping the regions without -u
+	bed = bd.read_bed(bedfile, chunksize = chunksize if 0 < chunksize else None,
+		regions = None if keep_unassigned_rows else rois)
+
+	if 0 < chunksize:
+		# Assign rois to bed rows, one chunk at a time
+		chunks = bd.iter_assign_to_rois(rois, bed, keep_unassigned_rows,
+			keep_marginal_overlaps, keep_including, use_name, threads = threads,
+			index = index)
+	else:
+		# Assign rois to bed rows
+		chunks = [bd.assign_to_rois(rois, bed, keep_unassigned_rows,
+			keep_marginal_overlaps, keep_including, use_name, threads = threads,
+			index = index)]
+
+	# Output, also to the result cache
+	with bd.BedWriter(outfile, compress = compress) as out:
+		with result.record(out):
+			for bed in chunks:
+				out.write(bed)
+
+# Profile report
+if profile:
+	bd.PROFILER.report(profile_json)
 
 # END --------------------------------------------------------------------------
 
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# 
+# Author: Gabriele Girelli
+# Email: gigi.ga90@gmail.com
+# Version: 1.0.0
+# Description: convert a bed file to a binary columnar cache.
+# 
+# ------------------------------------------------------------------------------
+
+
+
+# DEPENDENCIES =================================================================
+
+import argparse
+import os
+import sys
+
+# Loaded local bed-tools-gg python library
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
+import bed_lib as bd
+
+# PARAMETERS ===================================================================
+
+# Add script description
+parser = argparse.ArgumentParser(description = '''
+Convert a bed file to a binary columnar cache: a directory with one
+memory-mappable array per column and a small header, with the chromosome
+dictionary and the row offsets of every chromosome. Rows are grouped per
+chromosome, in order of first appearance. The cache can be used by every
+script in place of the bed file, and is loaded without parsing.
+''')
+
+# Add params
+parser.add_argument('bedfile', type = str, nargs = 1,
+	help = 'Path to bedfile, possibly gzip or bgzip compressed.')
+
+# Add flags
+parser.add_argument('-o', metavar = 'outdir', type = str, nargs = 1,
+	default = [None],
+	help = '''Output cache directory.
+	Default: bedfile with .bedc extension, instead of .bed[.gz|.bgz]''')
+parser.add_argument('--no-header',
+	action = 'store_const', dest = 'header',
+	const = True, default = False,
+	help = 'Bed file has no header. Default: detect it.')
+
+# Parse arguments
+args = parser.parse_args()
+
+# Retrieve arguments
+bedfile = args.bedfile[0]
+outdir = args.o[0]
+noHeader = args.header
+
+if type(None) == type(outdir):
+	outdir = bedfile
+	for ext in ('.gz', '.bgz', '.bed'):
+		if outdir.endswith(ext):
+			outdir = outdir[:-len(ext)]
+	outdir += '.bedc'
+
+# RUN ==========================================================================
+
+bd.write_bed_cache(bd.read_bed(bedfile, False if noHeader else None), outdir)
+
+# END ==========================================================================
+
+################################################################################
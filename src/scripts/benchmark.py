@@ -0,0 +1,154 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# 
+# Author: Gabriele Girelli
+# Email: gigi.ga90@gmail.com
+# Version: 1.0.0
+# Description: benchmark the scripts on seeded synthetic bed files.
+# 
+# ------------------------------------------------------------------------------
+
+
+
+# DEPENDENCIES =================================================================
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Loaded local bed-tools-gg python library
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
+import bed_lib as bd
+import bench_lib as bl
+
+# PARAMETERS ===================================================================
+
+# Add script description
+parser = argparse.ArgumentParser(description = '''
+Benchmark the scripts on seeded synthetic data. For every scale (number of
+reads), a read-level bedfile, non-overlapping and overlapping regions, a
+chromosome lengths file and binned read counts are generated. Then, every case
+is run in its own process, recording wall time and peak resident memory.
+Results are written as JSON, to compare commits.
+''')
+
+# Add flags
+parser.add_argument('-s', '--scales', metavar = 'nrows', type = float,
+	nargs = '+', default = [1e4, 1e5, 1e6],
+	help = '''Number of reads of the synthetic bedfile. Regions are 1/100 of
+	the reads, bins as many as the reads. Default: 1e4 1e5 1e6''')
+parser.add_argument('-c', '--cases', metavar = 'case', type = str,
+	nargs = '+', default = None,
+	help = '''Only run the cases starting with these prefixes, e.g., add_rois
+	bin.sum gen_bin shuffle 2matrix rep. Default: all.''')
+parser.add_argument('-g', '--genome', metavar = 'bp', type = float, nargs = 1,
+	default = [3e8], help = 'Genome size. Default: 3e8')
+parser.add_argument('--chroms', metavar = 'n', type = int, nargs = 1,
+	default = [8], help = 'Number of chromosomes. Default: 8')
+parser.add_argument('-r', '--repeat', metavar = 'n', type = int, nargs = 1,
+	default = [1], help = 'Runs per case. Default: 1')
+parser.add_argument('--seed', metavar = 'seed', type = int, nargs = 1,
+	default = [1], help = 'Seed of the synthetic data. Default: 1')
+parser.add_argument('-o', metavar = 'outfile', type = str, nargs = 1,
+	default = [None],
+	help = 'Output JSON file. Output to stdout if not specified.')
+parser.add_argument('--tmpdir', metavar = 'dir', type = str, nargs = 1,
+	default = [None],
+	help = 'Directory for synthetic data, removed at the end. Default: system')
+
+# Parse arguments
+args = parser.parse_args()
+
+# Retrieve arguments
+scales = [int(s) for s in args.scales]
+prefixes = args.cases
+genome_size = int(args.genome[0])
+nchroms = args.chroms[0]
+nrepeat = max(1, args.repeat[0])
+seed = args.seed[0]
+outfile = args.o[0]
+tmpdir = args.tmpdir[0]
+
+# Scripts
+scripts = os.path.dirname(os.path.realpath(__file__)) + '/'
+
+# FUNCTIONS ====================================================================
+
+def cases(data, scale):
+	'''List the (name, command) benchmark cases of a scale.'''
+	py = [sys.executable]
+	out = []
+	for rois in ('rois', 'overlapping_rois'):
+		for (mode, flags) in (('default', []), ('m', ['-m']), ('l', ['-l'])):
+			out.append(('add_rois.' + mode + '.' + rois, py + [
+				scripts + 'add_rois.py', data[rois], data['reads']] + flags))
+	for method in bd.COLLAPSE_METHODS:
+		out.append(('bin.' + method, py + [scripts + 'bin.py', '-c', method,
+			data['rois'], data['reads']]))
+	size = str(max(1, genome_size // scale))
+	out.append(('gen_bin', py + [scripts + 'gen_bin.py', '-A',
+		'-i', size, '-t', size, data['lengths']]))
+	out.append(('shuffle', py + [scripts + 'shuffle.py', str(seed),
+		data['counts'][0], '-n', '10', '-o', data['dir'] + '/shuffled/']))
+	out.append(('2matrix', py + [scripts + '2matrix.py'] + data['counts']))
+	out.append(('rep', py + [scripts + 'rep.py', data['counts'][0]]))
+	return([(name, cmd) for (name, cmd) in out
+		if not prefixes or any(name.startswith(p) for p in prefixes)])
+
+def generate(scale):
+	'''Generate the synthetic data of a scale.'''
+	path = tempfile.mkdtemp(prefix = 'bench' + str(scale) + '_', dir = tmpdir)
+	lengths = bl.synthetic_lengths(genome_size, nchroms, seed)
+	data = {'dir' : path, 'lengths' : path + '/chr.len',
+		'reads' : path + '/reads.bed', 'rois' : path + '/rois.bed',
+		'overlapping_rois' : path + '/overlapping_rois.bed',
+		'counts' : [path + '/counts' + str(i) + '.bed' for i in range(4)]}
+
+	bd.write_bed(lengths, data['lengths'])
+	bl.write_synthetic_reads(data['reads'], lengths, scale, seed)
+	bl.write_synthetic_rois(data['rois'], lengths, max(100, scale // 100),
+		seed)
+	bl.write_synthetic_rois(data['overlapping_rois'], lengths,
+		max(100, scale // 100), seed, overlapping = True)
+	for i in range(len(data['counts'])):
+		bl.write_synthetic_counts(data['counts'][i], lengths, scale, seed, i)
+	return(data)
+
+# RUN ==========================================================================
+
+meta = bl.bench_meta(seed)
+meta.update({'genome_size' : genome_size, 'chroms' : nchroms,
+	'generate_s' : {}})
+results = []
+
+for scale in scales:
+	sys.stderr.write(' · Generating data, scale ' + str(scale) + '\n')
+	start = time.perf_counter()
+	data = generate(scale)
+	meta['generate_s'][str(scale)] = time.perf_counter() - start
+
+	try:
+		for (name, cmd) in cases(data, scale):
+			for repeat in range(nrepeat):
+				result = bl.run_case(cmd)
+				sys.stderr.write(' >>> ' + name + ' x' + str(scale) + ': ' +
+					'%.3f s, %d MB' % (result['wall_s'],
+					result['max_rss_kb'] // 1024) + ('\n'
+					if 0 == result['returncode'] else ', FAILED\n'))
+				result.update({'case' : name, 'scale' : scale,
+					'repeat' : repeat, 'cmd' : [os.path.basename(c)
+					for c in cmd[1:]]})
+				results.append(result)
+	finally:
+		shutil.rmtree(data['dir'], ignore_errors = True)
+
+bl.write_results(outfile, meta, results)
+
+# END ==========================================================================
+
+################################################################################
@@ -22,6 +22,7 @@ import sys
 # Loaded local bed-tools-gg python library
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
 import bed_lib as bd
+import socket_lib as sl
 
 # Change pandas default options
 pd.options.mode.chained_assignment = None  # default='warn'
@@ -34,18 +35,26 @@ Assign bed rows to Region of Interest (ROIs) and collapse them.
 Every row in the bedfile is assigned to a ROI from the regfile.
 Then, the file is collapsed to have a single row per ROI.
 Rows can be collapsed in different ways: sum, max, min, median, mean, count.
-The output is in bed format.
+Or, with coverage and covmean, rows are weighted by the base pairs they share
+with each ROI, without being assigned: coverage sums score times overlap, and
+covmean divides it by the ROI size, as the mean per-bp coverage. They are
+computed from a coverage track of the rows, built once per chromosome.
+The output is in bed format. With multiple bedfiles, the regions are read and
+indexed once, and a score column is reported per bedfile.
 ''')
 
 # Add params
 parser.add_argument('regfile', type = str, nargs = 1,
-	help = 'Path to bedfile, containing regions to be assigned to.')
-parser.add_argument('bedfile', type = str, nargs = 1,
-	help = 'Path to bedfile, containing rows to be assigned.')
+	help = '''Path to bedfile, containing regions to be assigned to. With
+	--binsize, path to file with chromosome lengths (chr, length) instead.''')
+parser.add_argument('bedfile', type = str, nargs = '+',
+	help = '''Path to bedfile(s), containing rows to be assigned. With more
+	than one bedfile, output one score column per bedfile, in the same
+	order.''')
 
 # Add flags
 parser.add_argument('-c', '--collapse', type = str, nargs = 1,
-	choices = ['min', 'mean', 'median', 'max', 'count', 'sum'],
+	choices = list(bd.COLLAPSE_METHODS),
 	help = '''Collapse method. Default: sum''',
 	default = ['sum'])
 parser.add_argument('-u',
@@ -60,6 +69,27 @@ parser.add_argument('-l',
 parser.add_argument('-o', metavar = 'outfile', type = str, nargs = 1,
 	default = [False],
 	help = 'Output file (not a bed). Output to stdout if not specified.')
+parser.add_argument('-z', '--compress', type = str, nargs = 1,
+	choices = ['gzip', 'bgzip'], default = [None],
+	help = '''Compress output file. Default: gzip if outfile ends in .gz,
+	bgzip if it ends in .bgz, no compression otherwise.''')
+parser.add_argument('-p', '--threads', metavar = 'nthreads', type = int,
+	nargs = 1, default = [1],
+	help = '''Number of processes. Bedfiles are run in parallel, or the
+	chromosomes of a single bedfile. Default: 1''')
+parser.add_argument('-i', '--binsize', metavar = 'bsi', type = int, nargs = 1,
+	default = [0],
+	help = '''Assign to uniform bins of the given size, generated as with
+	gen_bin.py -A, instead of regions from a bedfile.''')
+parser.add_argument('-t', '--binstep', metavar = 'bst', type = int, nargs = 1,
+	default = [0],
+	help = '''Bin step, with --binsize. Non-overlapping bins if equal to bin
+	size. Default: bin size''')
+parser.add_argument('--lastbin',
+	dest = 'last_bin', action = 'store_const',
+	const = True, default = False,
+	help = '''With --binsize, make additional last bin over the chromosome end
+	to avoid excluding the last portion.''')
 parser.add_argument('--float',
 	action = 'store_const', dest = 'f',
 	const = True, default = False,
@@ -67,48 +97,140 @@ parser.add_argument('--float',
 parser.add_argument('--no-header',
 	action = 'store_const', dest = 'header',
 	const = True, default = False,
-	help = 'Bed file has no header.')
+	help = 'Bed file has no header. Default: detect it.')
+parser.add_argument('--index-cache', metavar = 'dir', type = str, nargs = 1,
+	default = [None],
+	help = '''Directory of cached region indexes. The index of the regfile is
+	loaded from it, or built and saved there for later runs.''')
+parser.add_argument('--index-cache-size', metavar = 'MB', type = int,
+	nargs = 1, default = [1024],
+	help = '''Size cap of the index cache, least recently used indexes are
+	removed above it. Default: 1024''')
+parser.add_argument('--result-cache', metavar = 'dir', type = str,
+	nargs = 1, default = [None],
+	help = '''Directory of cached results. If the same bedfiles, regions and
+	options (by content) were already run, the output is copied from it,
+	otherwise it is saved there for later runs.''')
+parser.add_argument('--result-cache-size', metavar = 'MB', type = int,
+	nargs = 1, default = [1024],
+	help = '''Size cap of the result cache, least recently used results are
+	removed above it. Default: 1024''')
+parser.add_argument('--state', metavar = 'npz', type = str, nargs = 1,
+	default = [None],
+	help = '''Incremental mode. Load the per-ROI sums, counts, minima and
+	maxima of previous runs from this file (if it exists), add the rows of the
+	bedfiles to them, save them back, and output the collapse of every row
+	added so far. Bedfiles then contain only the new rows (e.g., a new lane)
+	of each sample, in the same order at every run. Float sums can differ from
+	a single run in the last digits. Not available with -c median: rerun on
+	the cumulative bedfiles instead.''')
+parser.add_argument('--profile',
+	action = 'store_const', const = True, default = False,
+	help = '''Profile the run: print time, rows and memory of every stage to
+	stderr.''')
+parser.add_argument('--profile-json', metavar = 'path', type = str, nargs = 1,
+	default = [None],
+	help = 'Also write the profile as a JSON report. Implies --profile.')
 
 # Parse arguments
 args = parser.parse_args()
 
 # Retrieve arguments
 regfile = args.regfile[0]
-bedfile = args.bedfile[0]
+bedfiles = args.bedfile
 selected_collapse = args.collapse[0]
 keep_unassigned_rows = args.u
 keep_marginal_overlaps = args.m
 keep_including = args.l
 use_name = True
 outfile = args.o[0]
+compress = args.compress[0]
+threads = max(1, args.threads[0])
 floatValues = args.f
+size = args.binsize[0]
+step = args.binstep[0] if 0 != args.binstep[0] else size
+last_bin = args.last_bin
 noHeader = args.header
-
-# Default variables
-bedcolnames = ['chr', 'start', 'end', 'name', 'score']
+index_cache = args.index_cache[0]
+index_cache_size = args.index_cache_size[0]
+result_cache = args.result_cache[0]
+result_cache_size = args.result_cache_size[0]
+state_path = args.state[0]
+profile_json = args.profile_json[0]
+profile = args.profile or type(None) != type(profile_json)
+
+# Check options
+if 0 != size and (step > size or 0 > step):
+	sys.exit('!!! ERROR !!! Cannot bin chromosome with bin step > bin size.')
+if selected_collapse in bd.COVERAGE_METHODS and (
+	keep_marginal_overlaps or keep_including):
+	sys.exit('!!! ERROR !!! -m and -l are not used with -c ' +
+		selected_collapse + ', every overlapping base pair is counted.')
+if type(None) != type(state_path) and type(None) != type(result_cache):
+	sys.exit('!!! ERROR !!! --result-cache cannot be used with --state.')
 
 # RUN ==========================================================================
 
-# Read regions file
-rois = pd.read_csv(regfile, '\t', names = bedcolnames)
-
-# Read bed file
-if noHeader:
-	bed = pd.read_csv(bedfile, '\t', names = bedcolnames)
-else:
-	bed = pd.read_csv(bedfile, '\t', names = bedcolnames, skiprows = [0])
-
-# Assign rois to bed rows
-rois = bd.assign_to_rois(rois, bed, keep_unassigned_rows,
-	keep_marginal_overlaps, keep_including, use_name, selected_collapse,
-	floatValues = floatValues)
-
-# Output
-if False == outfile:
-	for i in range(rois.shape[0]):
-		print('\t'.join(rois.iloc[i, :].astype('str').tolist()))
-else:
-	rois.to_csv(outfile, sep = '\t', header = False, index = False)
+# Profile stages
+if profile:
+	bd.PROFILER.enable()
+
+# Output the cached result, or compute it
+result = bd.ResultCache(result_cache, result_cache_size * 1024 ** 2).result(
+	'bin', [__file__, bd.__file__, sl.__file__, regfile] + bedfiles,
+	{'collapse' : selected_collapse, 'm' : keep_marginal_overlaps,
+	'l' : keep_including, 'binsize' : size, 'binstep' : step,
+	'lastbin' : last_bin, 'float' : floatValues, 'no_header' : noHeader})
+if not result.fetch(outfile, compress):
+	if 0 != size:
+		# Generate uniform bins from chromosome lengths
+		lengths = bd.read_bed(regfile, columns = ['chr', 'len'])
+		rois = bd.bin_genome(lengths, size, step, last_bin)
+		rois['score'] = np.nan
+	else:
+		# Read regions file
+		rois = bd.read_bed(regfile)
+
+	# Index regions, or load their cached index
+	index = None
+	if type(None) != type(index_cache):
+		index = bd.cached_roi_index(rois, regfile, index_cache, None,
+			index_cache_size * 1024 ** 2,
+			(size, step, last_bin) if 0 != size else '')
+
+	if type(None) != type(state_path):
+		if not selected_collapse in bd.RoiState.METHODS:
+			sys.exit('!!! ERROR !!! Cannot update -c ' + selected_collapse +
+				' incrementally, rerun on the cumulative bedfiles instead.')
+
+		# Add bed rows to the state of previous runs, then collapse it
+		state = None
+		if os.path.isfile(state_path):
+			state = bd.RoiState.load(state_path)
+		try:
+			state = bd.update_samples_state(rois, bedfiles, state,
+				keep_marginal_overlaps, keep_including, threads = threads,
+				skip_header = False if noHeader else None, index = index)
+		except ValueError as e:
+			sys.exit('!!! ERROR !!! ' + str(e))
+		state.save(state_path)
+		rois = bd.samples_table(rois, state.collapse(rois, selected_collapse),
+			floatValues)
+	else:
+		# Assign bed rows to rois and collapse, one column per bedfile
+		rois = bd.collapse_samples(rois, bedfiles,
+			keep_marginal_overlaps, keep_including, selected_collapse,
+			floatValues = floatValues, threads = threads,
+			skip_header = False if noHeader else None, index = index)
+
+	# Output, also to the result cache
+	with bd.BedWriter(outfile, compress = compress) as out:
+		with result.record(out):
+			out.write(rois)
+
+# Profile report
+if profile:
+	bd.PROFILER.report(profile_json)
 
 # END ==========================================================================
 
@@ -22,6 +22,7 @@ import sys
 # Loaded local bed-tools-gg python library
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
 import bed_lib as bd
+import socket_lib as sl
 
 # Change pandas default options
 pd.options.mode.chained_assignment = None  # default='warn'
@@ -69,6 +70,26 @@ parser.add_argument('-A', '--allchr',
 parser.add_argument('-o', metavar = 'outfile', type = str, nargs = 1,
 	default = [False],
 	help = 'Output file (not a bed). Output to stdout if not specified.')
+parser.add_argument('-z', '--compress', type = str, nargs = 1,
+	choices = ['gzip', 'bgzip'], default = [None],
+	help = '''Compress output file. Default: gzip if outfile ends in .gz,
+	bgzip if it ends in .bgz, no compression otherwise.''')
+parser.add_argument('--result-cache', metavar = 'dir', type = str,
+	nargs = 1, default = [None],
+	help = '''Directory of cached results. If the same chrlen and options
+	(by content) were already run, the output is copied from it, otherwise
+	it is saved there for later runs.''')
+parser.add_argument('--result-cache-size', metavar = 'MB', type = int,
+	nargs = 1, default = [1024],
+	help = '''Size cap of the result cache, least recently used results are
+	removed above it. Default: 1024''')
+parser.add_argument('--profile',
+	action = 'store_const', const = True, default = False,
+	help = '''Profile the run: print time, rows and memory of every stage to
+	stderr.''')
+parser.add_argument('--profile-json', metavar = 'path', type = str, nargs = 1,
+	default = [None],
+	help = 'Also write the profile as a JSON report. Implies --profile.')
 
 # Parse arguments
 args = parser.parse_args()
@@ -82,6 +103,11 @@ delim = args.delim[0]
 last_bin = args.last_bin
 all_chr = args.all_chr
 outfile = args.o[0]
+compress = args.compress[0]
+result_cache = args.result_cache[0]
+result_cache_size = args.result_cache_size[0]
+profile_json = args.profile_json[0]
+profile = args.profile or type(None) != type(profile_json)
 
 if 0 == len(schr) and not all_chr:
 	sys.exit('!!! ERROR !!! Chromosome needed if -A is not used.')
@@ -94,10 +120,18 @@ if step > size:
 
 # RUN ==========================================================================
 
+# Profile stages
+if profile:
+	bd.PROFILER.enable()
+
 if os.path.isfile(chrfile):
 	# Read chromosome length file
-	lengths = pd.read_csv(chrfile, delim, names = ['chr', 'len'])
-	chrlen = lengths[lengths['chr'] == schr]['len']
+	lengths = bd.read_bed(chrfile, sep = delim, columns = ['chr', 'len'])
+	chrlen = lengths[lengths['chr'] == schr]['len'].values
+	if 0 == chrlen.shape[0] and not all_chr:
+		sys.exit('!!! ERROR !!! Chromosome ' + schr + ' not found in ' +
+			chrfile + '.')
+	chrlen = chrlen[:1]
 else:
 	try:
 		# Convert string to chromosome length (integer)
@@ -107,31 +141,28 @@ else:
 		sys.exit('!!! ERROR !!! The provided parameter is neither a file' +
 			' nor an integer (chr length).')
 
-if all_chr:
-	# Bin every chromosome
-	# Prepare empty dataframe list
-	out = []
-
-	# Run per chromosome
-	for schr in lengths['chr']:
-		chrlen = lengths[lengths['chr'] == schr]['len']
-		out.append(bd.bin_chr(schr, chrlen, size, step, last_bin))
-
-	# Concatenate dataframes
-	out = pd.concat(out)
-
-	# Update bin names
-	out['name'] = out['chr'] + '_' + out['name']
-else:
+if not all_chr:
 	# Bin specified chromosome
-	out = bd.bin_chr(schr, chrlen, size, step, last_bin)
-
-# Output
-if False == outfile:
-	for i in range(out.shape[0]):
-		print(delim.join(out.iloc[i, :].astype('str').tolist()))
-else:
-	out.to_csv(outfile, sep = delim, header = False, index = False)
+	lengths = pd.DataFrame({'chr' : [schr], 'len' : [chrlen]})
+
+# Output the cached bins, or generate and output them, one chromosome at a time
+result = bd.ResultCache(result_cache, result_cache_size * 1024 ** 2).result(
+	'gen_bin', [__file__, bd.__file__, sl.__file__] + ([chrfile]
+	if os.path.isfile(chrfile) else []),
+	{'chrlen' : None if os.path.isfile(chrfile) else chrfile,
+	'chr' : None if all_chr else schr, 'binsize' : size, 'binstep' : step,
+	'delim' : delim, 'lastbin' : last_bin, 'allchr' : all_chr})
+if not result.fetch(outfile, compress):
+	with bd.BedWriter(outfile, sep = delim, compress = compress) as out:
+		with result.record(out):
+			for (schr, starts, ends) in bd.iter_bins(lengths, size, step,
+				last_bin):
+				out.write_bins(schr, starts, ends,
+					str(schr) + '_' if all_chr else '')
+
+# Profile report
+if profile:
+	bd.PROFILER.report(profile_json)
 
 # END ==========================================================================
 
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# 
+# Author: Gabriele Girelli
+# Email: gigi.ga90@gmail.com
+# Version: 1.0.0
+# Description: index a sorted bed file for region-restricted reading.
+# 
+# ------------------------------------------------------------------------------
+
+
+
+# DEPENDENCIES =================================================================
+
+import argparse
+import os
+import sys
+
+# Loaded local bed-tools-gg python library
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
+import bed_lib as bd
+
+# PARAMETERS ===================================================================
+
+# Add script description
+parser = argparse.ArgumentParser(description = '''
+Index a coordinate-sorted bed file, plain or bgzip compressed. The index is
+written next to the bed file, with .bli extension. With it, add_rois.py (unless
+-u is used) and bin.py only read the blocks of the bed file that can overlap
+the regions. Bgzip compressed files indexed with tabix (.tbi) are supported as
+well, without this index.
+''')
+
+# Add params
+parser.add_argument('bedfile', type = str, nargs = 1,
+	help = '''Path to bedfile, sorted by chromosome and start
+	(e.g., sort -k1,1 -k2,2n).''')
+
+# Add flags
+parser.add_argument('-b', '--blocksize', metavar = 'KB', type = int,
+	nargs = 1, default = [64],
+	help = 'Kilobytes of rows per indexed block. Default: 64')
+parser.add_argument('--no-header',
+	action = 'store_const', dest = 'header',
+	const = True, default = False,
+	help = 'Bed file has no header. Default: detect it.')
+
+# Parse arguments
+args = parser.parse_args()
+
+# Retrieve arguments
+bedfile = args.bedfile[0]
+block_size = args.blocksize[0] * 1024
+noHeader = args.header
+
+# RUN ==========================================================================
+
+try:
+	bd.write_bed_index(bedfile, block_size, False if noHeader else None)
+except ValueError as e:
+	sys.exit('!!! ERROR !!! ' + str(e))
+
+# END ==========================================================================
+
+################################################################################
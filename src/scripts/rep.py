@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# 
+# Author: Gabriele Girelli
+# Email: gigi.ga90@gmail.com
+# Version: 2.0.0
+# Description: repeat a bedfile row as many times as specified in a column.
+# 
+# ------------------------------------------------------------------------------
+
+
+
+# DEPENDENCIES =================================================================
+
+import argparse
+import os
+import sys
+
+# Loaded local bed-tools-gg python library
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
+import bed_lib as bd
+
+# PARAMETERS ===================================================================
+
+# Add script description
+parser = argparse.ArgumentParser(description = '''
+Repeat a bedfile row as many times as specified in the score column. Following
+the bed format, the score column should be the 5th column. If not, specify the
+index of the column using the -c option. Counts are floored, and rows with
+missing or negative counts are dropped. Rows are expanded in bounded chunks,
+formatting each input row once. The output is in bed format (chr, start, end).
+''')
+
+# Add params
+parser.add_argument('bedfile', type = str, nargs = 1,
+	help = 'Path to bedfile.')
+
+# Add flags
+parser.add_argument('-c', '--column', metavar = 'colID', type = int,
+	nargs = 1, default = [5],
+	help = 'Count column index (1-indexed). Default: 5')
+parser.add_argument('-d', '--delim', metavar = 'del', type = str, nargs = 1,
+	default = ['\t'],
+	help = 'Column delimiter. Used also for output. Default: TAB')
+parser.add_argument('-s', '--chunksize', metavar = 'nrows', type = int,
+	nargs = 1, default = [1000000],
+	help = '''Maximum number of output rows expanded at once. Memory grows
+	with it. Default: 1000000''')
+parser.add_argument('-o', metavar = 'outfile', type = str, nargs = 1,
+	default = [False],
+	help = 'Output file. Output to stdout if not specified.')
+parser.add_argument('-z', '--compress', type = str, nargs = 1,
+	choices = ['gzip', 'bgzip'], default = [None],
+	help = '''Compress output file. Default: gzip if outfile ends in .gz,
+	bgzip if it ends in .bgz, no compression otherwise.''')
+parser.add_argument('--no-header',
+	action = 'store_const', dest = 'header',
+	const = True, default = False,
+	help = 'Bed file has no header. Default: detect it.')
+
+# Parse arguments
+args = parser.parse_args()
+
+# Retrieve arguments
+bedfile = args.bedfile[0]
+colID = args.column[0]
+delim = args.delim[0]
+chunk_rows = args.chunksize[0]
+outfile = args.o[0]
+compress = args.compress[0]
+noHeader = args.header
+
+# Check bedfile
+if not os.path.exists(bedfile):
+	sys.exit('!!! ERROR !!! Invalid bedfile, file not found: ' + bedfile)
+
+# Check column
+if 4 > colID:
+	sys.exit('!!! ERROR !!! Invalid -c option, the count column cannot be' +
+		' chr, start or end: ' + str(colID))
+
+# Name the count column
+columns = bd.BED_COLUMNS + ['col' + str(i + 1)
+	for i in range(len(bd.BED_COLUMNS), colID)]
+column = columns[colID - 1]
+
+# Check that the count column exists, in text files (pipes are read only once)
+if os.path.isfile(bedfile):
+	ncols = bd.bed_layout(bedfile, False if noHeader else None, delim)[1]
+	if colID > ncols:
+		sys.exit('!!! ERROR !!! Invalid -c option, bedfile has ' +
+			str(ncols) + ' columns.')
+
+# RUN ==========================================================================
+
+with bd.BedWriter(outfile, delim, compress) as out:
+	for bed in bd.read_bed(bedfile, False if noHeader else None, delim,
+		columns[:colID], chunksize = bd.BedWriter.CHUNK_SIZE):
+		counts = bd.repeat_counts(bed[column])
+		table = bed.loc[:, ['chr', 'start', 'end']]
+		for (first, last, repeats) in bd.iter_expand_chunks(counts, chunk_rows):
+			out.write_repeated(table.iloc[first:last], repeats)
+
+# END ==========================================================================
+
+################################################################################
@@ -0,0 +1,210 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# 
+# Author: Gabriele Girelli
+# Email: gigi.ga90@gmail.com
+# Version: 1.0.0
+# Description: request region assignments from roi_server.py.
+# 
+# ------------------------------------------------------------------------------
+
+
+
+# DEPENDENCIES =================================================================
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+# Loaded local bed-tools-gg python library (standard library only)
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
+import socket_lib as sl
+
+# PARAMETERS ===================================================================
+
+# Add script description
+parser = argparse.ArgumentParser(description = '''
+Request region assignments from a running roi_server.py, with the arguments of
+add_rois.py and bin.py. Instead of a regfile, give the name of a ROI set
+preloaded by the server. Bedfiles are read by the server, unless --send is
+used or the bedfile is -, for stdin: then bed records are sent through the
+socket. Output is only written once the request succeeds, stdout included.
+''')
+
+# Add flags
+parser.add_argument('-S', '--socket', metavar = 'path', type = str, nargs = 1,
+	default = [os.environ.get('ROI_SERVER_SOCKET')],
+	help = '''Path of the server Unix socket. Default: the ROI_SERVER_SOCKET
+	environment variable.''')
+
+# Add requests
+requests = parser.add_subparsers(dest = 'op', metavar = 'request',
+	help = 'One of: add_rois, bin, list, ping.')
+requests.required = True
+
+add_rois = requests.add_parser('add_rois',
+	help = 'Assign rows of a bedfile to ROIs, as add_rois.py.')
+add_rois.add_argument('rois', type = str, nargs = 1,
+	help = 'Name of a ROI set of the server.')
+add_rois.add_argument('bedfile', type = str, nargs = 1,
+	help = 'Path to bedfile, containing rows to be assigned.')
+add_rois.add_argument('-u',
+	action = 'store_const', const = True, default = False,
+	help = 'Keep bedfile rows that do not match any region.')
+add_rois.add_argument('-s', '--chunksize', metavar = 'nrows', type = int,
+	nargs = 1, default = [0],
+	help = '''Stream the bedfile in chunks of nrows rows on the server.
+	Default: load the whole bedfile.''')
+add_rois.add_argument('-N', '--usename',
+	action = 'store_const', dest = 'use_name',
+	const = True, default = False,
+	help = 'Use ROI name instead of ROI coordinates.')
+
+bin_parser = requests.add_parser('bin',
+	help = 'Collapse bedfiles to ROIs, as bin.py.')
+bin_parser.add_argument('rois', type = str, nargs = 1,
+	help = 'Name of a ROI set of the server.')
+bin_parser.add_argument('bedfile', type = str, nargs = '+',
+	help = '''Path to bedfile(s), containing rows to be assigned. With more
+	than one bedfile, output one score column per bedfile, in the same
+	order.''')
+bin_parser.add_argument('-c', '--collapse', type = str, nargs = 1,
+	choices = list(sl.COLLAPSE_METHODS),
+	default = ['sum'], help = 'Collapse method. Default: sum')
+bin_parser.add_argument('--float',
+	action = 'store_const', dest = 'f',
+	const = True, default = False,
+	help = 'Value column as floats.')
+bin_parser.add_argument('--no-header',
+	action = 'store_const', dest = 'header',
+	const = True, default = False,
+	help = 'Bed file has no header. Default: detect it.')
+
+# Shared by add_rois and bin
+for sub in (add_rois, bin_parser):
+	sub.add_argument('-m',
+		action = 'store_const', const = True, default = False,
+		help = 'Assign to bedfile rows that partially match a region.')
+	sub.add_argument('-l',
+		action = 'store_const', const = True, default = False,
+		help = 'Assign to bedfile rows that include a region.')
+	sub.add_argument('-o', metavar = 'outfile', type = str, nargs = 1,
+		default = [False],
+		help = 'Output file. Output to stdout if not specified.')
+	sub.add_argument('-z', '--compress', type = str, nargs = 1,
+		choices = ['gzip', 'bgzip'], default = [None],
+		help = '''Compress output file. Default: gzip if outfile ends in .gz,
+		bgzip if it ends in .bgz, no compression otherwise.''')
+	sub.add_argument('-p', '--threads', metavar = 'nthreads', type = int,
+		nargs = 1, default = [1],
+		help = 'Number of processes on the server. Default: 1')
+	sub.add_argument('--send',
+		action = 'store_const', const = True, default = False,
+		help = '''Send the bed records through the socket, for bedfiles the
+		server cannot read.''')
+
+list_parser = requests.add_parser('list',
+	help = 'List the ROI sets of the server.')
+ping_parser = requests.add_parser('ping',
+	help = 'Check that the server is running.')
+
+# Shared by every request
+for sub in (add_rois, bin_parser, list_parser, ping_parser):
+	sub.add_argument('--latency',
+		action = 'store_const', const = True, default = False,
+		help = 'Print the request round trip and server time to stderr.')
+
+# Parse arguments
+args = parser.parse_args()
+
+# Retrieve arguments
+socket_path = args.socket[0]
+op = args.op
+latency = args.latency
+
+# Check socket
+if type(None) == type(socket_path):
+	sys.exit('!!! ERROR !!! Missing server socket, use -S or set' +
+		' ROI_SERVER_SOCKET.')
+
+# Build request
+req = {'op' : op}
+payloads = []
+outfile = False
+if op in ('add_rois', 'bin'):
+	outfile = args.o[0]
+	compress = args.compress[0]
+	if type(None) == type(compress) and outfile:
+		if outfile.endswith('.gz'):
+			compress = 'gzip'
+		elif outfile.endswith('.bgz'):
+			compress = 'bgzip'
+	if type(None) != type(compress) and not outfile:
+		sys.exit('!!! ERROR !!! Compression is available only with a file.')
+
+	req.update({'rois' : args.rois[0], 'm' : args.m, 'l' : args.l,
+		'compress' : compress, 'threads' : max(1, args.threads[0]),
+		'bedfiles' : []})
+	if 'add_rois' == op:
+		req.update({'u' : args.u, 'use_name' : args.use_name,
+			'chunksize' : args.chunksize[0]})
+	else:
+		req.update({'collapse' : args.collapse[0], 'float' : args.f,
+			'no_header' : args.header})
+
+	# Bedfiles by path, or sent inline as null
+	for bedfile in args.bedfile:
+		if '-' == bedfile:
+			payloads.append(sys.stdin.buffer.read())
+			req['bedfiles'].append(None)
+		elif not os.path.exists(bedfile):
+			sys.exit('!!! ERROR !!! Invalid bedfile, file not found: ' +
+				bedfile)
+		elif args.send:
+			with open(bedfile, 'rb') as f:
+				payloads.append(f.read())
+			req['bedfiles'].append(None)
+		else:
+			req['bedfiles'].append(os.path.abspath(bedfile))
+
+# Output kept in memory (or a temporary file) before stdout
+STDOUT_BUFFER_SIZE = 64 * 1024 ** 2
+
+# RUN ==========================================================================
+
+# Buffer stdout output until the request succeeds, never output a partial table
+if outfile:
+	out = open(outfile, 'wb')
+else:
+	out = tempfile.SpooledTemporaryFile(max_size = STDOUT_BUFFER_SIZE)
+try:
+	status = sl.request(socket_path, req, payloads, out)
+	if status['ok'] and not outfile:
+		out.seek(0)
+		shutil.copyfileobj(out, sys.stdout.buffer)
+		sys.stdout.buffer.flush()
+except (OSError, EOFError) as e:
+	status = {'ok' : False, 'error' : 'Cannot reach the server: ' + str(e)}
+finally:
+	out.close()
+
+if latency and 'client_s' in status:
+	sys.stderr.write(' · Round trip %.3f s, server %.3f s\n' % (
+		status['client_s'], status.get('server_s', float('nan'))))
+
+if not status['ok']:
+	if outfile and os.path.isfile(outfile):
+		os.remove(outfile)
+	sys.exit('!!! ERROR !!! ' + status['error'])
+
+if 'list' == op:
+	for (name, nrois) in sorted(status['rois'].items()):
+		print(name + '\t' + str(nrois))
+
+# END ==========================================================================
+
+################################################################################
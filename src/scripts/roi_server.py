@@ -0,0 +1,243 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# ------------------------------------------------------------------------------
+# 
+# Author: Gabriele Girelli
+# Email: gigi.ga90@gmail.com
+# Version: 1.0.0
+# Description: serve region assignments from preloaded ROIs.
+# 
+# ------------------------------------------------------------------------------
+
+
+
+# DEPENDENCIES =================================================================
+
+import argparse
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+import traceback
+
+# Loaded local bed-tools-gg python library
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
+import bed_lib as bd
+import socket_lib as sl
+
+# PARAMETERS ===================================================================
+
+# Add script description
+parser = argparse.ArgumentParser(description = '''
+Serve region assignments from a local Unix socket. Named sets of regions of
+interest (ROIs) are read and indexed once, at start. Then, roi_client.py
+requests assign rows of a bedfile (as add_rois.py) or collapse bedfiles (as
+bin.py) to a ROI set, without paying for imports and ROI preparation. Every
+request runs in its own forked process, sharing the preloaded ROIs, and its
+latency is logged to stderr. Stop the server with SIGINT or SIGTERM.
+''')
+
+# Add params
+parser.add_argument('socket', type = str, nargs = 1,
+	help = 'Path of the Unix socket to listen on.')
+parser.add_argument('rois', metavar = 'name=regfile', type = str, nargs = '+',
+	help = '''ROI sets to preload, as name=path to bedfile containing regions
+	to be assigned to.''')
+
+# Add flags
+parser.add_argument('-p', '--max-requests', metavar = 'n', type = int,
+	nargs = 1, default = [os.cpu_count() or 1],
+	help = '''Maximum number of requests run at the same time, others wait.
+	Default: number of CPUs''')
+parser.add_argument('--index-cache', metavar = 'dir', type = str, nargs = 1,
+	default = [None],
+	help = '''Directory of cached region indexes. The index of every regfile is
+	loaded from it, or built and saved there for later runs.''')
+parser.add_argument('--index-cache-size', metavar = 'MB', type = int,
+	nargs = 1, default = [1024],
+	help = '''Size cap of the index cache, least recently used indexes are
+	removed above it. Default: 1024''')
+
+# Parse arguments
+args = parser.parse_args()
+
+# Retrieve arguments
+socket_path = args.socket[0]
+roi_specs = args.rois
+max_requests = max(1, args.max_requests[0])
+index_cache = args.index_cache[0]
+index_cache_size = args.index_cache_size[0]
+
+# Check ROI sets
+roi_files = {}
+for spec in roi_specs:
+	if not '=' in spec:
+		sys.exit('!!! ERROR !!! Invalid ROI set, expected name=regfile: ' +
+			spec)
+	name, regfile = spec.split('=', 1)
+	if not os.path.exists(regfile):
+		sys.exit('!!! ERROR !!! Invalid regfile, file not found: ' + regfile)
+	roi_files[name] = regfile
+
+# Check socket
+if os.path.exists(socket_path):
+	probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		probe.connect(socket_path)
+		sys.exit('!!! ERROR !!! A server is already listening on: ' +
+			socket_path)
+	except (ConnectionRefusedError, FileNotFoundError):
+		os.remove(socket_path)
+	finally:
+		probe.close()
+
+# FUNCTIONS ====================================================================
+
+def log(message):
+	'''Log a message to stderr.'''
+	sys.stderr.write(time.strftime('%Y-%m-%d %H:%M:%S') + ' ' + message + '\n')
+	sys.stderr.flush()
+
+def payload_file(payload):
+	'''Write inline bed records to a temporary file, return its path.'''
+	fd, path = tempfile.mkstemp(prefix = 'roi_server_',
+		suffix = '.bed.gz' if payload.startswith(b'\x1f\x8b') else '.bed')
+	with os.fdopen(fd, 'wb') as f:
+		f.write(payload)
+	return(path)
+
+def run_add_rois(req, roiset, out):
+	'''Assign bed rows to ROIs, as add_rois.py. Return the number of rows.'''
+	rois, index = roiset
+	chunksize = req.get('chunksize', 0)
+	bed = bd.read_bed(req['bedfiles'][0],
+		chunksize = chunksize if 0 < chunksize else None,
+		regions = None if req.get('u', False) else rois)
+	if 0 >= chunksize:
+		bed = [bed]
+
+	nrows = 0
+	for chunk in bd.iter_assign_to_rois(rois, bed, req.get('u', False),
+		req.get('m', False), req.get('l', False), req.get('use_name', False),
+		threads = req.get('threads', 1), index = index):
+		out.write(chunk)
+		nrows += chunk.shape[0]
+	return(nrows)
+
+def run_bin(req, roiset, out):
+	'''Collapse bedfiles to ROIs, as bin.py. Return the number of rows.'''
+	rois, index = roiset
+	table = bd.collapse_samples(rois, req['bedfiles'],
+		req.get('m', False), req.get('l', False), req.get('collapse', 'sum'),
+		floatValues = req.get('float', False),
+		threads = req.get('threads', 1),
+		skip_header = False if req.get('no_header', False) else None,
+		index = index)
+	out.write(table)
+	return(table.shape[0])
+
+# Request operations, by name
+OPS = {'add_rois' : run_add_rois, 'bin' : run_bin}
+
+class RequestHandler(socketserver.BaseRequestHandler):
+	'''Run a request, streaming its output back as data frames.'''
+
+	def handle(self):
+		start_time = time.perf_counter()
+		status = {'ok' : True}
+		tmp_paths = []
+		op = None
+		name = ''
+		try:
+			req = sl.recv_json(self.request)
+			op = req.get('op')
+			name = str(req.get('rois', ''))
+			if 'list' == op:
+				status['rois'] = dict((key, int(roiset[0].shape[0]))
+					for (key, roiset) in roisets.items())
+			elif 'ping' == op:
+				pass
+			elif not op in OPS:
+				raise ValueError('Unknown request: ' + str(op))
+			elif not req.get('rois') in roisets:
+				raise ValueError('Unknown ROI set: ' + str(req.get('rois')))
+			else:
+				# Inline bed records replace null bedfiles, in order
+				req['bedfiles'] = list(req.get('bedfiles', []))
+				for i in range(len(req['bedfiles'])):
+					if type(None) == type(req['bedfiles'][i]):
+						tmp_paths.append(payload_file(
+							sl.recv_frame(self.request)))
+						req['bedfiles'][i] = tmp_paths[-1]
+
+				writer = sl.FrameWriter(self.request)
+				with bd.BedWriter(writer,
+					compress = req.get('compress')) as out:
+					status['rows'] = OPS[op](req, roisets[req['rois']], out)
+				writer.flush()
+		except Exception as e:
+			status = {'ok' : False, 'error' : str(e) if str(e)
+				else type(e).__name__}
+			traceback.print_exc()
+		finally:
+			for path in tmp_paths:
+				os.remove(path)
+
+		status['server_s'] = time.perf_counter() - start_time
+		try:
+			sl.send_frame(self.request, b'')
+			sl.send_json(self.request, status)
+		except OSError:
+			status = {'ok' : False, 'error' : 'client disconnected',
+				'server_s' : status['server_s']}
+		log(' >>> ' + str(op) + ' ' + name + ': ' +
+			(str(status.get('rows', 0)) + ' rows' if status['ok']
+			else 'FAILED, ' + status['error']) +
+			', %.3f s' % status['server_s'])
+
+class RoiServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+	'''Unix socket server, forking a process per request.'''
+	max_children = max_requests
+
+# RUN ==========================================================================
+
+# Preload and index ROI sets
+roisets = {}
+for (name, regfile) in roi_files.items():
+	log(' · Loading ROI set ' + name + ': ' + regfile)
+	rois = bd.read_bed(regfile)
+	if type(None) != type(index_cache):
+		index = bd.cached_roi_index(rois, regfile, index_cache, None,
+			index_cache_size * 1024 ** 2)
+	else:
+		index = bd.RoiIndex(rois)
+	for use_name in (False, True):
+		index.labels(use_name)
+	roisets[name] = (rois, index)
+
+# Only the current user can connect
+old_umask = os.umask(0o077)
+server = RoiServer(socket_path, RequestHandler)
+os.umask(old_umask)
+
+def stop(signum, frame):
+	raise KeyboardInterrupt
+signal.signal(signal.SIGTERM, stop)
+
+log(' · Listening on ' + socket_path)
+try:
+	server.serve_forever()
+except KeyboardInterrupt:
+	log(' · Stopping')
+finally:
+	server.server_close()
+	if os.path.exists(socket_path):
+		os.remove(socket_path)
+
+# END ==========================================================================
+
+################################################################################
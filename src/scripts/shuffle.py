@@ -6,7 +6,7 @@
 # Author: Gabriele Girelli
 # Email: gigi.ga90@gmail.com
 # Version: 1.0.1
-# Description: Shuffle a certain percentage of reads in a bed file.
+# Description: Shuffle a certain percentage of reads in bed files.
 # 
 # ------------------------------------------------------------------------------
 
@@ -21,6 +21,11 @@ import pandas as pd
 import pickle
 import sys
 
+# Loaded local bed-tools-gg python library
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../lib/')
+import bed_lib as bd
+
+# Change pandas default options
 pd.options.mode.chained_assignment = None  # default='warn'
 
 # INPUT ========================================================================
@@ -33,95 +38,184 @@ parser = argparse.ArgumentParser(
 # Add params
 parser.add_argument('seed', type = int, nargs = 1,
 	help = 'Seed for random number generation.')
-parser.add_argument('bedfile', type = str, nargs = 1,
-	help = 'Path to bedfile.')
+parser.add_argument('bedfile', type = str, nargs = '+',
+	help = 'Path to bedfile(s).')
 
 # Add flags
 parser.add_argument('-k',
 	action = 'store_const', const = True, default = False,
-	help = 'Reload previous seed state. Use on subsequent runs.')
+	help = '''Reload previous seed state. Kept for compatibility: with --legacy,
+	the seed state saved in outDir by a previous run is always reloaded, as in
+	version 1.0. Otherwise, every file and iteration has its own random
+	stream.''')
 parser.add_argument('-n', metavar = 'nIter', type = int, nargs = 1,
 	default = [100], help = 'Number of iterations.')
 parser.add_argument('-p', metavar = 'perc', type = int, nargs = 1,
 	default = [10], help = 'Percentage of reads to shuffle.')
 parser.add_argument('-o', metavar = 'outDir', type = str, nargs = 1,
 	default = ['./shuffled/'], help = 'Output directory.')
+parser.add_argument('-t', '--threads', metavar = 'nthreads', type = int,
+	nargs = 1, default = [1],
+	help = '''Number of processes, files and iterations are run in parallel.
+	Not used with --legacy. Default: 1''')
+parser.add_argument('--summary',
+	action = 'store_const', const = True, default = False,
+	help = '''Write a single summary file per bedfile, with per-row mean, sd,
+	min, max, optional quantiles, and empirical p-values of the observed
+	score, instead of a bedfile per iteration.''')
+parser.add_argument('-q', '--quantiles', metavar = 'q', type = float,
+	nargs = '+', default = [],
+	help = 'Quantiles to add to the summary. E.g., 0.05 0.5 0.95')
+parser.add_argument('--sketch', metavar = 'size', type = int, nargs = 1,
+	default = [100],
+	help = '''Values kept per row to estimate quantiles, exact if not lower
+	than nIter. Memory grows as rows x size. Default: 100''')
+parser.add_argument('--matrix',
+	action = 'store_const', const = True, default = False,
+	help = '''Write every iteration as a column of a single binary matrix per
+	bedfile (.npy, rows x nIter), instead of a bedfile per iteration.''')
+parser.add_argument('--legacy',
+	action = 'store_const', const = True, default = False,
+	help = '''Shuffle one read at a time, as in version 1.0, to reproduce
+	results of previous runs with the same seed. Memory grows with the number
+	of reads.''')
+parser.add_argument('--profile',
+	action = 'store_const', const = True, default = False,
+	help = '''Profile the run: print time, rows and memory of every stage to
+	stderr.''')
+parser.add_argument('--profile-json', metavar = 'path', type = str, nargs = 1,
+	default = [None],
+	help = 'Also write the profile as a JSON report. Implies --profile.')
 
 # Parse arguments
 args = parser.parse_args()
 
 # Retrieve arguments
 seed = args.seed[0]
-bedfile = args.bedfile[0]
+bedfiles = args.bedfile
 nIter = args.n[0]
 perc = args.p[0]
 outDir = args.o[0]
 keepSeed = args.k
+threads = max(1, args.threads[0])
+legacy = args.legacy
+summary = args.summary
+quantiles = args.quantiles
+sketch_size = args.sketch[0]
+matrix = args.matrix
+profile_json = args.profile_json[0]
+profile = args.profile or type(None) != type(profile_json)
 
 # Output file name prefix
-outName = '.'.join(bedfile.split('/')[-1].split('.')[:-1])
+outNames = ['.'.join(bedfile.rstrip('/').split('/')[-1].split('.')[:-1])
+	for bedfile in bedfiles]
 
 # Make output directory if missing
 if not os.path.isdir(outDir):
 	os.makedirs(outDir)
 
+# FUNCTIONS ====================================================================
+
+def output_prefix(filei):
+	'''Output path prefix of a bedfile.'''
+	return(outDir + outNames[filei] + '.' + str(perc) + 'perc')
+
+def write_iteration(bf, counts, filei, iteri):
+	'''Write shuffled counts of an iteration.'''
+	if summary:
+		with bd.PROFILER.stage('summary', len(counts)):
+			summaries[filei].update(counts)
+	if matrix:
+		matrices[filei][:, iteri] = counts
+	if not summary and not matrix:
+		shuffled = bf.copy()
+		shuffled['score'] = counts
+		bd.write_bed(shuffled, outDir + outNames[filei] + '.iter' +
+			str(iteri + 1) + '.' + str(perc) + 'perc.bed')
+
 # RUN ==========================================================================
 
-# Log info
-print(' · Shuffling x'+str(nIter)+' '+str(perc)+'% of '+bedfile)
+# Profile stages
+if profile:
+	bd.PROFILER.enable()
 
-# Set seed
-seed = np.random.RandomState(seed)
+# Read bedfiles ----------------------------------------------------------------
 
-# Load seed if available
-fname = outDir + '/.seed_state.pickle'
-if os.path.isfile(fname):
-	f = open(fname, 'r')
-	seed.set_state(pickle.load(f))
-	f.close()
+bfs = []
+toShuffle = []
+for bedfile in bedfiles:
+	# Log info
+	print(' · Shuffling x'+str(nIter)+' '+str(perc)+'% of '+bedfile)
+
+	bf = bd.read_bed(bedfile)
 
-# Read bedfile -----------------------------------------------------------------
+	# Count reads
+	nreads = int(sum(bf['score']))
+	toShuffle.append(int(nreads * perc / 100))
+	print(' >>> Found ' + str(nreads) + ' reads.')
 
-bf = pd.read_csv(bedfile, '\t', skiprows = [0],
-	names = ['chr', 'start', 'end', 'name', 'score'])
+	bfs.append(bf)
+
+# Prepare summaries and matrices
+summaries = [bd.NullSummary(bf['score'], quantiles, sketch_size,
+	np.random.default_rng([seed, filei])) if summary else None
+	for (filei, bf) in enumerate(bfs)]
+matrices = [np.lib.format.open_memmap(output_prefix(filei) + '.npy',
+	mode = 'w+', dtype = bd.coord_dtype(2 * max(bf['score'].sum(), 1)),
+	shape = (bf.shape[0], nIter)) if matrix else None
+	for (filei, bf) in enumerate(bfs)]
 
 # Shuffle ----------------------------------------------------------------------
 
-# Count reads
-nreads = sum(bf['score'])
-toShuffle = nreads * perc / 100
-
-print(' >>> Found ' + str(nreads) + ' reads.')
-
-print(' >>> Pre-shuffling...')
-preshuffle = np.repeat(np.arange(len(bf['score'])), bf['score'])
-
-for i in range(nIter):
-	print(' >>># Iteration #' + str(i+1))
-	print(' >>># Shuffle...')
-	pos_from = seed.randint(0, len(preshuffle), toShuffle)
-	pos_to = seed.randint(0, len(bf['score']), toShuffle)
-
-	print(' >>># Moving reads...')
-	shuffled = np.array(preshuffle)
-	shuffled[pos_from] = pos_to
-
-	print(' >>># Counting shuffled reads')
-	counts = np.unique(shuffled, return_counts = True)
-	shuffled = bf.copy()
-	shuffled['score'] = np.zeros(shuffled['score'].shape)
-	shuffled['score'][counts[0]] = counts[1]
-	shuffled['score'] = shuffled['score'].astype('int')
-
-	# Output
-	shuffled.to_csv(outDir+outName+'.iter'+str(i+1)+'.'+str(perc)+'perc.bed',
-		sep = '\t', header = False, index = False)
-
-# Saving seed state
-seed_state = seed.get_state()
-f = open(outDir + '/.seed_state.pickle', 'w+')
-pickle.dump(seed_state, f)
-f.close()
+if legacy:
+	# Set seed
+	seed = np.random.RandomState(seed)
+
+	# Load seed if available, whatever -k (as in version 1.0)
+	fname = outDir + '/.seed_state.pickle'
+	if os.path.isfile(fname):
+		f = open(fname, 'rb')
+		seed.set_state(pickle.load(f))
+		f.close()
+
+	# Shuffle one file at a time, sharing the random stream
+	for filei in range(len(bfs)):
+		bf = bfs[filei]
+		print(' >>> Pre-shuffling ' + bedfiles[filei] + '...')
+		preshuffle = np.repeat(np.arange(len(bf['score'])), bf['score'])
+
+		for i in range(nIter):
+			print(' >>># Iteration #' + str(i+1))
+			with bd.PROFILER.stage('shuffle', toShuffle[filei]):
+				counts = bd.shuffle_reads(preshuffle, len(bf['score']),
+					toShuffle[filei], seed)
+			write_iteration(bf, counts, filei, i)
+
+	# Saving seed state
+	seed_state = seed.get_state()
+	f = open(outDir + '/.seed_state.pickle', 'wb')
+	pickle.dump(seed_state, f)
+	f.close()
+else:
+	# Shuffle every file and iteration, with independent random streams
+	for (filei, i, counts) in bd.iter_shuffle_counts(
+		[np.asarray(bf['score']) for bf in bfs], toShuffle,
+		nIter, seed, threads):
+		print(' >>># ' + bedfiles[filei] + ' iteration #' + str(i+1))
+		write_iteration(bfs[filei], counts, filei, i)
+
+# Output -----------------------------------------------------------------------
+
+for filei in range(len(bfs)):
+	if summary:
+		bd.write_bed(bd.null_summary_table(bfs[filei], summaries[filei]),
+			output_prefix(filei) + '.summary.bed', header = True)
+	if matrix:
+		matrices[filei].flush()
+
+# Profile report
+if profile:
+	bd.PROFILER.report(profile_json)
 
 # END --------------------------------------------------------------------------
 
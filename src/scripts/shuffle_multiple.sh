@@ -24,7 +24,8 @@ IFS=', ' read -r -a array <<< "$string"
 
 # Help string
 helps="
- usage: ./beds_shuffle.sh [-h][-n nIter][-p perc][-o outDir] -s seed [BEDFILE]...
+ usage: ./beds_shuffle.sh [-h][-n nIter][-p perc][-o outDir][-t threads]
+                          -s seed [BEDFILE]...
 
  Description:
   Shuffle a certain percentage of reads in the given bed files.
@@ -38,15 +39,17 @@ helps="
   -n nIter	Number of iterations. Default: 100
   -p perc	Percentage of reads to shuffle. Default: 10
   -o outDir	Output directory. Default: ./shuffled/
+  -t threads	Number of processes. Default: 1
 "
 
 # Default values
 nIter=100
 perc=10
 outDir='./shuffled/'
+threads=1
 
 # Parse options
-while getopts hn:p:o:s: opt "${bedfiles[@]}"; do
+while getopts hn:p:o:t:s: opt "${bedfiles[@]}"; do
 	case $opt in
 		h)
 			echo -e "$helps\n"
@@ -65,6 +68,11 @@ while getopts hn:p:o:s: opt "${bedfiles[@]}"; do
 		o)
 			outDir=$OPTARG
 		;;
+		t)
+			if [ 1 -le $OPTARG ]; then
+				threads=$OPTARG
+			fi
+		;;
 		s)
 			seed=$OPTARG
 		;;
@@ -105,15 +113,10 @@ if [ ! -d $outDir ]; then
 	mkdir -p $outDir
 fi
 
-# Run single-reshuffling script
-for bfi in $(seq 0 `bc <<< "${#bedfiles[@]}-1"`); do
-	bf=${bedfiles[$bfi]}
-	if [ 0 -eq $bfi ]; then
-		./bed_shuffle.py $seed $bf -n $nIter -p $perc -o $outDir
-	else
-		./bed_shuffle.py $seed $bf -n $nIter -p $perc -o $outDir -k
-	fi
-done
+# Run shuffling script on every file at once, each file and iteration has its
+# own random stream derived from the seed
+`dirname $0`/shuffle.py $seed ${bedfiles[@]} -n $nIter -p $perc -o $outDir \
+	-t $threads
 
 if [ -e $outDir"/.Random.seed.RData" ]; then
 	rm $outDir"/.Random.seed.RData"
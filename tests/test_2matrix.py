@@ -0,0 +1,56 @@
+#
+#
+# 2matrix.py in memory and sorted (-s) modes, by location and by name.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+	'..', 'src', 'scripts')
+
+def run(script, *args):
+	'''Run a script, return its stdout.'''
+	out = subprocess.run([sys.executable, os.path.join(SCRIPTS, script)] +
+		[str(a) for a in args], check = True, capture_output = True, text = True)
+	return(out.stdout)
+
+def write_bed(path, rows):
+	with open(path, 'w') as f:
+		for row in rows:
+			f.write('\t'.join(str(x) for x in row) + '\n')
+	return(str(path))
+
+# Integer and float scores, numeric and chr names, shared and private rows
+ROWS = [
+	[('chr2', 10, 20, 'a', 1.5), ('chr10', 5, 9, 'b', 2), ('chr1', 1, 3, 'c', 3.0),
+		('chr10', 1, 2, 'd', 0.1)],
+	[('chr10', 5, 9, 'b', 5), ('chrX', 1, 2, 'e', 1), (2, 1, 2, 'f', 7)],
+	[('chr1', 1, 3, 'c', 1e-7), (1, 4, 8, 'g', 123456789.25),
+		('chr2', 30, 40, 'h', 0.17700573594056856)]]
+
+def write_sorted(tmp_path, key):
+	return([write_bed(tmp_path / ('%d.bed' % i), sorted(rows, key = key))
+		for i, rows in enumerate(ROWS)])
+
+def test_location_modes_match(tmp_path):
+	beds = write_sorted(tmp_path, lambda r: (str(r[0]), r[1], r[2]))
+	expected = run('2matrix.py', '--no-header', *beds)
+	assert expected == run('2matrix.py', '--no-header', '-s', *beds)
+	assert [
+		'1\t4\t8\tg\t0\t0\t123456789.25',
+		'2\t1\t2\tf\t0\t7\t0',
+		'chr1\t1\t3\tc\t3\t0\t1e-07',
+		'chr10\t1\t2\td\t0.1\t0\t0',
+		'chr10\t5\t9\tb\t2\t5\t0',
+		'chr2\t10\t20\ta\t1.5\t0\t0',
+		'chr2\t30\t40\th\t0\t0\t0.17700573594056856',
+		'chrX\t1\t2\te\t0\t1\t0'] == expected.splitlines()
+
+def test_name_modes_match(tmp_path):
+	beds = write_sorted(tmp_path, lambda r: r[3])
+	expected = run('2matrix.py', '--no-header', '-n', *beds)
+	assert expected == run('2matrix.py', '--no-header', '-n', '-s', *beds)
+	assert list('abcdefgh') == [l.split('\t')[3] for l in expected.splitlines()]
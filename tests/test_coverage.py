@@ -0,0 +1,68 @@
+#
+#
+# Coverage collapse (-c coverage, covmean) of bin.py, against values computed
+# by hand on closed intervals [start, end].
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+	'..', 'src', 'scripts')
+
+def run(script, *args):
+	'''Run a script, return its stdout lines.'''
+	out = subprocess.run([sys.executable, os.path.join(SCRIPTS, script)] +
+		[str(a) for a in args], check = True, capture_output = True, text = True)
+	return(out.stdout.splitlines())
+
+def write_bed(path, rows):
+	with open(path, 'w') as f:
+		for row in rows:
+			f.write('\t'.join(str(x) for x in row) + '\n')
+	return(str(path))
+
+@pytest.fixture
+def beds(tmp_path):
+	'''ROIs of 100, 100, 10, 10 and 50 bp, the last on a chromosome without
+	reads and with its own score. Reads with integer scores, and with NaN.'''
+	rois = write_bed(tmp_path / 'rois.bed', [('chr1', 0, 99, 'r1', 0),
+		('chr1', 100, 199, 'r2', 0), ('chr1', 1000, 1009, 'r3', 0),
+		('chr2', 0, 9, 'r4', 0), ('chr3', 0, 49, 'r5', 7)])
+	ints = write_bed(tmp_path / 'ints.bed', [
+		# 10 bp in r1 and 10 bp in r2
+		('chr1', 90, 109, 'x', 2),
+		# A single bp, then the last bp of r2
+		('chr1', 150, 150, 'x', 3), ('chr1', 199, 250, 'x', 4),
+		# Next to no ROI of chr2
+		('chr2', 500, 600, 'x', 9)])
+	nans = write_bed(tmp_path / 'nans.bed', [('chr1', 0, 9, 'x', 'nan'),
+		('chr1', 10, 19, 'x', 0.5), ('chr1', 180, 189, 'x', 'NaN')])
+	return({'rois' : rois, 'ints' : ints, 'nans' : nans})
+
+def scores(lines):
+	'''ROI name -> scores.'''
+	return(dict((line.split('\t')[3], [float(x) for x in line.split('\t')[4:]])
+		for line in lines))
+
+def test_coverage(beds):
+	expected = {'r1' : [2 * 10, .5 * 10], 'r2' : [2 * 10 + 3 + 4, 0],
+		'r3' : [0, 0], 'r4' : [0, 0], 'r5' : [7, 7]}
+	assert expected == scores(run('bin.py', '--float', '-c', 'coverage',
+		beds['rois'], beds['ints'], beds['nans']))
+	assert expected == scores(run('bin.py', '-c', 'coverage',
+		beds['rois'], beds['ints'], beds['nans']))
+
+def test_covmean(beds):
+	expected = {'r1' : [20 / 100., 5 / 100.], 'r2' : [27 / 100., 0],
+		'r3' : [0, 0], 'r4' : [0, 0], 'r5' : [7, 7]}
+	assert expected == scores(run('bin.py', '--float', '-c', 'covmean',
+		beds['rois'], beds['ints'], beds['nans']))
+
+	# Parallel over chromosomes, and from a bed cache
+	run('bed2cache.py', beds['ints'], '-o', beds['ints'] + 'c')
+	for args in (['-p', 2, beds['ints']], [beds['ints'] + 'c']):
+		assert dict((k, v[:1]) for (k, v) in expected.items()) == scores(run(
+			'bin.py', '--float', '-c', 'covmean', beds['rois'], *args))
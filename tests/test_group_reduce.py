@@ -0,0 +1,43 @@
+#
+#
+# group_reduce against the per-ROI numpy reductions of version 1.0.
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+	'..', 'src', 'lib'))
+import bed_lib as bd
+
+# Per-ROI collapse of version 1.0, on the rows of a ROI in bed order
+BASELINE = {'min' : np.min, 'mean' : np.mean, 'median' : np.median,
+	'max' : np.max, 'count' : len, 'sum' : np.sum}
+
+@pytest.mark.parametrize('method', sorted(BASELINE.keys()))
+def test_group_reduce_matches_baseline(method):
+	rng = np.random.default_rng(42)
+	sizes = list(range(1, 200)) + [511, 1031, 8193]
+	values = rng.random(sum(sizes)) * rng.choice([1, 1e-3, 1e6], sum(sizes))
+	groups = rng.permutation(np.repeat(np.arange(len(sizes)), sizes))
+
+	# One more group, empty
+	out = bd.group_reduce(values, groups, len(sizes) + 1, method)
+	for gi in range(len(sizes)):
+		# Exact, so that the int cast of bin.py cannot change either
+		assert BASELINE[method](values[groups == gi]) == out[gi]
+	if method in ('count', 'sum'):
+		assert 0 == out[-1]
+	else:
+		assert np.isnan(out[-1])
+
+def test_pairwise_sums_match_np_sum():
+	rng = np.random.default_rng(7)
+	lengths = np.array([1, 7, 8, 9, 127, 128, 129, 255, 256, 1000, 65537])
+	values = rng.standard_normal(lengths.sum()) * 1e3
+	starts = np.cumsum(lengths) - lengths
+	sums = bd.pairwise_sums(values, starts, lengths)
+	for i in range(lengths.shape[0]):
+		assert np.sum(values[starts[i]:(starts[i] + lengths[i])]) == sums[i]
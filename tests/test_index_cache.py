@@ -0,0 +1,72 @@
+#
+#
+# On-disk cache of region indexes: keys and size cap.
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+	'..', 'src', 'lib'))
+import bed_lib as bd
+
+def write_rois(path, n, width = 999):
+	with open(path, 'w') as f:
+		for i in range(n):
+			f.write('chr1\t%d\t%d\tr%d\t0\n' % (i * 1000, i * 1000 + width, i))
+	return(str(path))
+
+def entries(cache_dir):
+	'''Cache entries, with their size in bytes.'''
+	return(dict((name, bd._entry_size(os.path.join(cache_dir, name)))
+		for name in os.listdir(cache_dir) if name != bd._CacheLock.NAME))
+
+def cached(regfile, cache_dir, max_bytes = None):
+	return(bd.cached_roi_index(bd.read_bed(regfile), regfile, cache_dir,
+		max_bytes = max_bytes))
+
+def test_changed_regfile_misses(tmp_path):
+	cache_dir = str(tmp_path / 'cache')
+	regfile = write_rois(tmp_path / 'rois.bed', 100)
+	cached(regfile, cache_dir)
+	first = entries(cache_dir)
+	assert 1 == len(first)
+
+	# Hit: the entry is memory-mapped, nothing new is saved
+	index = cached(regfile, cache_dir)
+	assert isinstance(index.chr_codes, np.memmap)
+	assert first == entries(cache_dir)
+
+	# Same size and name, other content: a new entry
+	write_rois(regfile, 100, width = 500)
+	index = cached(regfile, cache_dir)
+	assert not isinstance(index.chr_codes, np.memmap)
+	assert 2 == len(entries(cache_dir))
+	assert set(first.keys()) < set(entries(cache_dir).keys())
+
+def test_eviction_respects_size_cap(tmp_path):
+	cache_dir = str(tmp_path / 'cache')
+	regfiles = [write_rois(tmp_path / ('rois%d.bed' % i), 1000 + i)
+		for i in range(4)]
+	cached(regfiles[0], cache_dir)
+	size = max(entries(cache_dir).values())
+
+	# Room for two entries: the least recently used one goes first
+	max_bytes = 2 * size + size // 2
+	cached(regfiles[1], cache_dir, max_bytes)
+	cached(regfiles[0], cache_dir, max_bytes)
+	before = set(entries(cache_dir).keys())
+	cached(regfiles[2], cache_dir, max_bytes)
+	after = entries(cache_dir)
+	assert max_bytes >= sum(after.values())
+	assert 2 == len(after)
+	assert 1 == len(before & set(after.keys()))
+
+	# The entry of regfiles[0], used last, is kept
+	cached(regfiles[0], cache_dir, max_bytes)
+	assert set(after.keys()) == set(entries(cache_dir).keys())
+
+	# A cap below one entry keeps only the new entry
+	cached(regfiles[3], cache_dir, size // 2)
+	assert 1 == len(entries(cache_dir))
@@ -0,0 +1,63 @@
+#
+#
+# Text and bed cache (.bedc) inputs with numeric (Ensembl style) chromosome
+# names, through bin.py and add_rois.py.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+	'..', 'src', 'scripts')
+
+def run(script, *args):
+	'''Run a script, return its stdout lines.'''
+	out = subprocess.run([sys.executable, os.path.join(SCRIPTS, script)] +
+		[str(a) for a in args], check = True, capture_output = True, text = True)
+	return(out.stdout.splitlines())
+
+def write_bed(path, rows):
+	with open(path, 'w') as f:
+		for row in rows:
+			f.write('\t'.join(str(x) for x in row) + '\n')
+	return(str(path))
+
+@pytest.fixture
+def beds(tmp_path):
+	'''Numeric-only regions, regions mixing X, and reads with their cache.'''
+	rois = write_bed(tmp_path / 'rois.bed', [(c, i, i + 999, 'r', 0)
+		for c in (1, 2, 10) for i in range(0, 10000, 1000)])
+	xrois = write_bed(tmp_path / 'xrois.bed', [(c, i, i + 999, 'r', 0)
+		for c in (1, 'X') for i in range(0, 10000, 1000)])
+	reads = write_bed(tmp_path / 'reads.bed', [(c, i, i + 50, 'x', 1 + i % 3)
+		for c in (1, 2, 10) for i in range(100, 10000, 700)])
+	xreads = write_bed(tmp_path / 'xreads.bed', [(c, i, i + 50, 'x', 1)
+		for c in (1, 'X') for i in range(100, 10000, 700)])
+	for path in (reads, xreads):
+		run('bed2cache.py', path, '-o', path + 'c')
+	return({'rois' : rois, 'xrois' : xrois, 'reads' : reads, 'xreads' : xreads})
+
+def total(lines):
+	return(sum(int(line.split('\t')[4]) for line in lines))
+
+def test_bin_text_and_cache(beds):
+	expected = sum(1 + i % 3 for i in range(100, 10000, 700)) * 3
+	assert expected == total(run('bin.py', beds['rois'], beds['reads']))
+	assert expected == total(run('bin.py', beds['rois'], beds['reads'] + 'c'))
+
+def test_bin_mixed_chroms(beds):
+	# Regions mixing X with numeric chromosomes, and the other way around
+	expected = sum(1 + i % 3 for i in range(100, 10000, 700))
+	for reads in (beds['reads'], beds['reads'] + 'c'):
+		assert expected == total(run('bin.py', beds['xrois'], reads))
+	for reads in (beds['xreads'], beds['xreads'] + 'c'):
+		assert len(range(100, 10000, 700)) == total(
+			run('bin.py', beds['rois'], reads))
+
+def test_add_rois_text_cache_and_chunks(beds):
+	expected = run('add_rois.py', beds['rois'], beds['reads'])
+	assert 3 * len(range(100, 10000, 700)) == len(expected)
+	assert expected == run('add_rois.py', '-s', 7, beds['rois'], beds['reads'])
+	assert expected == run('add_rois.py', beds['rois'], beds['reads'] + 'c')
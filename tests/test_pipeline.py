@@ -0,0 +1,36 @@
+#
+#
+# Pipeline stages against the scripts they stand for.
+
+import json
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'src')
+
+def run(script, *args, cwd = None):
+	subprocess.run([sys.executable, os.path.join(SRC, script)] +
+		[str(a) for a in args], check = True, capture_output = True, cwd = cwd)
+
+def test_shuffle_summary_matches_script(tmp_path):
+	with open(tmp_path / 'counts.bed', 'w') as f:
+		for i in range(200):
+			f.write('chr%d\t%d\t%d\tr%d\t%d\n' % (1 + i % 2, i * 1000,
+				i * 1000 + 999, i, (i * 7) % 23))
+	with open(tmp_path / 'pipeline.json', 'w') as f:
+		json.dump({'stages' : {
+			'counts' : {'op' : 'read', 'path' : 'counts.bed', 'no_header' : True},
+			'null' : {'op' : 'shuffle', 'input' : '@counts', 'seed' : 3,
+				'perc' : 20, 'iterations' : 7, 'summary' : True,
+				'quantiles' : [0.5]}},
+			'outputs' : {'null' : {'path' : 'null.bed', 'header' : True}}}, f)
+
+	run('main.py', 'pipeline.json', cwd = tmp_path)
+	run(os.path.join('scripts', 'shuffle.py'), '-n', 7, '-p', 20, '-o', 'out/',
+		'--summary', 3, 'counts.bed', '-q', 0.5, cwd = tmp_path)
+	with open(tmp_path / 'null.bed') as f:
+		null = f.read()
+	with open(tmp_path / 'out' / 'counts.20perc.summary.bed') as f:
+		assert f.read() == null
+	assert null.startswith('chr\tstart\tend\tname\tscore\tmean\t')
@@ -0,0 +1,41 @@
+#
+#
+# Profiles of bin.py runs, with and without worker processes.
+
+import json
+import os
+import subprocess
+import sys
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+	'..', 'src', 'scripts')
+
+def write_bed(path, rows):
+	with open(path, 'w') as f:
+		for row in rows:
+			f.write('\t'.join(str(x) for x in row) + '\n')
+	return(str(path))
+
+def profile(tmp_path, name, *args):
+	'''Run bin.py with a JSON profile, return its calls and rows per stage.'''
+	path = str(tmp_path / name)
+	subprocess.run([sys.executable, os.path.join(SCRIPTS, 'bin.py'),
+		'--profile-json', path] + [str(a) for a in args], check = True,
+		capture_output = True)
+	with open(path) as f:
+		return(dict((s['stage'], (s['calls'], s['rows']))
+			for s in json.load(f)['stages']))
+
+def test_worker_stages_are_reported(tmp_path):
+	rois = write_bed(tmp_path / 'rois.bed', [(c, i, i + 999, 'r', 0)
+		for c in ('chr1', 'chr2') for i in range(0, 50000, 1000)])
+	beds = [write_bed(tmp_path / ('%d.bed' % j), [(c, i, i + 50, 'x', j)
+		for c in ('chr1', 'chr2') for i in range(j, 50000, 300)])
+		for j in range(3)]
+
+	# Samples, then chromosomes of a single sample, in parallel
+	for bedfiles in (beds, beds[:1]):
+		serial = profile(tmp_path, 'serial.json', rois, *bedfiles)
+		assert set(['read', 'match', 'collapse']) <= set(serial.keys())
+		assert serial == profile(tmp_path, 'parallel.json', '-p', 2, rois,
+			*bedfiles)
@@ -0,0 +1,43 @@
+#
+#
+# read_bed on files which can only be read once (FIFOs, pipes).
+
+import os
+import sys
+import threading
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+	'..', 'src', 'lib'))
+import bed_lib as bd
+
+TEXT = 'track name=x\nchr\tstart\tend\tname\tscore\n' + ''.join(
+	'chr%d\t%d\t%d\tr\t%g\n' % (1 + i % 2, i, i + 9, i / 3.)
+	for i in range(0, 200000, 10))
+
+def read_fifo(path, **kwargs):
+	'''Read a FIFO with read_bed, written from another thread.'''
+	os.mkfifo(path)
+	def write():
+		with open(path, 'w') as f:
+			f.write(TEXT)
+	writer = threading.Thread(target = write)
+	writer.start()
+	try:
+		bed = bd.read_bed(path, **kwargs)
+		if not isinstance(bed, pd.DataFrame):
+			bed = pd.concat(list(bed), ignore_index = True)
+		return(bed)
+	finally:
+		writer.join()
+
+def test_read_bed_fifo(tmp_path):
+	with open(tmp_path / 'x.bed', 'w') as f:
+		f.write(TEXT)
+	expected = bd.read_bed(str(tmp_path / 'x.bed'))
+	assert 20000 == expected.shape[0]
+	pd.testing.assert_frame_equal(expected, read_fifo(str(tmp_path / 'fifo')))
+
+	pd.testing.assert_frame_equal(expected, read_fifo(str(tmp_path / 'fifo2'),
+		chunksize = 300))
@@ -0,0 +1,96 @@
+#
+#
+# roi_client.py requests to a roi_server.py, against add_rois.py and bin.py.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+	'..', 'src', 'scripts')
+
+def run(script, *args, check = True, stdin = None):
+	'''Run a script, return its completed process.'''
+	return(subprocess.run([sys.executable, os.path.join(SCRIPTS, script)] +
+		[str(a) for a in args], check = check, capture_output = True,
+		text = True, input = stdin))
+
+def write_bed(path, rows):
+	with open(path, 'w') as f:
+		for row in rows:
+			f.write('\t'.join(str(x) for x in row) + '\n')
+	return(str(path))
+
+@pytest.fixture
+def server(tmp_path):
+	'''A server with a ROI set named rois, and the files it was given.'''
+	rois = write_bed(tmp_path / 'rois.bed', [(c, i, i + 999, 'r', 0)
+		for c in ('chr1', 'chr2') for i in range(0, 30000, 1000)])
+	reads = [write_bed(tmp_path / ('%d.bed' % j), [(c, i, i + 60, 'x', 1 + i % 4)
+		for c in ('chr1', 'chr2', 'chr3') for i in range(j, 30000, 130)])
+		for j in range(2)]
+
+	# Short socket path, below the Unix socket path length limit
+	socket_dir = tempfile.mkdtemp(prefix = 'rois')
+	socket_path = os.path.join(socket_dir, 'socket')
+	process = subprocess.Popen([sys.executable,
+		os.path.join(SCRIPTS, 'roi_server.py'), socket_path, 'rois=' + rois],
+		stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+	try:
+		for i in range(200):
+			if 0 == run('roi_client.py', '-S', socket_path, 'ping',
+				check = False).returncode:
+				break
+			time.sleep(.1)
+		yield({'socket' : socket_path, 'rois' : rois, 'reads' : reads,
+			'tmp' : tmp_path})
+	finally:
+		process.terminate()
+		process.wait(30)
+		shutil.rmtree(socket_dir, ignore_errors = True)
+
+def client(server, *args, **kwargs):
+	return(run('roi_client.py', '-S', server['socket'], *args, **kwargs))
+
+def test_bin_matches_script(server):
+	for method in ('sum', 'mean', 'coverage'):
+		expected = run('bin.py', '-c', method, server['rois'],
+			*server['reads']).stdout
+		assert expected == client(server, 'bin', '-c', method, 'rois',
+			*server['reads']).stdout
+		assert expected == client(server, 'bin', '-c', method, '--send', 'rois',
+			*server['reads']).stdout
+
+def test_add_rois_matches_script(server):
+	expected = run('add_rois.py', server['rois'], server['reads'][0]).stdout
+	assert 0 != len(expected)
+	assert expected == client(server, 'add_rois', 'rois',
+		server['reads'][0]).stdout
+	with open(server['reads'][0]) as f:
+		assert expected == client(server, 'add_rois', 'rois', '-',
+			stdin = f.read()).stdout
+
+def test_errors_write_no_output(server):
+	out = client(server, 'bin', 'nope', server['reads'][0], check = False)
+	assert 0 != out.returncode
+	assert '!!! ERROR !!!' in out.stderr
+	assert '' == out.stdout
+
+	# Failing after the first rows, stdout output is not partial
+	broken = write_bed(server['tmp'] / 'broken.bed', [('chr1', i, i + 60, 'x', 1)
+		for i in range(0, 30000, 10)] + [('chr1', 'x', 'y', 'x', 1)])
+	out = client(server, 'add_rois', '-s', 100, 'rois', broken, check = False)
+	assert 0 != out.returncode
+	assert '!!! ERROR !!!' in out.stderr
+	assert '' == out.stdout
+
+	outfile = server['tmp'] / 'out.bed'
+	out = client(server, 'add_rois', '-s', 100, '-o', outfile, 'rois', broken,
+		check = False)
+	assert 0 != out.returncode
+	assert not os.path.exists(outfile)
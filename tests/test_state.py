@@ -0,0 +1,86 @@
+#
+#
+# Incremental bin.py runs (--state) against runs on the cumulative bedfiles.
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+	'..', 'src', 'scripts')
+sys.path.append(os.path.join(SCRIPTS, '..', 'lib'))
+import bed_lib as bd
+
+def run(script, *args, check = True):
+	'''Run a script, return its completed process.'''
+	return(subprocess.run([sys.executable, os.path.join(SCRIPTS, script)] +
+		[str(a) for a in args], check = check, capture_output = True,
+		text = True))
+
+def write_bed(path, rows):
+	with open(path, 'w') as f:
+		for row in rows:
+			f.write('\t'.join(str(x) for x in row) + '\n')
+	return(str(path))
+
+@pytest.fixture
+def lanes(tmp_path):
+	'''Two lanes of two samples, and their cumulative bedfiles. Lane A has no
+	chr2 reads, and no lane has chr3 reads.'''
+	rois = write_bed(tmp_path / 'rois.bed', [(c, i, i + 999, 'r', 0)
+		for c in ('chr1', 'chr2', 'chr3') for i in range(0, 20000, 1000)])
+	out = {'rois' : rois, 'A' : [], 'B' : [], 'all' : []}
+	for sample in range(2):
+		a = [('chr1', i, i + 40, 'x', 1 + (i + sample) % 5)
+			for i in range(sample, 20000, 170)]
+		b = [(c, i, i + 40, 'x', 1 + (i * 3 + sample) % 7)
+			for c in ('chr1', 'chr2') for i in range(50 + sample, 20000, 230)]
+		out['A'].append(write_bed(tmp_path / ('A%d.bed' % sample), a))
+		out['B'].append(write_bed(tmp_path / ('B%d.bed' % sample), b))
+		out['all'].append(write_bed(tmp_path / ('all%d.bed' % sample), a + b))
+	return(out)
+
+@pytest.mark.parametrize('method', ['sum', 'mean', 'min', 'max', 'count'])
+def test_lanes_match_cumulative_run(lanes, tmp_path, method):
+	state = str(tmp_path / (method + '.npz'))
+	for flags in (['--float'], []):
+		if os.path.isfile(state):
+			os.remove(state)
+		args = flags + ['-c', method, '--state', state, lanes['rois']]
+		run('bin.py', *(args + lanes['A']))
+		incremental = run('bin.py', *(args + lanes['B'])).stdout
+		assert run('bin.py', *(flags + ['-c', method, lanes['rois']] +
+			lanes['all'])).stdout == incremental
+
+def test_median_is_refused(lanes, tmp_path):
+	out = run('bin.py', '-c', 'median', '--state', tmp_path / 's.npz',
+		lanes['rois'], *lanes['A'], check = False)
+	assert 0 != out.returncode
+	assert 'Cannot update -c median' in out.stderr
+	assert not os.path.exists(tmp_path / 's.npz')
+
+def test_state_round_trip(lanes, tmp_path):
+	path = str(tmp_path / 's.npz')
+	run('bin.py', '--state', path, lanes['rois'], *lanes['A'])
+	state = bd.RoiState.load(path)
+	state.save(str(tmp_path / 'copy.npz'))
+	copy = bd.RoiState.load(str(tmp_path / 'copy.npz'))
+	for name in ('sum', 'count', 'min', 'max', 'touched'):
+		np.testing.assert_array_equal(getattr(state, name), getattr(copy, name))
+	assert state.meta == copy.meta
+	assert (60, 2) == state.sum.shape
+
+def test_state_mismatch(lanes, tmp_path):
+	path = str(tmp_path / 's.npz')
+	run('bin.py', '--state', path, lanes['rois'], *lanes['A'])
+
+	# Other regions, then another number of samples
+	other = write_bed(tmp_path / 'other.bed', [('chr1', i, i + 499, 'r', 0)
+		for i in range(0, 20000, 500)])
+	for args in ([other] + lanes['B'], [lanes['rois']] + lanes['B'][:1]):
+		out = run('bin.py', '--state', path, *args, check = False)
+		assert 0 != out.returncode
+		assert '!!! ERROR !!!' in out.stderr